@@ -15,9 +15,10 @@ export const EventCard = ({ event }: EventCardProps) => {
   const handleVote = async (movieId: number, vote: boolean) => {
     try {
       setLoading(true);
-      await eventService.submitVote(event.id, { movie_id: movieId, vote });
-      const results = await eventService.getVoteResults(event.id);
-      setVotes(results as VoteResults);
+      const results = await eventService.submitVotes(event.id, [
+        { movie_id: movieId, vote },
+      ]);
+      setVotes(results);
     } catch (error) {
       console.error("Failed to submit vote:", error);
     } finally {
@@ -2,6 +2,7 @@ import { useState, useEffect } from "react";
 import { Movie } from "../../interface/movie";
 import { MovieSearch } from "../MovieSearch/MovieSearch";
 import { movieService } from "../../services/apiService";
+import { tmdbImageUrl } from "../../utils/imageUrl";
 import Loading from "../../components/Animation/Loading";
 
 interface EventFormData {
@@ -113,7 +114,7 @@ export const EventDetails = ({
                 >
                   <div className="flex items-center gap-2">
                     <img
-                      src={`https://image.tmdb.org/t/p/w92${movie.poster_path}`}
+                      src={tmdbImageUrl(movie.poster_path, "w92")}
                       alt={movie.title}
                       className="w-12 h-16 object-cover rounded"
                     />
@@ -3,6 +3,7 @@ import { IEvent } from "../../interface/event";
 import { Movie } from "../../interface/movie";
 import { movieService } from "../../services/apiService";
 import { formatDate } from "../../utils/dateFormatter";
+import { tmdbImageUrl } from "../../utils/imageUrl";
 import Loading from "../Animation/Loading";
 
 interface EventListProps {
@@ -28,13 +29,9 @@ export const EventList = ({
         const movieIds = [
           ...new Set(events.flatMap((event) => event.movie_options)),
         ];
-        const details = await Promise.all(
-          movieIds.map(async (id) => {
-            const movie = await movieService.getMovieDetails(id);
-            return [id, movie];
-          })
-        );
-        setMovieDetails(Object.fromEntries(details));
+        if (movieIds.length === 0) return;
+        const { results } = await movieService.getMovieDetailsBatch(movieIds);
+        setMovieDetails(results);
       } catch (error) {
         console.error("Failed to fetch movie details:", error);
       }
@@ -90,9 +87,10 @@ export const EventList = ({
           <div className="flex gap-4">
             {event.movie_options[0] && movieDetails[event.movie_options[0]] && (
               <img
-                src={`https://image.tmdb.org/t/p/w92${
-                  movieDetails[event.movie_options[0]].poster_path
-                }`}
+                src={tmdbImageUrl(
+                  movieDetails[event.movie_options[0]].poster_path,
+                  "w92"
+                )}
                 alt={movieDetails[event.movie_options[0]].title}
                 className="w-16 h-24 object-cover rounded"
               />
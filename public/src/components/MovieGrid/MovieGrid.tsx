@@ -2,6 +2,7 @@ import { Movie } from "../../interface/movie";
 import { Link } from "react-router-dom";
 import { genreMap } from "../../config/movieFilters";
 import placeholderImage from "../../img/Placeholder.png";
+import { tmdbImageUrl } from "../../utils/imageUrl";
 
 interface MovieGridProps {
   movies: Movie[];
@@ -11,7 +12,7 @@ interface MovieGridProps {
 export const MovieGrid = ({ movies, className }: MovieGridProps) => {
   const getImageUrl = (path: string | null) => {
     if (!path) return placeholderImage;
-    return `https://image.tmdb.org/t/p/w500${path}`;
+    return tmdbImageUrl(path, "w342");
   };
 
   const getGenres = (genreIds: number[] | undefined) => {
@@ -1,6 +1,7 @@
 import { useState, useCallback, useRef, useEffect } from "react";
 import { Movie } from "../../interface/movie";
 import { movieService } from "../../services/apiService";
+import { tmdbImageUrl } from "../../utils/imageUrl";
 import debounce from "lodash/debounce";
 import { ApiError } from "../../interface/api";
 
@@ -119,7 +120,7 @@ export const MovieSearch = ({
               <img
                 src={
                   movie.poster_path
-                    ? `https://image.tmdb.org/t/p/w92${movie.poster_path}`
+                    ? tmdbImageUrl(movie.poster_path, "w92")
                     : "/placeholder-movie.png"
                 }
                 alt={movie.title}
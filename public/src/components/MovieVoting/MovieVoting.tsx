@@ -1,7 +1,8 @@
 import { useState, useEffect } from "react";
 import { movieService, eventService } from "../../services/apiService";
 import { Movie } from "../../interface/movie";
-import { VoteResults } from "../../interface/api";
+import { VoteResults, VoteTally, VoteUpdate } from "../../interface/api";
+import { tmdbImageUrl } from "../../utils/imageUrl";
 import Loading from "../Animation/Loading";
 
 interface MovieVotingProps {
@@ -9,6 +10,25 @@ interface MovieVotingProps {
   movieOptions: number[];
 }
 
+// Merge a stream tally message into the results; it only carries the movies
+// the vote touched, so the event-wide totals are summed again here
+const applyVoteUpdate = (
+  current: VoteResults,
+  update: VoteUpdate
+): VoteResults => {
+  const results: VoteResults = { ...current, ...update.movies };
+  const totals: VoteTally = { upvotes: 0, downvotes: 0, abstains: 0, total: 0 };
+  for (const key of Object.keys(results)) {
+    const movieId = Number(key);
+    if (Number.isNaN(movieId)) continue; // totals, voters
+    totals.upvotes += results[movieId].upvotes;
+    totals.downvotes += results[movieId].downvotes;
+    totals.abstains += results[movieId].abstains;
+    totals.total += results[movieId].total;
+  }
+  return { ...results, totals, voters: update.voters };
+};
+
 export const MovieVoting = ({ eventId, movieOptions }: MovieVotingProps) => {
   const [movies, setMovies] = useState<Movie[]>([]);
   const [votes, setVotes] = useState<VoteResults>({});
@@ -37,11 +57,20 @@ export const MovieVoting = ({ eventId, movieOptions }: MovieVotingProps) => {
     fetchMoviesAndVotes();
   }, [eventId, movieOptions]);
 
+  useEffect(() => {
+    return eventService.subscribeToVotes(
+      eventId,
+      (results) => setVotes(results),
+      (update) => setVotes((current) => applyVoteUpdate(current, update))
+    );
+  }, [eventId]);
+
   const handleVote = async (movieId: number, vote: boolean) => {
     try {
-      await eventService.submitVote(eventId, { movie_id: movieId, vote });
-      const updatedVotes = await eventService.getVoteResults(eventId);
-      setVotes(updatedVotes as VoteResults);
+      const updatedVotes = await eventService.submitVotes(eventId, [
+        { movie_id: movieId, vote },
+      ]);
+      setVotes(updatedVotes);
     } catch (err) {
       setError("Failed to submit vote");
     }
@@ -97,7 +126,7 @@ export const MovieVoting = ({ eventId, movieOptions }: MovieVotingProps) => {
           <div key={movie.id} className="bg-black rounded-lg p-4">
             <div className="flex items-center gap-4">
               <img
-                src={`https://image.tmdb.org/t/p/w92${movie.poster_path}`}
+                src={tmdbImageUrl(movie.poster_path, "w92")}
                 alt={movie.title}
                 className="w-16 h-24 object-cover rounded shadow-lg"
               />
@@ -140,9 +169,7 @@ export const MovieVoting = ({ eventId, movieOptions }: MovieVotingProps) => {
                   </button>
 
                   <span className="text-sm text-lightGray">
-                    {(votes[movie.id]?.upvotes || 0) +
-                      (votes[movie.id]?.downvotes || 0)}{" "}
-                    votes
+                    {votes[movie.id]?.total || 0} votes
                   </span>
                 </div>
               </div>
@@ -4,6 +4,7 @@ import { IEvent } from "../../interface/event";
 import { eventService, movieService } from "../../services/apiService";
 import { Movie } from "../../interface/movie";
 import placeholderImage from "../../img/Placeholder.png";
+import { tmdbImageUrl } from "../../utils/imageUrl";
 import { useAuth } from "../../context/AuthContext";
 import Loading from "../Animation/Loading";
 
@@ -87,14 +88,10 @@ export const NextEvent = () => {
 
           // Fetch movie details if there are movie options
           if (futureEvents[0].movie_options.length > 0) {
-            const movieIds = futureEvents[0].movie_options;
-            const details = await Promise.all(
-              movieIds.map(async (id) => {
-                const movie = await movieService.getMovieDetails(id);
-                return [id, movie];
-              })
+            const { results } = await movieService.getMovieDetailsBatch(
+              futureEvents[0].movie_options
             );
-            setMovieDetails(Object.fromEntries(details));
+            setMovieDetails(results);
           }
         }
       } catch (err) {
@@ -200,7 +197,7 @@ export const NextEvent = () => {
         {firstMovie && (
           <div className="mx-auto lg:mx-0">
             <img
-              src={`https://image.tmdb.org/t/p/w500${firstMovie.poster_path}`}
+              src={tmdbImageUrl(firstMovie.poster_path)}
               alt={firstMovie.title}
               className="w-36 lg:w-48 h-54 lg:h-72 object-cover rounded-lg shadow-lg"
               onError={(e) => {
@@ -6,9 +6,21 @@ export interface ApiError extends Error {
   name: string;
 }
 
+export interface VoteTally {
+  upvotes: number;
+  downvotes: number;
+  abstains: number;
+  total: number;
+}
+
 export interface VoteResults {
-  [key: number]: {
-    upvotes: number;
-    downvotes: number;
-  };
+  [key: number]: VoteTally;
+  totals?: VoteTally;
+  voters?: number;
+}
+
+// A vote_stream tally message: current tallies of the movies a vote touched
+export interface VoteUpdate {
+  movies: Record<number, VoteTally>;
+  voters: number;
 }
@@ -32,4 +32,11 @@ export interface MovieResponse {
   results: Movie[];
   total_pages: number;
   total_results: number;
+  next?: string | null;
+  previous?: string | null;
+}
+
+export interface MovieBatchResponse {
+  results: Record<number, Movie>;
+  errors: Record<number, { error: string; status: number | null }>;
 }
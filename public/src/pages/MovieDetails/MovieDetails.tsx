@@ -6,6 +6,7 @@ import { Footer } from "../../components/Footer/Footer";
 import { movieService } from "../../services/apiService";
 import { PageTransition } from "../../components/Animation/PageTransition";
 import placeholderImage from "../../img/Placeholder.png";
+import { tmdbImageUrl } from "../../utils/imageUrl";
 import { genreMap } from "../../config/movieFilters";
 import Loading from "../../components/Animation/Loading";
 
@@ -59,7 +60,7 @@ export const MovieDetails = () => {
 
   const getImageUrl = (path: string | null, size: string = "w500") => {
     if (!path) return placeholderImage;
-    return `https://image.tmdb.org/t/p/${size}${path}`;
+    return tmdbImageUrl(path, size);
   };
 
   const getGenres = (genreIds: number[] | undefined) => {
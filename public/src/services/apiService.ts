@@ -1,10 +1,16 @@
 // TODO Eventually clean up this file
 import { get, post, put, del } from "./serviceBase";
 import { handleApiError } from "../utils/apiHelpers";
-import { Movie, MovieResponse } from "../interface/movie";
-import { ApiError } from "../interface/api";
+import {
+  Movie,
+  MovieBatchResponse,
+  MovieResponse,
+} from "../interface/movie";
+import { ApiError, VoteResults, VoteUpdate } from "../interface/api";
 
 const API_BASE_URL = import.meta.env.VITE_API_URL;
+const VOTE_POLL_INTERVAL_MS = 10000;
+const VOTE_STREAM_RECONNECT_MS = 5000;
 
 interface IUser {
   id: number;
@@ -79,10 +85,21 @@ export const movieService = {
     }
   },
 
-  getPopularMovies: async () => {
+  getMovieDetailsBatch: async (ids: number[]) => {
+    try {
+      const response = await get<MovieBatchResponse>(
+        `${API_BASE_URL}/movies/tmdb/batch/?ids=${ids.join(",")}`
+      );
+      return response.data;
+    } catch (error) {
+      throw new Error(handleApiError(error));
+    }
+  },
+
+  getPopularMovies: async (next?: string | null) => {
     try {
       const response = await get<MovieResponse>(
-        `${API_BASE_URL}/movies/popular/`
+        next || `${API_BASE_URL}/movies/popular/`
       );
       return response.data;
     } catch (error) {
@@ -93,7 +110,7 @@ export const movieService = {
   getMovieCredits: async (id: number) => {
     try {
       const response = await get<MovieCredits>(
-        `${API_BASE_URL}/movies/tmdb/${id}/credits/`
+        `${API_BASE_URL}/movies/tmdb/${id}/credits/?limit=10&job=Director`
       );
       return response.data;
     } catch (error) {
@@ -154,9 +171,25 @@ export const eventService = {
 
   submitVote: async (eventId: number, voteData: IVoteRequest) => {
     try {
+      // Sent again unchanged when the request is retried, so the vote is only applied once
       const response = await post(
         `${API_BASE_URL}/events/${eventId}/vote/`,
-        voteData
+        voteData,
+        { "Idempotency-Key": crypto.randomUUID() }
+      );
+      return response.data;
+    } catch (error) {
+      throw new Error(handleApiError(error));
+    }
+  },
+
+  // Several votes in one request; resolves to the event's updated tallies
+  submitVotes: async (eventId: number, votes: IVoteRequest[]) => {
+    try {
+      const response = await post<VoteResults>(
+        `${API_BASE_URL}/events/${eventId}/votes/`,
+        { votes },
+        { "Idempotency-Key": crypto.randomUUID() }
       );
       return response.data;
     } catch (error) {
@@ -175,6 +208,83 @@ export const eventService = {
     }
   },
 
+  // Live vote tallies over Server-Sent Events, or by polling vote_results
+  // when the stream cannot be opened (it only exists when the API is served
+  // under ASGI). Returns a function that stops either.
+  subscribeToVotes: (
+    eventId: number,
+    onSnapshot: (results: VoteResults) => void,
+    onUpdate: (update: VoteUpdate) => void
+  ) => {
+    let source: EventSource | null = null;
+    let timer: ReturnType<typeof setTimeout> | undefined;
+    let closed = false;
+
+    const poll = async () => {
+      try {
+        onSnapshot(await eventService.getVoteResults(eventId));
+      } catch {
+        // Keep showing the last results until the next poll
+      }
+      if (!closed) {
+        timer = setTimeout(poll, VOTE_POLL_INTERVAL_MS);
+      }
+    };
+
+    const connect = async () => {
+      if (typeof EventSource === "undefined") {
+        poll();
+        return;
+      }
+      let ticket: string;
+      try {
+        // EventSource cannot send the access token, so the stream URL carries
+        // a short-lived ticket for this event instead
+        const response = await post<{ ticket: string }>(
+          `${API_BASE_URL}/events/${eventId}/vote_stream_ticket/`
+        );
+        ticket = response.data.ticket;
+      } catch {
+        poll();
+        return;
+      }
+      if (closed) return;
+
+      let opened = false;
+      source = new EventSource(
+        `${API_BASE_URL}/events/${eventId}/vote_stream/?ticket=${encodeURIComponent(ticket)}`
+      );
+      source.onopen = () => {
+        opened = true;
+      };
+      source.addEventListener("snapshot", (event) =>
+        onSnapshot(JSON.parse((event as MessageEvent).data))
+      );
+      source.addEventListener("tally", (event) =>
+        onUpdate(JSON.parse((event as MessageEvent).data))
+      );
+      source.onerror = () => {
+        // The browser retries dropped connections itself, but not refused
+        // ones. A stream that was open (e.g. until its token expired) is
+        // reopened with a fresh ticket; one that never opened is not served
+        // here, so poll instead of retrying forever
+        if (source?.readyState !== EventSource.CLOSED || closed) return;
+        if (opened) {
+          timer = setTimeout(connect, VOTE_STREAM_RECONNECT_MS);
+        } else {
+          poll();
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      source?.close();
+    };
+  },
+
   inviteGuests: async (eventId: number, emails: string[]) => {
     try {
       const response = await post(
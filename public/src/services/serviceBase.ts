@@ -55,8 +55,12 @@ export const get = async <T>(
   return handleResponse<T>(response);
 };
 
-export const post = <T>(url: string, data?: any) => {
-  return axiosInstance.post<T>(url, data);
+export const post = <T>(
+  url: string,
+  data?: any,
+  headers?: Record<string, string>
+) => {
+  return axiosInstance.post<T>(url, data, { headers });
 };
 
 export const put = <T>(url: string, data: any) => {
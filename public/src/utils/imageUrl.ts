@@ -0,0 +1,5 @@
+const API_BASE_URL = import.meta.env.VITE_API_URL;
+
+// TMDB images are served through the backend's resizing poster cache
+export const tmdbImageUrl = (path: string | null, size: string = "w500") =>
+  `${API_BASE_URL}/movies/poster/${size}${path}`;
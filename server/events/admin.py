@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Event, EventInvitation, MovieVote
+from .models import Event, EventInvitation, MovieVote, VoteTally
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
@@ -19,3 +19,8 @@ class EventInvitationAdmin(admin.ModelAdmin):
 class MovieVoteAdmin(admin.ModelAdmin):
     list_display = ('event', 'movie', 'user', 'vote')
     list_filter = ('vote',)
+
+@admin.register(VoteTally)
+class VoteTallyAdmin(admin.ModelAdmin):
+    list_display = ('event', 'movie', 'upvotes', 'downvotes', 'abstains')
+    readonly_fields = ('upvotes', 'downvotes', 'abstains')
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path('events/<int:pk>/vote_stream/', async_views.vote_stream, name='event-vote-stream'),
+]
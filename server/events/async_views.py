@@ -0,0 +1,106 @@
+"""
+Async views of the events app, mounted only when the project is served by
+server.asgi (see server/asgi_urls.py).
+
+vote_stream pushes an event's vote tallies to the browser as Server-Sent
+Events: a snapshot on connect, then the new tallies of each movie as votes
+are written. Clients without a stream (e.g. under WSGI, where it is not
+routed) keep polling vote_results.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .live import RESYNC, read_stream_ticket, vote_broker
+from .models import Event
+from .tallies import vote_results
+
+logger = logging.getLogger(__name__)
+
+
+def authenticate_stream(request, event_id):
+    """(user, stream expiry) from a ?ticket= issued by vote_stream_ticket, or from the Authorization header"""
+    ticket = request.GET.get('ticket')
+    if ticket is not None:
+        user_id, expires_at = read_stream_ticket(ticket, event_id)
+        user = get_user_model().objects.filter(id=user_id, is_active=True).first() if user_id else None
+        return (user, expires_at) if user else (None, None)
+
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None, None
+    try:
+        token = authentication.get_validated_token(raw_token)
+        return authentication.get_user(token), token['exp']
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None, None
+
+
+def visible_event(user, event_id):
+    """The event if user hosts it or is invited to it, like EventViewSet.get_queryset"""
+    return Event.objects.filter(
+        Q(host=user) | Q(invitations__email=user.email), id=event_id
+    ).distinct().first()
+
+
+def event_snapshot(event_id):
+    event = Event.objects.filter(id=event_id).first()
+    return vote_results(event) if event else None
+
+
+def sse(event_type, data):
+    return f'event: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+
+@require_GET
+async def vote_stream(request, pk):
+    user, expires_at = await sync_to_async(authenticate_stream)(request, pk)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid'}, status=401)
+    event = await sync_to_async(visible_event)(user, pk)
+    if event is None:
+        return JsonResponse({'error': 'Not found'}, status=404)
+
+    async def stream():
+        # Subscribe here rather than in the view: a client gone before the first chunk never
+        # starts the generator, so its finally would not run to unsubscribe. Subscribing
+        # before reading the snapshot means no vote falls between the two.
+        subscription = vote_broker.subscribe(event.id)
+        try:
+            yield f'retry: {settings.VOTE_STREAM_RETRY_MS}\n\n'
+            yield sse('snapshot', await sync_to_async(event_snapshot)(event.id))
+            # End the stream when the access token behind it expires; the client reconnects with a fresh one
+            while (remaining := expires_at - time.time()) > 0:
+                try:
+                    message = await subscription.get(min(settings.VOTE_STREAM_HEARTBEAT, remaining))
+                except asyncio.TimeoutError:  # not the builtin TimeoutError before Python 3.11
+                    yield ': heartbeat\n\n'
+                    continue
+                if message is RESYNC:
+                    snapshot = await sync_to_async(event_snapshot)(event.id)
+                    if snapshot is None:
+                        break  # the event was deleted
+                    yield sse('snapshot', snapshot)
+                else:
+                    yield sse('tally', message)
+        finally:
+            vote_broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # keep nginx from buffering the stream
+    return response
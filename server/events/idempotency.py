@@ -0,0 +1,55 @@
+"""
+This module contains Idempotency-Key support for the vote endpoints.
+
+A client that sends the same Idempotency-Key again (a double click, or the
+axios interceptor retrying after a token refresh) gets the response of the
+first request back from IDEMPOTENCY_CACHE without the view running again.
+Keys are scoped to the user and the request path, and responses are kept for
+IDEMPOTENCY_KEY_TIMEOUT seconds. Server errors are not stored, so they can be
+retried.
+"""
+
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def idempotency_cache_key(request, key):
+    digest = hashlib.sha256(f'{request.user.pk}:{request.path}:{key}'.encode()).hexdigest()
+    return f'idempotency:{digest}'
+
+
+def idempotent(view):
+    """Replay a viewset action's stored response for a repeated Idempotency-Key"""
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cache = caches[settings.IDEMPOTENCY_CACHE]
+        cache_key = idempotency_cache_key(request, key)
+        stored = cache.get(cache_key)
+        if stored is not None:
+            status_code, data = stored
+            response = Response(data, status=status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        response = view(self, request, *args, **kwargs)
+        if response.status_code < 500:
+            cache.set(cache_key, (response.status_code, response.data), settings.IDEMPOTENCY_KEY_TIMEOUT)
+        return response
+    return wrapper
@@ -0,0 +1,249 @@
+"""
+This module contains the live vote feed behind the vote_stream endpoint.
+
+Once a vote commits, the new tallies of the movies it touched are published
+for its event. A VoteBroker in each process fans them out to that event's open
+streams, each with its own bounded asyncio queue. A stream that falls
+VOTE_STREAM_QUEUE_SIZE messages behind has its queue dropped and is sent a
+fresh snapshot instead, so a slow client never holds memory or blocks the
+voters. Messages carry absolute counts, so a snapshot followed by messages it
+already includes is harmless.
+
+Messages cross worker processes through the VOTE_STREAM_BACKEND:
+LocalBackend delivers inside the process only (a single worker, tests), and
+CacheBackend relays them through a shared cache alias (Redis, Memcached).
+
+EventSource cannot send an Authorization header, so browsers open a stream
+with a signed ticket from vote_stream_ticket in the query string. A ticket
+only opens that event's stream and only for VOTE_STREAM_TICKET_MAX_AGE
+seconds, so one that ends up in an access log is of little use.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Queued in place of the messages a subscriber fell too far behind on
+RESYNC = object()
+
+STREAM_TICKET_SALT = 'events.vote_stream'
+
+
+class Subscription:
+    """One open stream's bounded queue of messages for an event"""
+
+    def __init__(self, event_id, queue_size):
+        self.event_id = event_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, message):
+        """Queue a message; runs on the subscriber's event loop"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self, timeout):
+        """The next message, or RESYNC; raises asyncio.TimeoutError when none arrives in time"""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class LocalBackend:
+    """Delivers messages to the subscribers of the publishing process only"""
+
+    local_only = True
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, event_id, message):
+        self.broker.deliver(event_id, message)
+
+    def listen(self, event_id):
+        pass
+
+    def unlisten(self, event_id):
+        pass
+
+
+class CacheBackend:
+    """
+    Relays messages between workers through a shared Django cache: each event
+    has a sequence counter and the recent messages under it, which a thread in
+    every worker polls for the events it has subscribers for.
+    """
+
+    local_only = False
+
+    def __init__(self, broker, cache_alias=None, poll_interval=None, ttl=60):
+        self.broker = broker
+        self.cache = caches[cache_alias or settings.VOTE_STREAM_CACHE]
+        self.poll_interval = poll_interval or settings.VOTE_STREAM_POLL_INTERVAL
+        self.ttl = ttl
+        self._positions = {}
+        self._lock = threading.Lock()
+        self._poller = None
+
+    def _seq_key(self, event_id):
+        return f'vote_stream:{event_id}:seq'
+
+    def _message_key(self, event_id, seq):
+        return f'vote_stream:{event_id}:{seq}'
+
+    def publish(self, event_id, message):
+        self.cache.add(self._seq_key(event_id), 0, None)
+        seq = self.cache.incr(self._seq_key(event_id))
+        self.cache.set(self._message_key(event_id, seq), message, self.ttl)
+
+    def listen(self, event_id):
+        with self._lock:
+            self._positions[event_id] = self.cache.get(self._seq_key(event_id), 0)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name='vote-stream-poller', daemon=True)
+                self._poller.start()
+
+    def unlisten(self, event_id):
+        with self._lock:
+            self._positions.pop(event_id, None)
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                positions = dict(self._positions)
+            if not positions:
+                continue
+            try:
+                latest = self.cache.get_many([self._seq_key(event_id) for event_id in positions])
+                for event_id, position in positions.items():
+                    seq = latest.get(self._seq_key(event_id), 0)
+                    if seq <= position:
+                        continue
+                    keys = [self._message_key(event_id, i) for i in range(position + 1, seq + 1)]
+                    messages = self.cache.get_many(keys)
+                    for key in keys:
+                        # An expired message leaves a gap only a snapshot can fill
+                        self.broker.deliver(event_id, messages.get(key, RESYNC))
+                    with self._lock:
+                        if event_id in self._positions:
+                            self._positions[event_id] = seq
+            except Exception as e:
+                logger.warning(f"Failed to poll the vote stream cache: {str(e)}")
+
+
+class VoteBroker:
+    """In-process fan-out of vote messages to the open streams of each event"""
+
+    def __init__(self, backend=None, queue_size=None):
+        self.queue_size = queue_size or settings.VOTE_STREAM_QUEUE_SIZE
+        self.backend = backend or import_string(settings.VOTE_STREAM_BACKEND)(self)
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(('published', 'delivered'), 0)
+
+    def subscribe(self, event_id):
+        """Open a subscription to an event's messages; call from the subscriber's event loop"""
+        subscription = Subscription(event_id, self.queue_size)
+        with self._lock:
+            self._subscriptions[event_id].add(subscription)
+            first = len(self._subscriptions[event_id]) == 1
+        if first:
+            self.backend.listen(event_id)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.event_id, set())
+            subscriptions.discard(subscription)
+            last = not subscriptions
+            if last:
+                self._subscriptions.pop(subscription.event_id, None)
+        if last:
+            self.backend.unlisten(subscription.event_id)
+
+    def has_listeners(self, event_id):
+        """False when no process can be streaming this event, so publishing can be skipped"""
+        if not self.backend.local_only:
+            return True
+        with self._lock:
+            return bool(self._subscriptions.get(event_id))
+
+    def publish(self, event_id, message):
+        """Send a message to every stream of the event, in any worker; safe from any thread"""
+        self._counters['published'] += 1
+        self.backend.publish(event_id, message)
+
+    def deliver(self, event_id, message):
+        """Hand a message to this process's subscribers of the event"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(event_id, ()))
+        for subscription in subscriptions:
+            self._counters['delivered'] += 1
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                pass  # its event loop has shut down
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['events'] = len(self._subscriptions)
+            stats['subscribers'] = sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+        return stats
+
+
+def publish_tallies(event_id, movie_ids):
+    """
+    Publish the current tallies of movie_ids and the event's voter count once the
+    current transaction commits; call after the vote's tally updates.
+    """
+    from .models import Event, VoteTally
+    from .tallies import TALLY_FIELDS
+
+    if not vote_broker.has_listeners(event_id):
+        return
+    message = {
+        'movies': {
+            movie_id: {'upvotes': upvotes, 'downvotes': downvotes, 'abstains': abstains,
+                       'total': upvotes + downvotes}
+            for movie_id, upvotes, downvotes, abstains in VoteTally.objects.filter(
+                event_id=event_id, movie_id__in=movie_ids
+            ).values_list('movie_id', *TALLY_FIELDS)
+        },
+        'voters': Event.objects.filter(id=event_id).values_list('voter_count', flat=True).first() or 0,
+    }
+    transaction.on_commit(lambda: vote_broker.publish(event_id, message))
+
+
+vote_broker = VoteBroker()
+
+
+def issue_stream_ticket(user_id, event_id, expires_at):
+    """A signed ticket that opens the event's vote stream for the user; the stream ends at expires_at"""
+    return signing.dumps({'user': user_id, 'event': event_id, 'exp': int(expires_at)}, salt=STREAM_TICKET_SALT)
+
+
+def read_stream_ticket(ticket, event_id):
+    """(user id, stream expiry) of a recent ticket for event_id, or (None, None)"""
+    try:
+        data = signing.loads(ticket, salt=STREAM_TICKET_SALT, max_age=settings.VOTE_STREAM_TICKET_MAX_AGE)
+    except signing.BadSignature:  # including SignatureExpired
+        return None, None
+    if data.get('event') != event_id:
+        return None, None
+    return data['user'], data['exp']
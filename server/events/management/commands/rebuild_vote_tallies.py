@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from events.models import Event, EventVoter, MovieVote, VoteTally
+from events.tallies import TALLY_FIELDS, count_votes, invalidate_tallies
+
+
+class Command(BaseCommand):
+    help = 'Verify the stored vote tallies against MovieVote and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, nargs='+', dest='event_ids', help='Only check these events')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without repairing it')
+
+    def handle(self, *args, **options):
+        event_ids = options['event_ids']
+        with transaction.atomic():
+            events = Event.objects.select_for_update()
+            tallies = VoteTally.objects.select_for_update()
+            if event_ids:
+                events = events.filter(id__in=event_ids)
+                tallies = tallies.filter(event_id__in=event_ids)
+            # Holds off vote writes while the counts are compared: new votes, voters and tally rows
+            # reference the locked events, and changed votes update the locked tallies or voter_count
+            stored_voters = dict(events.values_list('id', 'voter_count'))
+            stored = {
+                (tally.event_id, tally.movie_id): tally
+                for tally in tallies
+            }
+            counts, voters = count_votes(event_ids)
+            marked = EventVoter.objects.all()
+            voted = MovieVote.objects.all()
+            if event_ids:
+                marked = marked.filter(event_id__in=event_ids)
+                voted = voted.filter(event_id__in=event_ids)
+            marks = {
+                (event_id, user_id): mark_id
+                for mark_id, event_id, user_id in marked.values_list('id', 'event_id', 'user_id')
+            }
+            unmarked = [
+                EventVoter(event_id=event_id, user_id=user_id)
+                for event_id, user_id in voted.values_list('event_id', 'user_id').distinct().order_by()
+                if marks.pop((event_id, user_id), None) is None
+            ]
+            # Marks left have no votes behind them
+            unvoted = list(marks.values())
+
+            wrong, missing = [], []
+            for key, expected in counts.items():
+                tally = stored.pop(key, None)
+                if tally is None:
+                    missing.append(VoteTally(event_id=key[0], movie_id=key[1], **dict(zip(TALLY_FIELDS, expected))))
+                elif [getattr(tally, field) for field in TALLY_FIELDS] != expected:
+                    self.stdout.write(
+                        f'Event {key[0]} movie {key[1]}: stored '
+                        f'{[getattr(tally, field) for field in TALLY_FIELDS]}, counted {expected}'
+                    )
+                    for field, value in zip(TALLY_FIELDS, expected):
+                        setattr(tally, field, value)
+                    wrong.append(tally)
+            # Rows left in stored have no votes behind them
+            stale = [tally for tally in stored.values() if any(getattr(tally, field) for field in TALLY_FIELDS)]
+            wrong_voters = {
+                event_id: voters.get(event_id, 0)
+                for event_id, voter_count in stored_voters.items()
+                if voter_count != voters.get(event_id, 0)
+            }
+
+            drift = len(wrong) + len(missing) + len(stale) + len(wrong_voters) + len(unmarked) + len(unvoted)
+            if drift and not options['dry_run']:
+                VoteTally.objects.bulk_update(wrong, TALLY_FIELDS, batch_size=1000)
+                VoteTally.objects.bulk_create(missing, batch_size=1000)
+                VoteTally.objects.filter(id__in=[tally.id for tally in stale]).delete()
+                EventVoter.objects.bulk_create(unmarked, batch_size=1000)
+                EventVoter.objects.filter(id__in=unvoted).delete()
+                for event_id, voter_count in wrong_voters.items():
+                    Event.objects.filter(id=event_id).update(voter_count=voter_count)
+                for event_id in {key[0] for key in counts} | {tally.event_id for tally in stale} | set(wrong_voters):
+                    invalidate_tallies(event_id)
+
+        summary = (
+            f'Checked {len(stored_voters)} events: {len(wrong)} wrong, {len(missing)} missing and '
+            f'{len(stale)} stale tallies, {len(wrong_voters)} wrong voter counts, '
+            f'{len(unmarked)} missing and {len(unvoted)} stale voter marks'
+        )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(summary))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{summary} (dry run, nothing repaired)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{summary}; repaired'))
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_tallies(apps, schema_editor):
+    """Tally the votes cast before the table existed"""
+    Event = apps.get_model('events', 'Event')
+    MovieVote = apps.get_model('events', 'MovieVote')
+    VoteTally = apps.get_model('events', 'VoteTally')
+    VoteTally.objects.bulk_create(
+        [
+            VoteTally(**row)
+            for row in MovieVote.objects.values('event_id', 'movie_id').annotate(
+                upvotes=Count('id', filter=Q(vote=True)),
+                downvotes=Count('id', filter=Q(vote=False)),
+                abstains=Count('id', filter=Q(vote__isnull=True)),
+            ).order_by()
+        ],
+        batch_size=1000
+    )
+    for row in MovieVote.objects.values('event_id').annotate(voters=Count('user_id', distinct=True)).order_by():
+        Event.objects.filter(id=row['event_id']).update(voter_count=row['voters'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_delete_eventparticipant'),
+        ('movies', '0008_person_credit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='voter_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='VoteTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upvotes', models.PositiveIntegerField(default=0)),
+                ('downvotes', models.PositiveIntegerField(default=0)),
+                ('abstains', models.PositiveIntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vote_tallies', to='events.event')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movies.movie')),
+            ],
+            options={
+                'unique_together': {('event', 'movie')},
+            },
+        ),
+        migrations.RunPython(fill_tallies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_voters(apps, schema_editor):
+    """Mark the users who voted before the table existed"""
+    EventVoter = apps.get_model('events', 'EventVoter')
+    MovieVote = apps.get_model('events', 'MovieVote')
+    EventVoter.objects.bulk_create(
+        [
+            EventVoter(event_id=event_id, user_id=user_id)
+            for event_id, user_id in MovieVote.objects.values_list('event_id', 'user_id').distinct().order_by()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_vote_tally'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventVoter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='voters', to='events.event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('event', 'user')},
+            },
+        ),
+        migrations.RunPython(fill_voters, migrations.RunPython.noop),
+    ]
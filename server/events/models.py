@@ -10,6 +10,8 @@ class Event(models.Model):
     date = models.DateTimeField()
     location = models.CharField(max_length=200)
     movie_options = models.JSONField(default=list)
+    # Distinct users with at least one vote: the number of EventVoter rows, kept in step by the vote actions
+    voter_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -48,4 +50,29 @@ class MovieVote(models.Model):
         unique_together = ['event', 'movie', 'user']
 
     def __str__(self):
-        return f"{self.user.email} - {self.movie} - {self.vote}"
\ No newline at end of file
+        return f"{self.user.email} - {self.movie} - {self.vote}"
+
+class VoteTally(models.Model):
+    """Vote counts of one movie in one event, updated in the same transaction as the vote"""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='vote_tallies')
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
+    upvotes = models.PositiveIntegerField(default=0)
+    downvotes = models.PositiveIntegerField(default=0)
+    abstains = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['event', 'movie']
+
+    def __str__(self):
+        return f"{self.event} - {self.movie}: +{self.upvotes} -{self.downvotes}"
+
+class EventVoter(models.Model):
+    """Marks a user as having voted in an event, so first votes are counted with a conflict-free insert"""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='voters')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ['event', 'user']
+
+    def __str__(self):
+        return f"{self.user} - {self.event}"
@@ -0,0 +1,61 @@
+"""
+This module contains the signal handlers that keep an event's vote tallies
+current when votes are saved or deleted through the ORM outside the vote
+actions (admin, seed_events, cascades). The vote actions write with raw
+upserts and update(), which send no signals, and adjust the tallies themselves.
+Fixtures (loaddata, raw saves) are left alone: they load their own tallies, or
+rebuild_vote_tallies recounts them.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .live import publish_tallies
+from .models import MovieVote
+from .tallies import NO_VOTE, forget_voter, record_vote_change, record_voter
+
+
+@receiver(pre_save, sender=MovieVote)
+def remember_previous_vote(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._previous_vote = None
+    if instance.pk:
+        votes = MovieVote.objects.filter(pk=instance.pk)
+        if transaction.get_connection().in_atomic_block:
+            # Keep a concurrent vote action from changing the row between here and post_save
+            votes = votes.select_for_update()
+        instance._previous_vote = votes.values('event_id', 'movie_id', 'user_id', 'vote').first()
+
+
+@receiver(post_save, sender=MovieVote)
+def tally_saved_vote(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_vote', None)
+    instance._previous_vote = None
+    if previous and (previous['event_id'], previous['movie_id']) == (instance.event_id, instance.movie_id):
+        record_vote_change(instance.event_id, instance.movie_id, old=previous['vote'], new=instance.vote)
+    else:
+        if previous:
+            # The vote was moved to another event or movie: take it off the old one
+            untally(previous['event_id'], previous['movie_id'], previous['user_id'], previous['vote'])
+        record_vote_change(instance.event_id, instance.movie_id, new=instance.vote)
+    if not previous or (previous['event_id'], previous['user_id']) != (instance.event_id, instance.user_id):
+        record_voter(instance.event_id, instance.user_id)
+        if previous:
+            # The vote now belongs to another voter, who may have none left in the old event
+            forget_voter(previous['event_id'], previous['user_id'])
+    publish_tallies(instance.event_id, [instance.movie_id])
+
+
+def untally(event_id, movie_id, user_id, vote):
+    record_vote_change(event_id, movie_id, old=vote, new=NO_VOTE)
+    forget_voter(event_id, user_id)
+    publish_tallies(event_id, [movie_id])
+
+
+@receiver(post_delete, sender=MovieVote)
+def untally_vote(sender, instance, **kwargs):
+    untally(instance.event_id, instance.movie_id, instance.user_id, instance.vote)
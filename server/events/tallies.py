@@ -0,0 +1,233 @@
+"""
+This module contains the vote tallies behind EventViewSet.vote_results.
+
+VoteTally keeps each (event, movie)'s up/down/abstain counts and
+Event.voter_count the number of distinct voters. Both are adjusted with F()
+increments inside the transaction that writes the vote, from the vote's old
+and new value, so reading an event's results never scans MovieVote. Results
+are also cached per event in VOTE_RESULTS_CACHE until the next vote. The
+grouped aggregate over MovieVote is kept as the source of truth that
+rebuild_vote_tallies compares the table against.
+
+Each vote write first takes its user's EventVoter row in the event, inserting
+it on their first vote. That lock orders one user's concurrent writes without
+touching the event row, and a successful insert is what counts a new voter.
+Votes on one event only wait for each other on the counters they change: a
+movie's tally and, for first votes, voter_count, which is incremented last so
+its row is held only until the commit.
+
+Single votes are written by write_vote, an INSERT ... ON CONFLICT DO NOTHING
+that falls back to updating the locked existing row.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .models import Event, EventVoter, MovieVote, VoteTally
+
+# Marks the old value of a vote that did not exist, or the new value of one that was deleted
+NO_VOTE = object()
+
+TALLY_FIELDS = ('upvotes', 'downvotes', 'abstains')
+
+
+def tally_field(vote):
+    if vote is None:
+        return 'abstains'
+    return 'upvotes' if vote else 'downvotes'
+
+
+def tally_cache():
+    return caches[settings.VOTE_RESULTS_CACHE]
+
+
+def tally_key(event_id):
+    return f'vote_results:{event_id}'
+
+
+def invalidate_tallies(event_id):
+    """Drop an event's cached tallies once the current transaction commits"""
+    transaction.on_commit(lambda: tally_cache().delete(tally_key(event_id)))
+
+
+def decrement(field):
+    # Never below zero, even if the tallies drifted before rebuild_vote_tallies repairs them
+    return Greatest(F(field) - 1, 0)
+
+
+def record_vote_change(event_id, movie_id, old=NO_VOTE, new=NO_VOTE):
+    """Move one vote between tally counters; call inside the transaction that writes the vote"""
+    if old is not NO_VOTE and new is not NO_VOTE and tally_field(old) == tally_field(new):
+        return
+    changes = {}
+    if old is not NO_VOTE:
+        changes[tally_field(old)] = decrement(tally_field(old))
+    if new is not NO_VOTE:
+        changes[tally_field(new)] = F(tally_field(new)) + 1
+
+    tallies = VoteTally.objects.filter(event_id=event_id, movie_id=movie_id)
+    # A deleted vote never creates a row: its movie or event may be being deleted too
+    if not tallies.update(**changes) and new is not NO_VOTE:
+        VoteTally.objects.bulk_create([VoteTally(event_id=event_id, movie_id=movie_id)], ignore_conflicts=True)
+        tallies.update(**changes)
+    invalidate_tallies(event_id)
+
+
+def record_voter_change(event_id, joined=True):
+    """Count a user's first vote in an event, or (joined=False) the removal of their last one"""
+    Event.objects.filter(id=event_id).update(
+        voter_count=F('voter_count') + 1 if joined else decrement('voter_count')
+    )
+    invalidate_tallies(event_id)
+
+
+def insert_row(model, unique_fields, **values):
+    """
+    Insert a row unless one with the same unique_fields exists; the new row's
+    id, or None. Sends no save signals.
+    """
+    if connection.vendor in ('postgresql', 'sqlite'):
+        columns = ', '.join(model._meta.get_field(name).column for name in values)
+        conflict = ', '.join(model._meta.get_field(name).column for name in unique_fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {model._meta.db_table} ({columns}) VALUES ({", ".join(["%s"] * len(values))}) '
+                f'ON CONFLICT ({conflict}) DO NOTHING RETURNING id',
+                list(values.values())
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+    try:
+        with transaction.atomic():
+            # bulk_create sends no save signals; MovieVote's would tally the vote a second time
+            model.objects.bulk_create([model(**values)])
+    except IntegrityError:
+        return None
+    return model.objects.filter(**{name: values[name] for name in unique_fields}).values_list('id', flat=True).get()
+
+
+def insert_vote(event_id, movie_id, user_id, vote):
+    """Insert a vote unless the user already has one for the movie; the new row's id, or None"""
+    return insert_row(
+        MovieVote, ('event_id', 'movie_id', 'user_id'),
+        event_id=event_id, movie_id=movie_id, user_id=user_id, vote=vote
+    )
+
+
+def lock_voter(event_id, user_id):
+    """
+    Lock the user's EventVoter row in the event until the transaction ends,
+    inserting it if this is their first vote there; True if it was inserted.
+    Outside a transaction (autocommit ORM saves) the row is only inserted.
+    """
+    if insert_row(EventVoter, ('event_id', 'user_id'), event_id=event_id, user_id=user_id) is not None:
+        return True
+    if transaction.get_connection().in_atomic_block:
+        list(EventVoter.objects.select_for_update().filter(
+            event_id=event_id, user_id=user_id
+        ).values_list('id', flat=True))
+    return False
+
+
+def record_voter(event_id, user_id):
+    """Count the user as a voter of the event unless they already are; call after writing their vote"""
+    if lock_voter(event_id, user_id):
+        record_voter_change(event_id)
+
+
+def forget_voter(event_id, user_id):
+    """Stop counting the user as a voter of the event once their last vote in it is gone"""
+    if MovieVote.objects.filter(event_id=event_id, user_id=user_id).exists():
+        return
+    if EventVoter.objects.filter(event_id=event_id, user_id=user_id).delete()[0]:
+        record_voter_change(event_id, joined=False)
+
+
+def write_vote(event_id, movie_id, user_id, vote):
+    """
+    Upsert a user's vote and adjust the tallies from its previous value; call
+    inside a transaction. Returns the vote's id.
+
+    The insert either creates the row or, when a concurrent request already
+    has, leaves it for the locked update, so each vote is counted once and
+    double submits never raise IntegrityError. Only the user's EventVoter row
+    is locked, so votes by different users on one event run concurrently.
+    """
+    first_vote = lock_voter(event_id, user_id)
+    vote_id = insert_vote(event_id, movie_id, user_id, vote)
+    if vote_id is not None:
+        record_vote_change(event_id, movie_id, new=vote)
+    else:
+        vote_id, old = MovieVote.objects.select_for_update().filter(
+            event_id=event_id, movie_id=movie_id, user_id=user_id
+        ).values_list('id', 'vote').get()
+        if old != vote:
+            MovieVote.objects.filter(id=vote_id).update(vote=vote)
+            record_vote_change(event_id, movie_id, old=old, new=vote)
+    if first_vote:
+        record_voter_change(event_id)
+    return vote_id
+
+
+def stored_tallies(event_id):
+    """{movie_id: [upvotes, downvotes, abstains]} of an event from VoteTally, cached until its next vote"""
+    cache = tally_cache()
+    counts = cache.get(tally_key(event_id))
+    if counts is None:
+        counts = {
+            movie_id: [upvotes, downvotes, abstains]
+            for movie_id, upvotes, downvotes, abstains in VoteTally.objects.filter(
+                event_id=event_id
+            ).values_list('movie_id', *TALLY_FIELDS)
+        }
+        cache.set(tally_key(event_id), counts, settings.VOTE_RESULTS_CACHE_TIMEOUT)
+    return counts
+
+
+def count_votes(event_ids=None):
+    """
+    Tallies recomputed from MovieVote with grouped aggregates, for verifying the
+    stored ones: ({(event_id, movie_id): [upvotes, downvotes, abstains]}, {event_id: voters}).
+    """
+    votes = MovieVote.objects.all()
+    if event_ids is not None:
+        votes = votes.filter(event_id__in=event_ids)
+    counts = {
+        (row['event_id'], row['movie_id']): [row['upvotes'], row['downvotes'], row['abstains']]
+        for row in votes.values('event_id', 'movie_id').annotate(
+            upvotes=Count('id', filter=Q(vote=True)),
+            downvotes=Count('id', filter=Q(vote=False)),
+            abstains=Count('id', filter=Q(vote__isnull=True)),
+        ).order_by().iterator()
+    }
+    voters = dict(
+        votes.values('event_id').annotate(voters=Count('user_id', distinct=True)).order_by()
+        .values_list('event_id', 'voters')
+    )
+    return counts, voters
+
+
+def vote_results(event):
+    """
+    Tallies of each of the event's movie options keyed by movie id, plus the
+    event-wide 'totals' and the number of distinct 'voters'.
+    """
+    counts = stored_tallies(event.id)
+    results = {}
+    totals = {'upvotes': 0, 'downvotes': 0, 'abstains': 0, 'total': 0}
+    for movie_id in event.movie_options:
+        upvotes, downvotes, abstains = counts.get(movie_id, (0, 0, 0))
+        results[movie_id] = {
+            'upvotes': upvotes,
+            'downvotes': downvotes,
+            'abstains': abstains,
+            'total': upvotes + downvotes
+        }
+        for key, value in results[movie_id].items():
+            totals[key] += value
+    results['totals'] = totals
+    results['voters'] = event.voter_count
+    return results
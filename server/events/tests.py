@@ -1,3 +1,442 @@
-from django.test import TestCase
+import asyncio
+import io
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core import serializers
+from django.core.management import call_command
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+import requests
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from movies.models import Genre, Movie
+from movies.recommend import RecommendationEngine
+from .live import RESYNC, LocalBackend, VoteBroker, publish_tallies
+from .models import Event, EventInvitation, EventVoter, MovieVote, VoteTally
+from .tallies import TALLY_FIELDS, count_votes, write_vote
+
+
+class EventTestCase(TestCase):
+    """An event hosted by self.user with two catalogued movie options"""
+
+    def setUp(self):
+        cache.clear()  # cached vote results and idempotent responses
+        self.user = get_user_model().objects.create_user('host', 'host@example.com', 'password')
+        for movie_id in (1, 2):
+            Movie.objects.create(id=movie_id, tmdb_id=movie_id, title=f'Movie {movie_id}')
+        self.event = Event.objects.create(
+            host=self.user, title='Movie night', date=timezone.now() + timedelta(days=1),
+            location='Home', movie_options=[1, 2]
+        )
+
+    def stored_tallies(self):
+        return {
+            (tally.event_id, tally.movie_id): [getattr(tally, field) for field in TALLY_FIELDS]
+            for tally in VoteTally.objects.filter(event=self.event)
+            if any(getattr(tally, field) for field in TALLY_FIELDS)
+        }
+
+    def assertTalliesMatchVotes(self):
+        counts, voters = count_votes([self.event.id])
+        self.assertEqual(self.stored_tallies(), counts)
+        self.event.refresh_from_db(fields=['voter_count'])
+        self.assertEqual(self.event.voter_count, voters.get(self.event.id, 0))
+        self.assertEqual(
+            set(EventVoter.objects.filter(event=self.event).values_list('user_id', flat=True)),
+            set(MovieVote.objects.filter(event=self.event).values_list('user_id', flat=True))
+        )
+
+    def api_client(self, user=None):
+        client = APIClient()
+        client.force_authenticate(user or self.user)
+        return client
+
+
+def run(loop, coroutine):
+    return loop.run_until_complete(coroutine)
+
+
+class VoteBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.broker = VoteBroker(backend=None, queue_size=2)
+        self.assertIsInstance(self.broker.backend, LocalBackend)
+
+    def subscribe(self, event_id):
+        async def subscribe():
+            return self.broker.subscribe(event_id)
+        return run(self.loop, subscribe())
+
+    def test_messages_reach_only_the_event_subscribers(self):
+        subscription = self.subscribe(1)
+        other = self.subscribe(2)
+        self.broker.publish(1, {'voters': 1})
+        self.assertEqual(run(self.loop, subscription.get(1)), {'voters': 1})
+        with self.assertRaises(asyncio.TimeoutError):
+            run(self.loop, other.get(0.01))
+
+    def test_slow_subscriber_is_sent_resync(self):
+        subscription = self.subscribe(1)
+        for i in range(3):
+            self.broker.publish(1, i)
+        self.assertIs(run(self.loop, subscription.get(1)), RESYNC)
+        self.assertEqual(subscription.dropped, 2)
+
+    def test_unsubscribe_stops_listening(self):
+        subscription = self.subscribe(1)
+        self.assertTrue(self.broker.has_listeners(1))
+        self.broker.unsubscribe(subscription)
+        self.assertFalse(self.broker.has_listeners(1))
+        self.assertEqual(self.broker.stats()['subscribers'], 0)
+
+
+class PublishTalliesTests(EventTestCase):
+    def test_tallies_are_published_on_commit(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        broker = VoteBroker(backend=None)
+
+        async def subscribe():
+            return broker.subscribe(self.event.id)
+        subscription = run(loop, subscribe())
+
+        with mock.patch('events.live.vote_broker', broker):
+            with self.captureOnCommitCallbacks() as callbacks:
+                write_vote(self.event.id, 1, self.user.id, True)
+                publish_tallies(self.event.id, [1])
+            self.assertEqual(broker.stats()['published'], 0)
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(run(loop, subscription.get(1)), {
+            'movies': {1: {'upvotes': 1, 'downvotes': 0, 'abstains': 0, 'total': 1}},
+            'voters': 1,
+        })
+
+    def test_nothing_is_published_without_listeners(self):
+        broker = VoteBroker(backend=None)
+        with mock.patch('events.live.vote_broker', broker), self.captureOnCommitCallbacks(execute=True):
+            publish_tallies(self.event.id, [1])
+        self.assertEqual(broker.stats()['published'], 0)
+
+
+@override_settings(ROOT_URLCONF='server.asgi_urls')
+class VoteStreamTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.broker = VoteBroker(backend=None)
+        patcher = mock.patch('events.async_views.vote_broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def get_ticket(self, event_id=None):
+        token = str(AccessToken.for_user(self.user))
+        response = await self.async_client.post(
+            f'/api/events/{event_id or self.event.id}/vote_stream_ticket/', headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['ticket']
+
+    async def test_stream_starts_with_a_snapshot(self):
+        ticket = await self.get_ticket()
+        response = await self.async_client.get(f'/api/events/{self.event.id}/vote_stream/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        snapshot = await anext(chunks)
+        self.assertTrue(snapshot.startswith(b'event: snapshot\n'))
+        self.assertIn(b'"voters": 0', snapshot)
+        self.assertTrue(self.broker.has_listeners(self.event.id))
+        await chunks.aclose()
+
+    async def test_stream_that_never_starts_does_not_subscribe(self):
+        ticket = await self.get_ticket()
+        response = await self.async_client.get(f'/api/events/{self.event.id}/vote_stream/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.broker.has_listeners(self.event.id))
+
+    async def test_stream_requires_a_ticket_for_the_event(self):
+        token = str(AccessToken.for_user(self.user))
+        url = f'/api/events/{self.event.id}/vote_stream/'
+        self.assertEqual((await self.async_client.get(url, {'ticket': 'bad'})).status_code, 401)
+        # Access tokens are only taken from the Authorization header
+        self.assertEqual((await self.async_client.get(url, {'token': token})).status_code, 401)
+        other = await sync_to_async(Event.objects.create)(
+            host=self.user, title='Other', date=timezone.now(), location='Home', movie_options=[1]
+        )
+        self.assertEqual((await self.async_client.get(url, {'ticket': await self.get_ticket(other.id)})).status_code, 401)
+        with override_settings(VOTE_STREAM_TICKET_MAX_AGE=-1):
+            self.assertEqual((await self.async_client.get(url, {'ticket': await self.get_ticket()})).status_code, 401)
+
+        response = await self.async_client.get(
+            '/api/events/999/vote_stream/', headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class VoteSignalTests(EventTestCase):
+    def test_orm_saves_and_deletes_keep_tallies_current(self):
+        guest = get_user_model().objects.create_user('guest', 'guest@example.com', 'password')
+        with transaction.atomic():
+            vote = MovieVote.objects.create(event=self.event, movie_id=1, user=guest, vote=True)
+        self.assertTalliesMatchVotes()
+
+        vote.vote = False
+        with transaction.atomic():
+            vote.save()
+        self.assertTalliesMatchVotes()
+
+        vote.movie_id = 2
+        with transaction.atomic():
+            vote.save()
+        self.assertTalliesMatchVotes()
+
+        MovieVote.objects.create(event=self.event, movie_id=1, user=guest, vote=None)
+        self.assertTalliesMatchVotes()
+        self.assertEqual(self.event.voter_count, 1)
+
+        vote.user = self.user
+        vote.save()
+        self.assertTalliesMatchVotes()
+        self.assertEqual(self.event.voter_count, 2)
+        vote.user = guest
+        vote.save()
+        self.assertTalliesMatchVotes()
+        self.assertEqual(self.event.voter_count, 1)
+
+        MovieVote.objects.filter(user=guest).delete()
+        self.assertTalliesMatchVotes()
+        self.assertEqual(self.event.voter_count, 0)
+
+    def test_fixture_loads_are_not_tallied(self):
+        fixture = serializers.serialize('json', [MovieVote(id=10, event=self.event, movie_id=1, user=self.user, vote=True)])
+        for loaded in serializers.deserialize('json', fixture):
+            loaded.save()
+        self.assertEqual(MovieVote.objects.count(), 1)
+        self.assertEqual(self.stored_tallies(), {})
+
+
+class RebuildVoteTalliesTests(EventTestCase):
+    def test_drift_is_reported_and_repaired(self):
+        write_vote(self.event.id, 1, self.user.id, True)
+        VoteTally.objects.filter(event=self.event, movie_id=1).update(upvotes=5)
+        VoteTally.objects.create(event=self.event, movie_id=2, downvotes=3)
+        Event.objects.filter(id=self.event.id).update(voter_count=4)
+        EventVoter.objects.all().delete()
+        guest = get_user_model().objects.create_user('guest', 'guest@example.com', 'password')
+        EventVoter.objects.create(event=self.event, user=guest)
+
+        output = io.StringIO()
+        call_command('rebuild_vote_tallies', '--dry-run', stdout=output)
+        self.assertIn(
+            '1 wrong, 0 missing and 1 stale tallies, 1 wrong voter counts, 1 missing and 1 stale voter marks',
+            output.getvalue()
+        )
+        self.assertEqual(VoteTally.objects.get(event=self.event, movie_id=1).upvotes, 5)
+
+        call_command('rebuild_vote_tallies', '--event', str(self.event.id), stdout=io.StringIO())
+        self.assertTalliesMatchVotes()
+
+
+class VoteViewTests(EventTestCase):
+    def vote(self, movie_id, vote, client=None, key=None):
+        return (client or self.api_client()).post(
+            f'/api/events/{self.event.id}/vote/', {'movie_id': movie_id, 'vote': vote}, format='json',
+            headers={'Idempotency-Key': key} if key else None
+        )
+
+    def test_vote_is_upserted_and_tallied(self):
+        created = self.vote(1, True)
+        self.assertEqual(created.status_code, 200)
+        for vote in (False, None, None):
+            response = self.vote(1, vote)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['id'], created.data['id'])
+            self.assertEqual(response.data['vote'], vote)
+
+        self.assertEqual(MovieVote.objects.get().vote, None)
+        self.assertEqual(self.stored_tallies(), {(self.event.id, 1): [0, 0, 1]})
+        self.assertTalliesMatchVotes()
+        self.assertEqual(self.event.voter_count, 1)
+
+    def test_invalid_votes_are_rejected(self):
+        self.assertEqual(self.vote(3, True).status_code, 400)
+        self.assertEqual(self.vote(1, 'maybe').status_code, 400)
+        self.assertFalse(MovieVote.objects.exists())
+
+    def test_repeated_idempotency_key_replays_the_first_response(self):
+        first = self.vote(1, True, key='k1')
+        replay = self.vote(1, False, key='k1')
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.data, first.data)
+        self.assertIs(MovieVote.objects.get().vote, True)
+        self.assertEqual(self.stored_tallies(), {(self.event.id, 1): [1, 0, 0]})
+
+        self.assertEqual(self.vote(1, True, key='x' * 256).status_code, 400)
+
+    def test_idempotency_keys_are_per_user(self):
+        guest = get_user_model().objects.create_user('guest', 'guest@example.com', 'password')
+        EventInvitation.objects.create(event=self.event, email=guest.email)
+        self.vote(1, True, key='k1')
+        response = self.vote(1, False, client=self.api_client(guest), key='k1')
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(response.data['user'], guest.id)
+        self.assertEqual(self.stored_tallies(), {(self.event.id, 1): [1, 1, 0]})
+        self.assertTalliesMatchVotes()
+
+    def test_movie_missing_from_the_catalog_is_fetched(self):
+        Event.objects.filter(id=self.event.id).update(movie_options=[1, 2, 3])
+        with mock.patch('movies.catalog.get_tmdb_client') as get_client:
+            get_client.return_value.movie.return_value = {'id': 3, 'title': 'Movie 3'}
+            response = self.vote(3, True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Movie.objects.get(id=3).title, 'Movie 3')
+        self.assertEqual(self.stored_tallies(), {(self.event.id, 3): [1, 0, 0]})
+
+    def test_catalog_failures(self):
+        Event.objects.filter(id=self.event.id).update(movie_options=[1, 2, 3])
+        not_found = requests.HTTPError(response=mock.Mock(status_code=404))
+        with mock.patch('movies.catalog.get_tmdb_client') as get_client:
+            get_client.return_value.movie.side_effect = not_found
+            self.assertEqual(self.vote(3, True).status_code, 404)
+            get_client.return_value.movie.side_effect = requests.ConnectionError()
+            self.assertEqual(self.vote(3, True).status_code, 503)
+        self.assertFalse(MovieVote.objects.exists())
+
+
+class BatchVoteViewTests(EventTestCase):
+    def votes(self, votes):
+        return self.api_client().post(f'/api/events/{self.event.id}/votes/', {'votes': votes}, format='json')
+
+    def test_votes_are_written_together(self):
+        write_vote(self.event.id, 1, self.user.id, False)
+        response = self.votes([{'movie_id': 1, 'vote': True}, {'movie_id': 2, 'vote': None}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[1], {'upvotes': 1, 'downvotes': 0, 'abstains': 0, 'total': 1})
+        self.assertEqual(response.data[2], {'upvotes': 0, 'downvotes': 0, 'abstains': 1, 'total': 0})
+        self.assertEqual(response.data['voters'], 1)
+        self.assertEqual(MovieVote.objects.count(), 2)
+        self.assertTalliesMatchVotes()
+
+    def test_uncatalogued_movies_are_fetched_before_writing(self):
+        Event.objects.filter(id=self.event.id).update(movie_options=[1, 2, 3, 4])
+        with mock.patch('movies.catalog.get_tmdb_client') as get_client:
+            get_client.return_value.movie.side_effect = lambda tmdb_id: {'id': tmdb_id, 'title': f'Movie {tmdb_id}'}
+            response = self.votes([{'movie_id': 3, 'vote': True}, {'movie_id': 4, 'vote': False}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_client.return_value.movie.call_count, 2)
+        self.assertEqual(self.stored_tallies(), {(self.event.id, 3): [1, 0, 0], (self.event.id, 4): [0, 1, 0]})
+
+        with mock.patch('movies.catalog.get_tmdb_client') as get_client:
+            get_client.return_value.movie.side_effect = requests.ConnectionError()
+            Event.objects.filter(id=self.event.id).update(movie_options=[1, 2, 5])
+            response = self.votes([{'movie_id': 1, 'vote': True}, {'movie_id': 5, 'vote': True}])
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(MovieVote.objects.filter(movie_id=1).exists())
+
+    def test_one_invalid_vote_rejects_the_batch(self):
+        for votes in (
+            [{'movie_id': 1, 'vote': True}, {'movie_id': 3, 'vote': True}],
+            [{'movie_id': 1, 'vote': True}, {'movie_id': 1, 'vote': False}],
+            [{'movie_id': 1, 'vote': True}, {'movie_id': 2, 'vote': 'maybe'}],
+            [{'movie_id': 1}],
+            [],
+        ):
+            with self.subTest(votes=votes):
+                self.assertEqual(self.votes(votes).status_code, 400)
+        self.assertFalse(MovieVote.objects.exists())
+        self.assertTalliesMatchVotes()
+
+
+class WriteVoteTests(EventTestCase):
+    def test_fallback_insert_counts_each_vote_once(self):
+        # Backends without INSERT ... ON CONFLICT ... RETURNING insert through the ORM
+        with mock.patch('events.tallies.connection', mock.Mock(vendor='mysql')):
+            with transaction.atomic():
+                vote_id = write_vote(self.event.id, 1, self.user.id, True)
+            with transaction.atomic():
+                self.assertEqual(write_vote(self.event.id, 1, self.user.id, False), vote_id)
+            with transaction.atomic():
+                write_vote(self.event.id, 2, self.user.id, None)
+        self.assertEqual(self.stored_tallies(), {(self.event.id, 1): [0, 1, 0], (self.event.id, 2): [0, 0, 1]})
+        self.assertTalliesMatchVotes()
+        self.assertEqual(self.event.voter_count, 1)
+
+
+class MovieSuggestionsTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        action, comedy = Genre.objects.create(id=28, name='Action'), Genre.objects.create(id=35, name='Comedy')
+        Movie.objects.get(id=1).genres.set([action])
+        Movie.objects.get(id=2).genres.set([comedy])
+        for movie_id, genre in ((3, action), (4, comedy), (5, action)):
+            movie = Movie.objects.create(id=movie_id, tmdb_id=movie_id, title=f'Movie {movie_id}', popularity=movie_id)
+            movie.genres.set([genre])
+        self.engine = RecommendationEngine(rebuild_interval=0)
+        patcher = mock.patch('events.views.recommendation_engine', self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = f'/api/events/{self.event.id}/movie_suggestions/'
+
+    def suggested_ids(self, **params):
+        return [movie['id'] for movie in self.api_client().get(self.url, params).json()]
+
+    def test_suggestions_resemble_the_upvoted_options(self):
+        guest = get_user_model().objects.create_user('guest', 'guest@example.com', 'password')
+        MovieVote.objects.create(event=self.event, movie_id=1, user=guest, vote=True)
+        MovieVote.objects.create(event=self.event, movie_id=2, user=guest, vote=False)
+        self.engine.build()
+        self.assertEqual(self.suggested_ids(limit=2), [5, 3])
+
+    def test_before_the_engine_is_built_suggestions_share_genres(self):
+        with mock.patch('movies.recommend.submit_once') as submit_once:
+            self.assertEqual(self.suggested_ids(), [5, 4, 3])
+        submit_once.assert_called_once()
+
+    def test_limit_must_be_an_integer(self):
+        response = self.api_client().get(self.url, {'limit': 'many'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'limit must be an integer'})
+
+
+class VoteResultsTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/events/{self.event.id}/vote_results/'
+        guest = get_user_model().objects.create_user('guest', 'guest@example.com', 'password')
+        EventInvitation.objects.create(event=self.event, email=guest.email)
+        for user, movie_id, vote in ((self.user, 1, True), (guest, 1, False), (guest, 2, None)):
+            MovieVote.objects.create(event=self.event, movie_id=movie_id, user=user, vote=vote)
+
+    def test_results_are_tallied_per_option_with_totals_and_voters(self):
+        response = self.api_client().get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            '1': {'upvotes': 1, 'downvotes': 1, 'abstains': 0, 'total': 2},
+            '2': {'upvotes': 0, 'downvotes': 0, 'abstains': 1, 'total': 0},
+            'totals': {'upvotes': 1, 'downvotes': 1, 'abstains': 1, 'total': 2},
+            'voters': 2,
+        })
+
+    def test_tallies_are_cached_until_the_next_vote(self):
+        self.api_client().get(self.url)
+        VoteTally.objects.filter(event=self.event, movie_id=1).update(upvotes=5)
+        with self.assertNumQueries(2):  # the event and its invitations; the tallies come from the cache
+            self.assertEqual(self.api_client().get(self.url).json()['1']['upvotes'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_client().post(
+                f'/api/events/{self.event.id}/vote/', {'movie_id': 2, 'vote': True}, format='json'
+            )
+        results = self.api_client().get(self.url).json()
+        self.assertEqual((results['1']['upvotes'], results['2']['upvotes']), (5, 1))
 
-# Create your tests here.
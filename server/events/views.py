@@ -1,4 +1,4 @@
-from django.db.models import Q
+from django.db.models import Case, Q, Sum, When
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -13,14 +13,36 @@ from django.template.loader import render_to_string
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.db import models
+from django.db import models, transaction
+from django.core.exceptions import ValidationError
 import requests
+import logging
+import time
 
+from movies.catalog import catalog_movie_ids
 from movies.models import Movie
+from movies.tmdb import error_status
+from movies.recommend import recommendation_engine
 from movies.serializers import MovieSerializer
 from .models import Event, MovieVote, EventInvitation
+from .idempotency import idempotent
+from .live import issue_stream_ticket, publish_tallies
+from .tallies import NO_VOTE, lock_voter, record_vote_change, record_voter_change, vote_results, write_vote
 from .serializers import EventSerializer, MovieVoteSerializer, EventInvitationSerializer
 
+logger = logging.getLogger(__name__)
+
+
+def catalog_error(exc):
+    """Response for an event movie that could not be fetched into the catalog"""
+    if error_status(exc) == 404:
+        return Response({'error': 'Movie not found'}, status=status.HTTP_404_NOT_FOUND)
+    logger.error(f"TMDB API error: {str(exc)}")
+    return Response(
+        {'error': 'Failed to fetch movie details from TMDB'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
 class EventViewSet(viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
@@ -52,13 +74,13 @@ class EventViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=True, methods=['POST'])
+    @idempotent
     def vote(self, request, pk=None):
         """Submit a vote for a movie in an event"""
         event = self.get_object()
         movie_id = request.data.get('movie_id')
-        vote_value = request.data.get('vote')
 
-        if movie_id is None or vote_value is None:
+        if movie_id is None or 'vote' not in request.data:
             return Response(
                 {'error': 'movie_id and vote are required'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -71,23 +93,93 @@ class EventViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            movie = Movie.objects.get(tmdb_id=movie_id)
-        except Movie.DoesNotExist:
-            movie = Movie.objects.create(
-                tmdb_id=movie_id,
-                title=f'Movie {movie_id}',
-                id=movie_id
-            )
+            vote_value = MovieVote._meta.get_field('vote').to_python(request.data['vote'])
+        except ValidationError:
+            return Response({'error': 'vote must be true, false or null'}, status=status.HTTP_400_BAD_REQUEST)
 
-        vote, created = MovieVote.objects.update_or_create(
-            event=event,
-            movie=movie,
-            user=request.user,
-            defaults={'vote': vote_value}
-        )
+        try:
+            movie_pk = catalog_movie_ids([movie_id])[movie_id]
+        except requests.RequestException as e:
+            return catalog_error(e)
 
+        with transaction.atomic():
+            vote_id = write_vote(event.id, movie_pk, request.user.id, vote_value)
+            publish_tallies(event.id, [movie_pk])
+
+        vote = MovieVote(id=vote_id, event_id=event.id, movie_id=movie_pk, user_id=request.user.id, vote=vote_value)
         return Response(MovieVoteSerializer(vote).data)
 
+    @action(detail=True, methods=['POST'])
+    @idempotent
+    def votes(self, request, pk=None):
+        """Submit votes for several of an event's movies at once; returns the updated tallies"""
+        event = self.get_object()
+        items = request.data.get('votes') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': 'a non-empty list of {movie_id, vote} is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        vote_field = MovieVote._meta.get_field('vote')
+        votes = {}
+        for item in items:
+            if not isinstance(item, dict) or 'movie_id' not in item or 'vote' not in item:
+                return Response(
+                    {'error': 'each vote needs movie_id and vote'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            movie_id = item['movie_id']
+            if movie_id not in event.movie_options:
+                return Response(
+                    {'error': f'Invalid movie ID for this event: {movie_id}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if movie_id in votes:
+                return Response(
+                    {'error': f'Duplicate movie ID: {movie_id}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                votes[movie_id] = vote_field.to_python(item['vote'])
+            except ValidationError:
+                return Response(
+                    {'error': 'vote must be true, false or null'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        try:
+            movies = catalog_movie_ids(list(votes))
+        except requests.RequestException as e:
+            return catalog_error(e)
+
+        with transaction.atomic():
+            # Holds off the user's concurrent vote and votes requests until previous is written over
+            first_vote = lock_voter(event.id, request.user.id)
+            previous = dict(
+                MovieVote.objects.select_for_update().filter(
+                    event=event, user=request.user, movie_id__in=movies.values()
+                ).values_list('movie_id', 'vote')
+            )
+            MovieVote.objects.bulk_create(
+                [
+                    MovieVote(event=event, movie_id=movies[movie_id], user=request.user, vote=vote_value)
+                    for movie_id, vote_value in votes.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['event', 'movie', 'user'],
+                update_fields=['vote']
+            )
+            for movie_id, vote_value in votes.items():
+                movie_pk = movies[movie_id]
+                record_vote_change(event.id, movie_pk, old=previous.get(movie_pk, NO_VOTE), new=vote_value)
+            if first_vote:
+                record_voter_change(event.id)
+            publish_tallies(event.id, list(movies.values()))
+
+        event.refresh_from_db(fields=['voter_count'])
+        return Response(vote_results(event))
+
     @action(detail=True, methods=['post'])
     def invite_guests(self, request, pk=None):
         """Invite additional guests to an event"""
@@ -158,33 +250,20 @@ class EventViewSet(viewsets.ModelViewSet):
         Get voting results for an event
         """
         event = self.get_object()
-        results = {}
-
-        for tmdb_id in event.movie_options:
-            try:
-                movie = Movie.objects.get(tmdb_id=tmdb_id)
-                upvotes = MovieVote.objects.filter(
-                    event=event,
-                    movie=movie,
-                    vote=True
-                ).count()
-                downvotes = MovieVote.objects.filter(
-                    event=event,
-                    movie=movie,
-                    vote=False
-                ).count()
+        return Response(vote_results(event))
 
-                results[tmdb_id] = {
-                    'upvotes': upvotes,
-                    'downvotes': downvotes
-                }
-            except Movie.DoesNotExist:
-                results[tmdb_id] = {
-                    'upvotes': 0,
-                    'downvotes': 0
-                }
-
-        return Response(results)
+    @action(detail=True, methods=['POST'])
+    def vote_stream_ticket(self, request, pk=None):
+        """Issue a short-lived ticket for opening the event's vote_stream, which EventSource cannot send a token to"""
+        event = self.get_object()
+        if request.auth is not None:
+            expires_at = request.auth['exp']
+        else:
+            expires_at = time.time() + settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds()
+        return Response({
+            'ticket': issue_stream_ticket(request.user.id, event.id, expires_at),
+            'expires_in': settings.VOTE_STREAM_TICKET_MAX_AGE,
+        })
 
     @method_decorator(csrf_exempt)
     @action(detail=True, methods=['get', 'post'], permission_classes=[AllowAny])
@@ -284,28 +363,29 @@ class EventViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def movie_suggestions(self, request, pk=None):
-        """Get movie suggestions based on votes"""
+        """Suggest movies outside the event's options that resemble the ones its guests voted up"""
         event = self.get_object()
-        votes = MovieVote.objects.filter(event=event)
-        
-        movie_scores = {}
-        for vote in votes:
-            if vote.movie_id not in movie_scores:
-                movie_scores[vote.movie_id] = 0
-            movie_scores[vote.movie_id] += 1 if vote.vote else -1
-
-        suggested_movies = []
-        if movie_scores:
-            top_movies = sorted(
-                movie_scores.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:3]
-            suggested_movies = Movie.objects.filter(
-                id__in=[movie_id for movie_id, _ in top_movies]
-            )
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), settings.MOVIE_RECOMMEND_MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(MovieSerializer(suggested_movies, many=True).data)
+        scores = MovieVote.objects.filter(event=event, vote__isnull=False).values('movie_id').annotate(
+            score=Sum(Case(When(vote=True, then=1), default=-1))
+        )
+        liked = [row['movie_id'] for row in scores if row['score'] > 0]
+        disliked = [row['movie_id'] for row in scores if row['score'] < 0]
+        if not liked:
+            # Nothing voted up yet: suggest around the options themselves
+            liked = [movie_id for movie_id in event.movie_options if movie_id not in disliked]
+
+        suggested_ids = recommendation_engine.recommend(
+            liked, disliked, exclude_ids=event.movie_options, limit=max(limit, 1)
+        )
+        movies = Movie.objects.prefetch_related('genres').in_bulk(suggested_ids)
+        return Response(MovieSerializer(
+            [movies[movie_id] for movie_id in suggested_ids if movie_id in movies], many=True
+        ).data)
 
     @action(detail=True, methods=['post'])
     def finalize_movie(self, request, pk=None):
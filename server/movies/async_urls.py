@@ -0,0 +1,10 @@
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path('movies/popular/', async_views.popular, name='movie-popular-async'),
+    path('movies/search/', async_views.search, name='movie-search-async'),
+    path('movies/tmdb/batch/', async_views.tmdb_batch, name='movie-tmdb-batch-async'),
+    path('movies/tmdb/<int:tmdb_id>/', async_views.tmdb_details, name='movie-tmdb-details-async'),
+    path('movies/tmdb/<int:tmdb_id>/credits/', async_views.tmdb_credits, name='movie-tmdb-credits-async'),
+]
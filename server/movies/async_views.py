@@ -0,0 +1,234 @@
+"""
+Async versions of the read-only TMDB proxy actions of MovieViewSet.
+
+These are mounted in place of the sync actions when the project is served by
+server.asgi (see server/asgi_urls.py), so a single ASGI worker can keep many
+TMDB round trips in flight. They are plain Django views, so api_checks runs
+MovieViewSet's DRF authentication and throttle classes on each request first;
+responses, including 401 and 429 errors, match the sync actions.
+"""
+
+import asyncio
+import logging
+import math
+from functools import partial, wraps
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException, Throttled
+from rest_framework.request import Request
+
+from .cache import tmdb_cache, MISS
+from .catalog import catalog_details, store_movie_details
+from .pagination import decode_page_cursor, popular_response
+from .fallback import DEGRADED_HEADER, popular_fallback, details_fallback
+from .ingest import upsert_movies
+from .search import (
+    SEARCH_SOURCES, search_catalog, search_response, ingest_search_results, normalize_query, reuse_prefix_results
+)
+from .singleflight import async_tmdb_flight
+from .tmdb import get_async_tmdb_client, error_status
+from .utils import parse_tmdb_ids, parse_credit_filters
+from .credits import CREDIT_ROLES, load_movie_credits
+from .views import MovieViewSet
+
+logger = logging.getLogger(__name__)
+
+
+def check_request(request):
+    """Authenticate and throttle a request as MovieViewSet would; an error response, or None"""
+    view = MovieViewSet()
+    drf_request = Request(request, authenticators=[auth() for auth in view.authentication_classes])
+    try:
+        drf_request.user
+    except APIException as e:
+        # Shaped like rest_framework.views.exception_handler's response
+        response = JsonResponse(
+            e.detail if isinstance(e.detail, (list, dict)) else {'detail': e.detail},
+            status=e.status_code, safe=False
+        )
+        if drf_request.authenticators:
+            response['WWW-Authenticate'] = drf_request.authenticators[0].authenticate_header(drf_request)
+        return response
+
+    # Like APIView.check_throttles, every throttle records the request before any refuses it
+    waits = [
+        throttle.wait() for throttle in (throttle_class() for throttle_class in view.throttle_classes)
+        if not throttle.allow_request(drf_request, view)
+    ]
+    if waits:
+        wait = max((wait for wait in waits if wait is not None), default=None)
+        throttled = Throttled(wait)
+        response = JsonResponse({'detail': throttled.detail}, status=throttled.status_code)
+        if wait is not None:
+            response['Retry-After'] = str(math.ceil(wait))
+        return response
+    return None
+
+
+def api_checks(view):
+    """Run check_request before an async view, as DRF would before the sync action"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        error = await sync_to_async(check_request)(request)
+        if error is not None:
+            return error
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def tmdb_fetch(endpoint, params, afetch):
+    """Serve a TMDB call (afetch(client)) through the response cache, coalescing concurrent identical misses"""
+    return await tmdb_cache.aget_or_fetch(endpoint, params, afetch, flight=async_tmdb_flight)
+
+
+def tmdb_error(message):
+    return JsonResponse({'error': message}, status=503)
+
+
+def degraded(view, data, error):
+    """Serve local data in place of a failed TMDB call"""
+    logger.warning(f"TMDB unavailable, serving degraded {view} response: {str(error)}")
+    return JsonResponse(data, headers={DEGRADED_HEADER: 'true'})
+
+
+@require_GET
+@api_checks
+async def popular(request):
+    try:
+        page = decode_page_cursor(request.GET.get('cursor'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    try:
+        popular_data = await tmdb_fetch('popular', {'page': page}, lambda client: client.popular(page))
+    except httpx.HTTPError as e:
+        return degraded('popular', await sync_to_async(popular_fallback)(page), e)
+
+    return JsonResponse(popular_response(request, page, popular_data))
+
+
+@require_GET
+@api_checks
+async def search(request):
+    query = normalize_query(request.GET.get('query', ''))
+    if not query:
+        return JsonResponse({'error': 'Query parameter is required'}, status=400)
+
+    source = request.GET.get('source', 'auto')
+    if source not in SEARCH_SOURCES:
+        return JsonResponse({'error': f"source must be one of: {', '.join(SEARCH_SOURCES)}"}, status=400)
+
+    if source != 'tmdb':
+        results = await sync_to_async(search_catalog)(query)
+        if source == 'local' or len(results) >= settings.MOVIE_SEARCH_MIN_LOCAL_HITS:
+            return JsonResponse(search_response(results, 'local'))
+
+    prefix_data = reuse_prefix_results(query)
+    if prefix_data is not None:
+        return JsonResponse(prefix_data)
+
+    async def fetch_and_ingest(client):
+        return await sync_to_async(ingest_search_results)(await client.search(query))
+
+    try:
+        search_data = await tmdb_fetch('search', {'query': query}, fetch_and_ingest)
+        return JsonResponse({**search_data, 'source': 'tmdb'})
+    except httpx.HTTPError as e:
+        logger.error(f"TMDB API error: {str(e)}")
+        return tmdb_error('Failed to fetch movies from TMDB')
+
+
+async def fetch_movie_details(tmdb_id, client=None):
+    """Fetch details from TMDB and store them in the local catalog"""
+    movie_data = await (client or get_async_tmdb_client()).movie(tmdb_id)
+    return await sync_to_async(store_movie_details)(movie_data)
+
+
+@require_GET
+@api_checks
+async def tmdb_details(request, tmdb_id):
+    params = {'tmdb_id': tmdb_id}
+    fetch = partial(fetch_movie_details, tmdb_id)
+    try:
+        movie_data = tmdb_cache.aget_cached('details', params, fetch)
+        if movie_data is MISS:
+            movie_data = (await sync_to_async(catalog_details)([tmdb_id])).get(tmdb_id)
+        if movie_data is None:
+            movie_data = await tmdb_cache.afetch('details', params, fetch, flight=async_tmdb_flight)
+        return JsonResponse(movie_data)
+    except httpx.HTTPError as e:
+        movie_data = await sync_to_async(details_fallback)(tmdb_id)
+        if movie_data is not None:
+            return degraded('tmdb_details', movie_data, e)
+        logger.error(f"TMDB API error: {str(e)}")
+        return tmdb_error('Failed to fetch movie details from TMDB')
+
+
+@require_GET
+@api_checks
+async def tmdb_credits(request, tmdb_id):
+    filters, error = parse_credit_filters(request.GET, CREDIT_ROLES)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    try:
+        # Not thread-sensitive: a first request fetches from TMDB with the sync client
+        return JsonResponse(await sync_to_async(load_movie_credits, thread_sensitive=False)(tmdb_id, **filters))
+    except (httpx.HTTPError, requests.RequestException) as e:
+        logger.error(f"TMDB API error: {str(e)}")
+        return tmdb_error('Failed to fetch movie credits from TMDB')
+
+
+@require_GET
+@api_checks
+async def tmdb_batch(request):
+    tmdb_ids, error = parse_tmdb_ids(request.GET.get('ids', ''))
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    results = {}
+    missing = []
+    for tmdb_id in tmdb_ids:
+        movie_data = tmdb_cache.aget_cached(
+            'details', {'tmdb_id': tmdb_id}, partial(fetch_movie_details, tmdb_id)
+        )
+        if movie_data is MISS:
+            missing.append(tmdb_id)
+        else:
+            results[tmdb_id] = movie_data
+
+    if missing:
+        results.update(await sync_to_async(catalog_details)(missing))
+        missing = [tmdb_id for tmdb_id in missing if tmdb_id not in results]
+
+    outcomes = await asyncio.gather(*(
+        tmdb_cache.afetch(
+            'details', {'tmdb_id': tmdb_id}, lambda client, tmdb_id=tmdb_id: client.movie(tmdb_id),
+            flight=async_tmdb_flight
+        )
+        for tmdb_id in missing
+    ), return_exceptions=True)
+
+    errors = {}
+    fetched = []
+    for tmdb_id, outcome in zip(missing, outcomes):
+        if not isinstance(outcome, Exception):
+            results[tmdb_id] = outcome
+            fetched.append(outcome)
+        elif not isinstance(outcome, httpx.HTTPError):
+            raise outcome
+        else:
+            logger.error(f"TMDB API error for movie {tmdb_id}: {str(outcome)}")
+            errors[tmdb_id] = {'error': 'Failed to fetch movie details from TMDB', 'status': error_status(outcome)}
+    if fetched:
+        await sync_to_async(upsert_movies)(fetched, details=True)
+
+    return JsonResponse({
+        'results': {tmdb_id: results[tmdb_id] for tmdb_id in tmdb_ids if tmdb_id in results},
+        'errors': errors
+    })
@@ -0,0 +1,210 @@
+"""
+This module contains the in-memory title index behind the autocomplete endpoint.
+
+Titles are normalized (lowercased, accents and punctuation stripped) and kept
+in a sorted array with one entry per word start, so "wars" and "star w" both
+find "Star Wars". A lookup is a binary search plus a scan of the matching
+keys. Prefixes matching more than MOVIE_AUTOCOMPLETE_SCAN_LIMIT keys (typically
+one to three letters) walk the movies best rated first instead and stop at the
+first `limit` matches, and results for very short prefixes are memoized until
+the next write.
+
+The index is built in the background, at startup (warm_indexes) or on first
+use; until it is ready suggestions come from a title query on the Movie table.
+It is kept current by signals and the bulk ingest path, and rebuilt in the
+background every MOVIE_AUTOCOMPLETE_REBUILD_INTERVAL seconds to pick up writes
+made by other worker processes.
+"""
+
+import bisect
+import heapq
+import logging
+import sys
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+
+from django.conf import settings
+
+from .tasks import submit_once
+
+logger = logging.getLogger(__name__)
+
+Suggestion = namedtuple('Suggestion', ['id', 'title', 'release_date', 'poster_path', 'vote_average', 'popularity'])
+
+SUGGESTION_FIELDS = list(Suggestion._fields)
+
+# Prefixes this short match too many titles to rank on every keystroke
+MEMO_PREFIX_LENGTH = 3
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse everything but letters and digits to single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return ' '.join(''.join(char if char.isalnum() else ' ' for char in text).split())
+
+
+def index_keys(title):
+    """The title from each word onwards: 'star wars' -> ['star wars', 'wars']"""
+    words = normalize(title).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def rank_key(movie):
+    """Sort key putting the best rated (then most popular) movies first"""
+    return (-movie.vote_average, -movie.popularity, movie.id)
+
+
+class TitleIndex:
+    """Sorted array of normalized title keys with top-k prefix lookup"""
+
+    def __init__(self, rebuild_interval=None):
+        self.rebuild_interval = (
+            settings.MOVIE_AUTOCOMPLETE_REBUILD_INTERVAL if rebuild_interval is None else rebuild_interval
+        )
+        self._entries = []
+        self._ranked = []  # rank_key() of every movie, best first
+        self._movies = {}
+        self._memo = {}
+        self._lock = threading.RLock()
+        self._built_at = None
+
+    def _load(self):
+        from .models import Movie
+        return [Suggestion(*row) for row in Movie.objects.values_list(*SUGGESTION_FIELDS).iterator()]
+
+    def build(self):
+        """Replace the index with the current contents of the Movie table"""
+        started = time.monotonic()
+        movies = {movie.id: movie for movie in self._load()}
+        entries = sorted((key, movie.id) for movie in movies.values() for key in index_keys(movie.title))
+        ranked = sorted(rank_key(movie) for movie in movies.values())
+        with self._lock:
+            self._movies = movies
+            self._entries = entries
+            self._ranked = ranked
+            self._memo = {}
+            self._built_at = time.monotonic()
+        logger.info(
+            f"Built autocomplete index: {len(movies)} movies, {len(entries)} keys "
+            f"in {(time.monotonic() - started) * 1000:.0f}ms"
+        )
+
+    def ensure_built(self):
+        """Whether the index is ready; queues the first build in the background if not"""
+        if self._built_at is None:
+            submit_once('autocomplete-rebuild', self.build)
+            return False
+        if self.rebuild_interval and time.monotonic() - self._built_at > self.rebuild_interval:
+            submit_once('autocomplete-rebuild', self.build)
+        return True
+
+    def _remove(self, movie_id):
+        movie = self._movies.pop(movie_id, None)
+        if movie is None:
+            return
+        for key in index_keys(movie.title):
+            position = bisect.bisect_left(self._entries, (key, movie_id))
+            if position < len(self._entries) and self._entries[position] == (key, movie_id):
+                del self._entries[position]
+        position = bisect.bisect_left(self._ranked, rank_key(movie))
+        if position < len(self._ranked) and self._ranked[position] == rank_key(movie):
+            del self._ranked[position]
+
+    def upsert(self, movies):
+        """Add or replace movies (Movie instances or Suggestions) in an already built index"""
+        with self._lock:
+            if self._built_at is None:
+                return
+            for movie in movies:
+                suggestion = Suggestion(*(getattr(movie, field) for field in SUGGESTION_FIELDS))
+                self._remove(suggestion.id)
+                self._movies[suggestion.id] = suggestion
+                for key in index_keys(suggestion.title):
+                    bisect.insort(self._entries, (key, suggestion.id))
+                bisect.insort(self._ranked, rank_key(suggestion))
+            self._memo = {}
+
+    def remove(self, movie_ids):
+        with self._lock:
+            if self._built_at is None:
+                return
+            for movie_id in movie_ids:
+                self._remove(movie_id)
+            self._memo = {}
+
+    def suggest(self, query, limit=10):
+        """Top `limit` movies with a title word starting with query, best rated first"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if not self.ensure_built():
+            return self._suggest_from_database(query, limit)
+
+        with self._lock:
+            memo_key = (prefix, limit)
+            if memo_key in self._memo:
+                return self._memo[memo_key]
+
+            start = bisect.bisect_left(self._entries, (prefix,))
+            end = bisect.bisect_left(self._entries, (prefix + '\U0010ffff',), lo=start)
+            if end - start > settings.MOVIE_AUTOCOMPLETE_SCAN_LIMIT:
+                suggestions = self._best_rated_matching(prefix, limit)
+            else:
+                ids = {movie_id for _, movie_id in self._entries[start:end]}
+                suggestions = heapq.nlargest(
+                    limit,
+                    (self._movies[movie_id] for movie_id in ids),
+                    key=lambda movie: (movie.vote_average, movie.popularity)
+                )
+            if len(prefix) <= MEMO_PREFIX_LENGTH:
+                self._memo[memo_key] = suggestions
+        return suggestions
+
+    def _best_rated_matching(self, prefix, limit):
+        """
+        The first `limit` movies in rating order with a key starting with prefix; only
+        used when many keys match, so the walk stops long before the end of the list.
+        """
+        suggestions = []
+        for _, _, movie_id in self._ranked:
+            movie = self._movies[movie_id]
+            if any(key.startswith(prefix) for key in index_keys(movie.title)):
+                suggestions.append(movie)
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+    def _suggest_from_database(self, query, limit):
+        """Degraded lookup while the index is being built: titles starting with query"""
+        from .models import Movie
+
+        movies = Movie.objects.filter(title__istartswith=query.strip()).order_by('-vote_average', '-popularity')
+        return [Suggestion(*row) for row in movies.values_list(*SUGGESTION_FIELDS)[:limit]]
+
+    def memory_usage(self):
+        """Approximate bytes held by the index (containers, keys and stored rows)"""
+        with self._lock:
+            size = sys.getsizeof(self._entries) + sys.getsizeof(self._movies) + sys.getsizeof(self._ranked)
+            size += sum(sys.getsizeof(key) for key in self._ranked)
+            keys = set()
+            for entry in self._entries:
+                size += sys.getsizeof(entry)
+                keys.add(entry[0])
+            size += sum(sys.getsizeof(key) for key in keys)
+            for movie in self._movies.values():
+                size += sys.getsizeof(movie) + sum(sys.getsizeof(value) for value in movie)
+        return size
+
+    def stats(self):
+        with self._lock:
+            built_at = self._built_at
+            stats = {'movies': len(self._movies), 'keys': len(self._entries)}
+        stats['memory_bytes'] = self.memory_usage()
+        stats['age_seconds'] = round(time.monotonic() - built_at) if built_at is not None else None
+        return stats
+
+
+title_index = TitleIndex()
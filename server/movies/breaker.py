@@ -0,0 +1,119 @@
+"""
+This module contains the circuit breaker that guards calls to TMDB.
+
+The breaker watches a rolling window of recent calls. Once enough of them have
+failed, or have been slow, it opens and calls fail immediately with
+CircuitOpenError instead of tying up a worker for a full timeout. After a
+cool-down it lets a few probe calls through (half-open): if they succeed it
+closes again, otherwise it re-opens. One breaker is shared by the sync and
+async clients of a process, since they talk to the same upstream.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+import httpx
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(requests.RequestException, httpx.HTTPError):
+    """Raised instead of calling TMDB while the circuit is open; caught by both clients' error handlers"""
+
+    def __init__(self, message='TMDB circuit breaker is open'):
+        super().__init__(message)
+
+
+class CircuitBreaker:
+    """Error-rate and latency driven breaker with a half-open probing state"""
+
+    def __init__(self, name, window=None, min_calls=None, failure_rate=None, slow_call_duration=None,
+                 slow_call_rate=None, open_seconds=None, half_open_calls=None):
+        self.name = name
+        self.window = window or settings.TMDB_BREAKER_WINDOW
+        self.min_calls = min_calls or settings.TMDB_BREAKER_MIN_CALLS
+        self.failure_rate = failure_rate or settings.TMDB_BREAKER_FAILURE_RATE
+        self.slow_call_duration = slow_call_duration or settings.TMDB_BREAKER_SLOW_CALL_DURATION
+        self.slow_call_rate = slow_call_rate or settings.TMDB_BREAKER_SLOW_CALL_RATE
+        self.open_seconds = open_seconds or settings.TMDB_BREAKER_OPEN_SECONDS
+        self.half_open_calls = half_open_calls or settings.TMDB_BREAKER_HALF_OPEN_CALLS
+        self.state = CLOSED
+        self._calls = deque()  # (finished_at, failed, slow)
+        self._opened_at = None
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(('rejected', 'opened'), 0)
+
+    def _transition(self, state):
+        logger.warning(f"Circuit breaker {self.name!r} {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._counters['opened'] += 1
+        elif state == CLOSED:
+            self._calls.clear()
+        self._probes = 0
+        self._probe_successes = 0
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError; every admitted call must be followed by record()"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN)
+            if self.state == OPEN or (self.state == HALF_OPEN and self._probes >= self.half_open_calls):
+                self._counters['rejected'] += 1
+                raise CircuitOpenError()
+            if self.state == HALF_OPEN:
+                self._probes += 1
+
+    def record(self, duration, failed=False):
+        """Report the outcome of an admitted call; failed means TMDB is unhealthy, not e.g. a 404"""
+        slow = duration >= self.slow_call_duration
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._transition(OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._transition(CLOSED)
+                return
+            if self.state == OPEN:
+                return
+
+            self._calls.append((now, failed, slow))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+            slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+            if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+                self._transition(OPEN)
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self.state == OPEN
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['state'] = self.state
+            stats['window_calls'] = len(self._calls)
+            stats['window_failures'] = sum(1 for _, failed, _ in self._calls if failed)
+        return stats
+
+
+tmdb_breaker = CircuitBreaker('tmdb')
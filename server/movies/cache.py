@@ -0,0 +1,206 @@
+"""
+This module contains the in-process response cache for the TMDB proxy endpoints.
+
+Entries live for a per-endpoint TTL, the cache is bounded with LRU eviction,
+and expired entries are still served for a grace period while a background
+job refreshes them (stale-while-revalidate).
+
+Fetch functions take the TMDB client to call, so the cache picks the priority:
+a request's own fetch runs at INTERACTIVE, and background refreshes at
+PREFETCH, behind interactive calls.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .tasks import submit_once
+from .throttle import INTERACTIVE, PREFETCH
+from .tmdb import get_async_tmdb_client, get_tmdb_client
+
+logger = logging.getLogger(__name__)
+
+MISS = object()
+
+
+class CacheEntry:
+    __slots__ = ('value', 'expires_at', 'stale_until')
+
+    def __init__(self, value, ttl, stale_ttl):
+        now = time.monotonic()
+        self.value = value
+        self.expires_at = now + ttl
+        self.stale_until = self.expires_at + stale_ttl
+
+
+class ResponseCache:
+    """TTL + LRU cache of decoded TMDB responses, keyed by endpoint and params"""
+
+    def __init__(self, max_entries=None, ttls=None, stale_ttl=None):
+        self.max_entries = max_entries or settings.TMDB_CACHE_MAX_ENTRIES
+        self.ttls = ttls or settings.TMDB_CACHE_TTLS
+        self.stale_ttl = settings.TMDB_CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._async_refreshes = {}
+        self._counters = dict.fromkeys(
+            ('hits', 'stale_hits', 'misses', 'evictions', 'refreshes', 'refresh_errors'), 0
+        )
+
+    @staticmethod
+    def make_key(endpoint, params=None):
+        return (endpoint, tuple(sorted((params or {}).items())))
+
+    def ttl_for(self, endpoint):
+        return self.ttls.get(endpoint, self.ttls['default'])
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def lookup(self, key):
+        """Return (value, state) where state is 'fresh', 'stale' or None for a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            if now >= entry.stale_until:
+                # Left for LRU eviction: degraded responses still peek() at it while TMDB is down
+                return None, None
+            self._entries.move_to_end(key)
+            return entry.value, 'fresh' if now < entry.expires_at else 'stale'
+
+    def peek(self, key):
+        """Return a cached value regardless of age, without touching LRU order or counters"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.value if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl_for(key[0]) if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = CacheEntry(value, ttl, self.stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _refresh(self, key, fetch):
+        try:
+            self.set(key, fetch(get_tmdb_client(PREFETCH)))
+            self._count('refreshes')
+        except Exception as e:
+            self._count('refresh_errors')
+            logger.warning(f"Failed to refresh cached TMDB response {key!r}: {str(e)}")
+
+    def get_cached(self, endpoint, params, fetch):
+        """
+        Return the cached response for endpoint+params, or MISS. Stale entries are
+        returned immediately and refreshed in the background with fetch(client)
+        at PREFETCH priority.
+        """
+        key = self.make_key(endpoint, params)
+        value, state = self.lookup(key)
+        if state == 'fresh':
+            self._count('hits')
+            return value
+        if state == 'stale':
+            self._count('stale_hits')
+            submit_once(('cache-refresh', key), self._refresh, key, fetch)
+            return value
+        self._count('misses')
+        return MISS
+
+    def fetch(self, endpoint, params, fetch, flight=None, priority=INTERACTIVE):
+        """
+        Call fetch(client) with the TMDB client at `priority` and cache its result.
+        Errors are never cached. When a SingleFlight is given, concurrent calls for
+        the same key share one fetch.
+        """
+        key = self.make_key(endpoint, params)
+        client = get_tmdb_client(priority)
+        if flight is None:
+            return self._fetch_and_store(key, fetch, client)
+        return flight.do(key, lambda: self._fetch_and_store(key, fetch, client))
+
+    def get_or_fetch(self, endpoint, params, fetch, flight=None):
+        """Return the cached response for endpoint+params, calling fetch(client) on a miss"""
+        value = self.get_cached(endpoint, params, fetch)
+        if value is MISS:
+            value = self.fetch(endpoint, params, fetch, flight)
+        return value
+
+    def _fetch_and_store(self, key, fetch, client):
+        value = fetch(client)
+        self.set(key, value)
+        return value
+
+    async def _arefresh(self, key, afetch):
+        try:
+            self.set(key, await afetch(get_async_tmdb_client().with_priority(PREFETCH)))
+            self._count('refreshes')
+        except Exception as e:
+            self._count('refresh_errors')
+            logger.warning(f"Failed to refresh cached TMDB response {key!r}: {str(e)}")
+        finally:
+            self._async_refreshes.pop(key, None)
+
+    def aget_cached(self, endpoint, params, afetch):
+        """Async counterpart of get_cached(); stale entries are refreshed in an asyncio task"""
+        key = self.make_key(endpoint, params)
+        value, state = self.lookup(key)
+        if state == 'fresh':
+            self._count('hits')
+            return value
+        if state == 'stale':
+            self._count('stale_hits')
+            if key not in self._async_refreshes:
+                self._async_refreshes[key] = asyncio.ensure_future(self._arefresh(key, afetch))
+            return value
+        self._count('misses')
+        return MISS
+
+    async def afetch(self, endpoint, params, afetch, flight=None):
+        """Async counterpart of fetch(), with the event loop's async TMDB client"""
+        key = self.make_key(endpoint, params)
+        client = get_async_tmdb_client()
+        if flight is None:
+            return await self._afetch_and_store(key, afetch, client)
+        return await flight.do(key, lambda: self._afetch_and_store(key, afetch, client))
+
+    async def aget_or_fetch(self, endpoint, params, afetch, flight=None):
+        """Async counterpart of get_or_fetch(); afetch(client) is a coroutine function"""
+        value = self.aget_cached(endpoint, params, afetch)
+        if value is MISS:
+            value = await self.afetch(endpoint, params, afetch, flight)
+        return value
+
+    async def _afetch_and_store(self, key, afetch, client):
+        value = await afetch(client)
+        self.set(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['stale_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+tmdb_cache = ResponseCache()
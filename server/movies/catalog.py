@@ -0,0 +1,77 @@
+"""
+This module contains reads of movie details from the local catalog.
+
+Details stored by ingest.upsert_movies(details=True) are served directly while
+they are younger than TMDB_CATALOG_MAX_AGE. Older rows are still served, and a
+background job refreshes them from TMDB.
+"""
+
+from .cache import tmdb_cache
+from .ingest import upsert_movies
+from .models import Movie
+from .tasks import run_concurrently, submit_once
+from .throttle import PREFETCH
+from .tmdb import get_tmdb_client
+
+
+def store_movie_details(movie_data):
+    """Write a TMDB details payload to the catalog and return it unchanged"""
+    upsert_movies([movie_data], details=True)
+    return movie_data
+
+
+def fetch_movie_details(tmdb_id, client=None):
+    """Fetch details from TMDB and store them in the catalog"""
+    return store_movie_details((client or get_tmdb_client()).movie(tmdb_id))
+
+
+def refresh_movie_details(tmdb_id):
+    movie_data = fetch_movie_details(tmdb_id, get_tmdb_client(PREFETCH))
+    tmdb_cache.set(tmdb_cache.make_key('details', {'tmdb_id': tmdb_id}), movie_data)
+
+
+def catalog_details(tmdb_ids):
+    """
+    Return {tmdb_id: payload} for the ids that have stored details, in one query.
+    Fresh rows are also put in the response cache; stale rows are included and
+    queued for a background refresh.
+    """
+    found = {}
+    rows = Movie.objects.filter(tmdb_id__in=tmdb_ids, tmdb_payload__isnull=False).only(
+        'id', 'tmdb_id', 'tmdb_payload', 'fetched_at'
+    )
+    for movie in rows:
+        if movie.is_fresh:
+            tmdb_cache.set(tmdb_cache.make_key('details', {'tmdb_id': movie.tmdb_id}), movie.tmdb_payload)
+        else:
+            submit_once(('catalog-refresh', movie.tmdb_id), refresh_movie_details, movie.tmdb_id)
+        found[movie.tmdb_id] = movie.tmdb_payload
+    return found
+
+
+def catalog_movie_ids(tmdb_ids):
+    """
+    {tmdb_id: Movie id} for tmdb_ids. Movies not in the catalog yet are fetched
+    from TMDB concurrently and stored with one upsert; if any fetch failed, its
+    requests.RequestException is raised once the others are stored.
+    """
+    movies = dict(Movie.objects.filter(tmdb_id__in=tmdb_ids).values_list('tmdb_id', 'id'))
+    missing = [tmdb_id for tmdb_id in tmdb_ids if tmdb_id not in movies]
+    if not missing:
+        return movies
+
+    errors = {}
+    fetched = []
+    for tmdb_id, movie_data, exc in run_concurrently(get_tmdb_client().movie, missing):
+        if exc is None:
+            fetched.append(movie_data)
+        else:
+            errors[tmdb_id] = exc
+    if fetched:
+        upsert_movies(fetched, details=True)
+        # Movies ingested from TMDB use their TMDB id as primary key
+        movies.update((movie_data['id'], movie_data['id']) for movie_data in fetched)
+    for tmdb_id in missing:
+        if tmdb_id in errors:
+            raise errors[tmdb_id]
+    return movies
@@ -0,0 +1,77 @@
+"""
+This module contains reads of cast and crew from the local Person and Credit tables.
+
+Credits are fetched from TMDB once per movie, together with its details
+(append_to_response=credits), and served from the database afterwards. The
+sync_movies command keeps them current along with the details.
+"""
+
+from .cache import tmdb_cache
+from .ingest import upsert_movies
+from .models import Credit, Movie
+from .singleflight import tmdb_flight
+from .tmdb import get_tmdb_client
+
+CREDIT_ROLES = (Credit.CAST, Credit.CREW)
+
+
+def credits_stored(tmdb_id):
+    return Movie.objects.filter(tmdb_id=tmdb_id, credits_fetched_at__isnull=False).exists()
+
+
+def fetch_movie_credits(tmdb_id, client=None):
+    """Fetch details and credits in one TMDB call and store both"""
+    movie_data = (client or get_tmdb_client()).movie(tmdb_id, append_to_response='credits')
+    upsert_movies([movie_data], details=True)
+    details = {key: value for key, value in movie_data.items() if key != 'credits'}
+    tmdb_cache.set(tmdb_cache.make_key('details', {'tmdb_id': tmdb_id}), details)
+
+
+def cast_entry(credit):
+    return {
+        'id': credit.person_id,
+        'name': credit.person.name,
+        'character': credit.character,
+        'profile_path': credit.person.profile_path,
+        'order': credit.order,
+        'credit_id': credit.credit_id,
+        'known_for_department': credit.person.known_for_department,
+    }
+
+
+def crew_entry(credit):
+    return {
+        'id': credit.person_id,
+        'name': credit.person.name,
+        'job': credit.job,
+        'department': credit.department,
+        'profile_path': credit.person.profile_path,
+        'credit_id': credit.credit_id,
+    }
+
+
+def movie_credits(tmdb_id, limit=None, role=None, job=None, department=None):
+    """
+    Stored cast (in billing order) and crew of a movie, in TMDB's credits shape.
+    limit caps each list; role keeps only cast or crew; job and department filter the crew.
+    """
+    credits = Credit.objects.filter(movie_id=tmdb_id).select_related('person')
+    response = {'id': tmdb_id, 'cast': [], 'crew': []}
+    if role in (None, Credit.CAST):
+        cast = credits.filter(role=Credit.CAST).order_by('order', 'id')
+        response['cast'] = [cast_entry(credit) for credit in cast[:limit]]
+    if role in (None, Credit.CREW):
+        crew = credits.filter(role=Credit.CREW).order_by('id')
+        if job:
+            crew = crew.filter(job__iexact=job)
+        if department:
+            crew = crew.filter(department__iexact=department)
+        response['crew'] = [crew_entry(credit) for credit in crew[:limit]]
+    return response
+
+
+def load_movie_credits(tmdb_id, **filters):
+    """Serve credits from the database, fetching them from TMDB first if they were never stored"""
+    if not credits_stored(tmdb_id):
+        tmdb_flight.do(('credits', tmdb_id), lambda: fetch_movie_credits(tmdb_id))
+    return movie_credits(tmdb_id, **filters)
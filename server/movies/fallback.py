@@ -0,0 +1,59 @@
+"""
+This module contains the degraded responses served when TMDB cannot be reached,
+typically while the circuit breaker is open. They are built from the last
+cached TMDB responses (whatever their age) or from local Movie rows, and are
+marked with 'degraded': True and the X-Degraded header.
+"""
+
+from django.utils import timezone
+
+from .cache import tmdb_cache
+from .models import Movie
+
+DEGRADED_HEADER = 'X-Degraded'
+
+FALLBACK_PAGE_SIZE = 20
+
+
+def cached_response(endpoint, params):
+    return tmdb_cache.peek(tmdb_cache.make_key(endpoint, params))
+
+
+def popular_fallback(page=1):
+    """Popular page `page` as last cached, or the local movies at that position by popularity"""
+    cached = cached_response('popular', {'page': page})
+    if cached is not None:
+        results = cached['results']
+    else:
+        offset = (page - 1) * FALLBACK_PAGE_SIZE
+        movies = Movie.objects.prefetch_related('genres').order_by('-popularity', '-id')[
+            offset:offset + FALLBACK_PAGE_SIZE
+        ]
+        results = [movie.as_tmdb_result() for movie in movies]
+    return {
+        'page': page,
+        'results': results,
+        'total_pages': page,
+        'total_results': len(results),
+        'next': None,
+        'previous': None,
+        'degraded': True
+    }
+
+
+def upcoming_fallback():
+    """Local movies releasing from today on, soonest first"""
+    return Movie.objects.prefetch_related('genres').filter(
+        release_date__gte=timezone.localdate()
+    ).order_by('release_date')[:FALLBACK_PAGE_SIZE]
+
+
+def details_fallback(tmdb_id):
+    """The last cached or stored details for a movie, or None if there is nothing local"""
+    movie_data = cached_response('details', {'tmdb_id': tmdb_id})
+    if movie_data is None:
+        movie = Movie.objects.prefetch_related('genres').filter(tmdb_id=tmdb_id).first()
+        if movie is None:
+            return None
+        movie_data = movie.tmdb_payload or movie.as_tmdb_result()
+    return {**movie_data, 'degraded': True}
@@ -0,0 +1,164 @@
+"""
+This module contains the in-memory genre registry and the genre inverted index.
+
+The registry caches the Genre table (a few dozen rows) so ingest and request
+code never query it per movie; fetch_genres refreshes it after writing, and it
+reloads itself every GENRE_REGISTRY_TTL seconds. The inverted index maps each
+genre to a sorted NumPy array of movie ids, so "movies in genres 28 and 12" is
+an array intersection instead of a join. The index is built in the background,
+at startup (warm_indexes) or on first use, and lookups query the genre links
+table until it is ready. Movies written afterwards are marked dirty and merged
+into the arrays before the next lookup.
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count
+
+from .tasks import submit_once
+
+logger = logging.getLogger(__name__)
+
+MATCH_ALL = 'all'
+MATCH_ANY = 'any'
+MATCH_MODES = (MATCH_ALL, MATCH_ANY)
+
+
+class GenreRegistry:
+    """Cached {genre id: name} of the Genre table"""
+
+    def __init__(self, ttl=None):
+        self.ttl = settings.GENRE_REGISTRY_TTL if ttl is None else ttl
+        self._names = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        from .models import Genre
+        names = dict(Genre.objects.values_list('id', 'name'))
+        with self._lock:
+            self._names = names
+            self._loaded_at = time.monotonic()
+        return names
+
+    def names(self):
+        names, loaded_at = self._names, self._loaded_at
+        if names is None or (self.ttl and time.monotonic() - loaded_at > self.ttl):
+            names = self.refresh()
+        return names
+
+    def ids(self):
+        return set(self.names())
+
+
+class GenreIndex:
+    """Inverted index from genre id to the sorted ids of the movies in it"""
+
+    def __init__(self, rebuild_interval=None):
+        self.rebuild_interval = (
+            settings.GENRE_INDEX_REBUILD_INTERVAL if rebuild_interval is None else rebuild_interval
+        )
+        self._postings = {}
+        self._dirty = set()
+        self._built_at = None
+        self._lock = threading.RLock()
+
+    def build(self):
+        """Load every genre link from the database"""
+        from .models import Movie
+
+        started = time.monotonic()
+        with self._lock:
+            self._dirty.clear()
+        links = np.array(
+            list(Movie.genres.through.objects.values_list('genre_id', 'movie_id').order_by('genre_id', 'movie_id')),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        postings = {}
+        if len(links):
+            genre_ids, starts = np.unique(links[:, 0], return_index=True)
+            for genre_id, movie_ids in zip(genre_ids.tolist(), np.split(links[:, 1], starts[1:])):
+                postings[genre_id] = np.ascontiguousarray(movie_ids)
+        with self._lock:
+            self._postings = postings
+            self._built_at = time.monotonic()
+        logger.info(f"Built genre index: {len(links)} links in {(time.monotonic() - started) * 1000:.0f}ms")
+
+    def mark_dirty(self, movie_ids):
+        """Queue movies whose genre links changed; they are merged in before the next lookup"""
+        with self._lock:
+            if self._built_at is not None:
+                self._dirty.update(movie_ids)
+
+    def _apply_dirty(self):
+        from .models import Movie
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        links = Movie.genres.through.objects.filter(movie_id__in=dirty).values_list('genre_id', 'movie_id')
+        added = {}
+        for genre_id, movie_id in links:
+            added.setdefault(genre_id, []).append(movie_id)
+        changed = np.array(sorted(dirty), dtype=np.int64)
+        with self._lock:
+            for genre_id in set(self._postings) | set(added):
+                postings = np.setdiff1d(self._postings.get(genre_id, changed[:0]), changed, assume_unique=True)
+                if genre_id in added:
+                    postings = np.union1d(postings, np.array(added[genre_id], dtype=np.int64))
+                self._postings[genre_id] = postings
+
+    def ensure_current(self):
+        """Whether the index is ready; queues the first build in the background if not"""
+        if self._built_at is None:
+            submit_once('genre-index-rebuild', self.build)
+            return False
+        if self.rebuild_interval and time.monotonic() - self._built_at > self.rebuild_interval:
+            submit_once('genre-index-rebuild', self.build)
+        self._apply_dirty()
+        return True
+
+    def _movie_ids_from_database(self, genre_ids, match):
+        from .models import Movie
+
+        links = Movie.genres.through.objects.filter(genre_id__in=genre_ids).values('movie_id')
+        if match == MATCH_ALL:
+            links = links.annotate(matched=Count('genre_id')).filter(matched=len(set(genre_ids)))
+        movie_ids = links.order_by('movie_id').distinct().values_list('movie_id', flat=True)
+        return np.array(list(movie_ids), dtype=np.int64)
+
+    def movie_ids(self, genre_ids, match=MATCH_ALL):
+        """Sorted ids of the movies in every (match='all') or any (match='any') of genre_ids"""
+        if not self.ensure_current():
+            return self._movie_ids_from_database(genre_ids, match)
+        with self._lock:
+            postings = [self._postings.get(genre_id, np.empty(0, dtype=np.int64)) for genre_id in genre_ids]
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        # Intersect smallest first so every step works on the shortest arrays
+        postings.sort(key=len)
+        result = postings[0]
+        for other in postings[1:]:
+            if match == MATCH_ALL:
+                result = np.intersect1d(result, other, assume_unique=True)
+            else:
+                result = np.union1d(result, other)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'genres': len(self._postings),
+                'links': int(sum(len(postings) for postings in self._postings.values())),
+                'memory_bytes': int(sum(postings.nbytes for postings in self._postings.values())),
+                'dirty': len(self._dirty),
+            }
+
+
+genre_registry = GenreRegistry()
+genre_index = GenreIndex()
@@ -0,0 +1,171 @@
+"""
+This module contains the bulk ingestion path for TMDB movie results.
+
+A whole page of TMDB results is written in a constant number of queries: one
+lookup of the ids that already exist, one multi-row upsert, and one
+delete/insert pair for the genre links, regardless of page size. Detail
+payloads fetched with append_to_response=credits also get their cast and
+crew stored in Person and Credit, again with a fixed number of queries.
+"""
+
+from collections import namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .autocomplete import title_index
+from .genres import genre_index, genre_registry
+from .recommend import recommendation_engine
+from .models import Credit, Movie, Person
+
+IngestResult = namedtuple('IngestResult', ['created', 'updated', 'ids'])
+
+# Columns refreshed when a movie already exists locally; details also refresh DETAIL_FIELDS
+UPSERT_FIELDS = [
+    'title', 'tmdb_id', 'original_title', 'original_language', 'overview', 'poster_path',
+    'backdrop_path', 'release_date', 'adult', 'popularity', 'vote_average', 'vote_count'
+]
+DETAIL_FIELDS = ['runtime', 'tmdb_payload', 'fetched_at']
+PERSON_FIELDS = ['name', 'profile_path', 'known_for_department', 'popularity']
+
+
+def movie_from_tmdb(movie_data, details=False, fetched_at=None):
+    """Build an unsaved Movie from a TMDB list payload, or a detail payload when details=True"""
+    movie = Movie(
+        id=movie_data['id'],
+        tmdb_id=movie_data['id'],
+        title=movie_data.get('title') or movie_data.get('original_title') or '',
+        original_title=movie_data.get('original_title') or '',
+        original_language=movie_data.get('original_language') or '',
+        overview=movie_data.get('overview') or '',
+        poster_path=movie_data.get('poster_path'),
+        backdrop_path=movie_data.get('backdrop_path'),
+        release_date=movie_data.get('release_date') or None,
+        adult=bool(movie_data.get('adult')),
+        popularity=movie_data.get('popularity') or 0,
+        vote_average=movie_data.get('vote_average') or 0,
+        vote_count=movie_data.get('vote_count') or 0,
+    )
+    if details:
+        movie.runtime = movie_data.get('runtime') or None
+        # Credits appended to a detail payload are stored in their own tables
+        movie.tmdb_payload = {key: value for key, value in movie_data.items() if key != 'credits'}
+        movie.fetched_at = fetched_at or timezone.now()
+    return movie
+
+
+def genre_ids_of(movie_data):
+    """List payloads carry genre_ids, detail payloads carry genres objects"""
+    if 'genre_ids' in movie_data:
+        return movie_data['genre_ids'] or []
+    return [genre['id'] for genre in movie_data.get('genres') or []]
+
+
+def link_genres(movies_data, known_genre_ids=None):
+    """Replace the genre links of every movie in movies_data with two bulk queries"""
+    if known_genre_ids is None:
+        known_genre_ids = genre_registry.ids()
+
+    through = Movie.genres.through
+    links = {
+        (movie_data['id'], genre_id)
+        for movie_data in movies_data
+        for genre_id in genre_ids_of(movie_data)
+        if genre_id in known_genre_ids
+    }
+    through.objects.filter(movie_id__in=[movie_data['id'] for movie_data in movies_data]).delete()
+    through.objects.bulk_create(
+        [through(movie_id=movie_id, genre_id=genre_id) for movie_id, genre_id in links],
+        ignore_conflicts=True
+    )
+
+
+def credits_from_tmdb(movie_id, credits_data):
+    """Unsaved Person and Credit rows for a TMDB credits payload"""
+    people = {}
+    credits = []
+    for role in (Credit.CAST, Credit.CREW):
+        for credit_data in credits_data.get(role) or []:
+            people[credit_data['id']] = Person(
+                id=credit_data['id'],
+                name=credit_data.get('name') or '',
+                profile_path=credit_data.get('profile_path'),
+                known_for_department=credit_data.get('known_for_department') or '',
+                popularity=credit_data.get('popularity') or 0,
+            )
+            credits.append(Credit(
+                credit_id=credit_data['credit_id'],
+                movie_id=movie_id,
+                person_id=credit_data['id'],
+                role=role,
+                character=(credit_data.get('character') or '')[:500],
+                job=credit_data.get('job') or '',
+                department=credit_data.get('department') or '',
+                order=credit_data.get('order'),
+            ))
+    return people, credits
+
+
+def store_credits(credits_by_movie):
+    """
+    Replace the cast and crew of each movie in {movie_id: TMDB credits payload}.
+    The movies must already exist locally.
+    """
+    if not credits_by_movie:
+        return
+    people = {}
+    credits = []
+    for movie_id, credits_data in credits_by_movie.items():
+        movie_people, movie_credits = credits_from_tmdb(movie_id, credits_data)
+        people.update(movie_people)
+        credits.extend(movie_credits)
+
+    with transaction.atomic():
+        Person.objects.bulk_create(
+            people.values(),
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=PERSON_FIELDS
+        )
+        Credit.objects.filter(movie_id__in=credits_by_movie).delete()
+        Credit.objects.bulk_create(credits, ignore_conflicts=True)
+        Movie.objects.filter(id__in=credits_by_movie).update(credits_fetched_at=timezone.now())
+
+
+def upsert_movies(movies_data, known_genre_ids=None, details=False):
+    """
+    Insert or update a page of TMDB movie payloads and their genre links.
+    With details=True the payloads are full movie details and are stored as the
+    catalog copy (tmdb_payload, fetched_at); list payloads never overwrite those.
+    Returns an IngestResult with created/updated counts and the ids in input order.
+    """
+    fetched_at = timezone.now()
+    movies = {}
+    for movie_data in movies_data:
+        movies[movie_data['id']] = movie_from_tmdb(movie_data, details, fetched_at)
+    if not movies:
+        return IngestResult(0, 0, [])
+
+    with transaction.atomic():
+        existing = set(Movie.objects.filter(id__in=movies).values_list('id', flat=True))
+        Movie.objects.bulk_create(
+            movies.values(),
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=UPSERT_FIELDS + DETAIL_FIELDS if details else UPSERT_FIELDS
+        )
+        link_genres(movies_data, known_genre_ids)
+        if details:
+            store_credits({
+                movie_data['id']: movie_data['credits'] for movie_data in movies_data if 'credits' in movie_data
+            })
+        # bulk_create sends no post_save, so keep the in-memory indexes current here
+        transaction.on_commit(lambda: title_index.upsert(movies.values()))
+        transaction.on_commit(lambda: recommendation_engine.mark_dirty(movies))
+        transaction.on_commit(lambda: genre_index.mark_dirty(movies))
+
+    return IngestResult(
+        created=len(movies) - len(existing),
+        updated=len(existing),
+        ids=list(movies)
+    )
@@ -1,25 +1,22 @@
 from django.core.management.base import BaseCommand
 import requests
-import os
+from movies.genres import genre_registry
 from movies.models import Genre
+from movies.tmdb import get_tmdb_client
 
 class Command(BaseCommand):
     help = 'Fetch movie genres from TMDB API'
 
     def handle(self, *args, **kwargs):
         try:
-            response = requests.get(
-                'https://api.themoviedb.org/3/genre/movie/list',
-                params={'api_key': os.getenv('TMDB_API_KEY')}
+            genres = get_tmdb_client().genres()['genres']
+            Genre.objects.bulk_create(
+                [Genre(id=genre_data['id'], name=genre_data['name']) for genre_data in genres],
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=['name']
             )
-            response.raise_for_status()
-            
-            genres = response.json()['genres']
-            for genre_data in genres:
-                Genre.objects.get_or_create(
-                    id=genre_data['id'],
-                    defaults={'name': genre_data['name']}
-                )
+            genre_registry.refresh()
             
             self.stdout.write(self.style.SUCCESS('Successfully fetched genres'))
             
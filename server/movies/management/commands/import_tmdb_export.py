@@ -0,0 +1,141 @@
+import csv
+import gzip
+import io
+import json
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from movies.models import Movie
+
+# Columns an export row sets; title only fills in new movies, since the export has no localized title
+EXPORT_UPDATE_FIELDS = ['original_title', 'popularity', 'adult']
+
+
+def read_export(path):
+    """Yield (id, original_title, popularity, adult) per line of a TMDB export, gzip'd or plain"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as export_file:
+        for line in export_file:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                yield (
+                    int(row['id']),
+                    (row.get('original_title') or '')[:255],
+                    float(row.get('popularity') or 0),
+                    bool(row.get('adult')),
+                )
+            except (ValueError, KeyError, TypeError):
+                yield None
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def insert_sql(table):
+    """INSERT ... ON CONFLICT upsert of one export row; SQLite and PostgreSQL share the syntax"""
+    return (
+        f'INSERT INTO {table} (id, tmdb_id, title, original_title, original_language, overview, '
+        f'adult, popularity, vote_average, vote_count) '
+    ), (
+        'ON CONFLICT (id) DO UPDATE SET '
+        + ', '.join(f'{field} = excluded.{field}' for field in EXPORT_UPDATE_FIELDS)
+    )
+
+
+def copy_batch(rows):
+    """Load rows into a temporary table with COPY and upsert them into Movie in one statement"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    insert, on_conflict = insert_sql(Movie._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE movie_export_import '
+            '(id integer, original_title text, popularity double precision, adult boolean) ON COMMIT DROP'
+        )
+        cursor.copy_expert('COPY movie_export_import FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute(
+            insert
+            + "SELECT DISTINCT ON (id) id, id, original_title, original_title, '', '', adult, popularity, 0, 0 "
+            + 'FROM movie_export_import '
+            + on_conflict
+        )
+
+
+def executemany_batch(rows):
+    """Prepared upsert executed once per row on SQLite, where that beats building multi-row INSERTs"""
+    insert, on_conflict = insert_sql(Movie._meta.db_table)
+    # "WHERE true" keeps SQLite from parsing ON CONFLICT as part of the SELECT's join clause
+    sql = insert + "SELECT %s, %s, %s, %s, '', '', %s, %s, 0, 0 WHERE true " + on_conflict
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (movie_id, movie_id, original_title, original_title, adult, popularity)
+            for movie_id, original_title, popularity, adult in rows
+        ])
+
+
+def upsert_batch(rows):
+    """Multi-row upsert through the ORM, for other databases"""
+    movies = {
+        movie_id: Movie(
+            id=movie_id, tmdb_id=movie_id, title=original_title, original_title=original_title,
+            popularity=popularity, adult=adult
+        )
+        for movie_id, original_title, popularity, adult in rows
+    }
+    with transaction.atomic():
+        Movie.objects.bulk_create(
+            movies.values(),
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=EXPORT_UPDATE_FIELDS
+        )
+
+
+class Command(BaseCommand):
+    help = 'Import a TMDB daily movie id export (movie_ids_MM_DD_YYYY.json.gz) into the local catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Export file, gzip\'d (.gz) or plain NDJSON')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows written per batch (default 50000 with COPY, 5000 otherwise)')
+        parser.add_argument('--no-copy', action='store_true', help='Use batched ORM upserts even on PostgreSQL')
+
+    def handle(self, *args, **options):
+        use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        if use_copy:
+            write_batch, method = copy_batch, 'COPY'
+        elif connection.vendor == 'sqlite':
+            write_batch, method = executemany_batch, 'prepared upserts'
+        else:
+            write_batch, method = upsert_batch, 'batched upserts'
+        batch_size = options['batch_size'] or (50000 if use_copy else 5000)
+
+        self.stdout.write(f"Importing {options['path']} with {method} in batches of {batch_size}...")
+        started = time.monotonic()
+        rows = skipped = 0
+        try:
+            for batch in batches(read_export(options['path']), batch_size):
+                valid = [row for row in batch if row is not None]
+                skipped += len(batch) - len(valid)
+                if valid:
+                    write_batch(valid)
+                rows += len(valid)
+                elapsed = max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f'{rows} rows imported | {rows / elapsed:.0f} rows/s')
+        except (OSError, EOFError) as e:
+            raise CommandError(f"Failed to read {options['path']}: {str(e)}")
+
+        elapsed = time.monotonic() - started
+        summary = f'Imported {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-6):.0f} rows/s)'
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'{summary}; skipped {skipped} malformed lines'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
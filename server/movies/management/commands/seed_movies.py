@@ -1,63 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+
 from django.core.management.base import BaseCommand
-from movies.models import Movie, Genre
+from movies.ingest import upsert_movies
+from movies.genres import genre_registry
+from movies.models import Movie, SyncState
+from movies.throttle import BULK
+from movies.tmdb import get_tmdb_client
 import requests
-import os
-from datetime import datetime
+
+DEFAULT_ENDPOINTS = [
+    'movie/popular',
+    'movie/top_rated',
+    'movie/now_playing',
+    'movie/upcoming'
+]
+CHECKPOINT_KEY = 'seed_movies'
+
 
 class Command(BaseCommand):
     help = 'Seed movies from TMDB API'
 
-    def get_tmdb_url(self, endpoint):
-        return f'https://api.themoviedb.org/3/{endpoint}'
-    
-    def get_tmdb_params(self, additional_params=None):
-        params = {'api_key': os.getenv('TMDB_API_KEY')}
-        if additional_params:
-            params.update(additional_params)
-        return params
-
-    def fetch_and_store_movies(self, endpoint):
-        try:
-            response = requests.get(
-                self.get_tmdb_url(endpoint),
-                params=self.get_tmdb_params({'page': 1})  # You can add more pages if needed
-            )
-            response.raise_for_status()
-            
-            movies_data = response.json()['results']
-            for movie_data in movies_data:
-                movie, created = Movie.objects.get_or_create(
-                    tmdb_id=movie_data['id'],
-                    defaults={
-                        'title': movie_data['title'],
-                        'overview': movie_data['overview'],
-                        'poster_path': movie_data['poster_path'],
-                        'release_date': movie_data.get('release_date'),
-                        'vote_average': movie_data['vote_average']
-                    }
-                )
-                
-                if created and movie_data.get('genre_ids'):
-                    for genre_id in movie_data['genre_ids']:
-                        genre = Genre.objects.filter(id=genre_id).first()
-                        if genre:
-                            movie.genres.add(genre)
-                    self.stdout.write(f'Created movie: {movie.title}')
-
-        except requests.exceptions.RequestException as e:
-            self.stdout.write(self.style.ERROR(f'Error fetching movies: {str(e)}'))
-
-    def handle(self, *args, **kwargs):
-        # Fetch from multiple endpoints
-        endpoints = [
-            'movie/popular',
-            'movie/top_rated',
-            'movie/now_playing',
-            'movie/upcoming'
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1, help='Pages to fetch per endpoint (TMDB serves up to 500)')
+        parser.add_argument('--endpoints', nargs='+', default=DEFAULT_ENDPOINTS, help='TMDB list endpoints to fetch')
+        parser.add_argument('--concurrency', type=int, default=4, help='Pages fetched in parallel')
+        parser.add_argument('--resume', action='store_true', help='Skip pages recorded in the last checkpoint')
+        parser.add_argument(
+            '--credits', action='store_true',
+            help='Also fetch details, cast and crew of every seeded movie whose credits are not stored yet'
+        )
+
+    def fetch_page(self, endpoint, page):
+        return get_tmdb_client(BULK).movie_list(endpoint, page=page)
+
+    def fetch_details(self, tmdb_id):
+        return get_tmdb_client(BULK).movie(tmdb_id, append_to_response='credits')
+
+    def seed_credits(self, executor, tmdb_ids, known_genre_ids, batch_size=100):
+        """Fetch details and credits for tmdb_ids concurrently and store them batch by batch"""
+        tmdb_ids = list(Movie.objects.filter(
+            id__in=tmdb_ids, credits_fetched_at__isnull=True
+        ).values_list('id', flat=True))
+        self.stdout.write(f'Fetching cast and crew for {len(tmdb_ids)} movies...')
+        failed = 0
+        for i in range(0, len(tmdb_ids), batch_size):
+            batch = tmdb_ids[i:i + batch_size]
+            futures = {executor.submit(self.fetch_details, tmdb_id): tmdb_id for tmdb_id in batch}
+            fetched = []
+            for future in as_completed(futures):
+                try:
+                    fetched.append(future.result())
+                except requests.exceptions.RequestException as e:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'Error fetching movie {futures[future]}: {str(e)}'))
+            upsert_movies(fetched, known_genre_ids, details=True)
+            self.stdout.write(f'Stored credits for {min(i + batch_size, len(tmdb_ids))}/{len(tmdb_ids)} movies')
+        return failed
+
+    def handle(self, *args, **options):
+        checkpoint = SyncState.load(CHECKPOINT_KEY)
+        if not options['resume']:
+            checkpoint.data = {'done': {}}
+        done = checkpoint.data.setdefault('done', {})
+
+        pages = [
+            (endpoint, page)
+            for endpoint in options['endpoints']
+            for page in range(1, options['pages'] + 1)
+            if page not in done.get(endpoint, [])
         ]
-        
-        for endpoint in endpoints:
-            self.stdout.write(f'Fetching {endpoint}...')
-            self.fetch_and_store_movies(endpoint)
-            
-        self.stdout.write(self.style.SUCCESS('Successfully seeded movies'))
\ No newline at end of file
+        if not pages:
+            self.stdout.write(self.style.SUCCESS('Nothing to do, every page is in the checkpoint'))
+            return
+
+        known_genre_ids = set(genre_registry.refresh())
+        if not known_genre_ids:
+            self.stdout.write(self.style.WARNING('No genres stored, run fetch_genres to link movie genres'))
+
+        self.stdout.write(f'Fetching {len(pages)} pages with concurrency {options["concurrency"]}...')
+        started = time.monotonic()
+        requests_made = rows = created = failed = credit_failures = 0
+        seeded_ids = set()
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            futures = {executor.submit(self.fetch_page, endpoint, page): (endpoint, page) for endpoint, page in pages}
+            for future in as_completed(futures):
+                endpoint, page = futures[future]
+                requests_made += 1
+                try:
+                    movies_data = future.result()['results']
+                except requests.exceptions.RequestException as e:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'Error fetching {endpoint} page {page}: {str(e)}'))
+                    continue
+
+                result = upsert_movies(movies_data, known_genre_ids)
+                rows += len(result.ids)
+                created += result.created
+                seeded_ids.update(result.ids)
+                done.setdefault(endpoint, []).append(page)
+                checkpoint.save(update_fields=['data', 'updated_at'])
+
+                elapsed = max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f'{endpoint} page {page}: {result.created} created, {result.updated} updated '
+                    f'| {rows / elapsed:.1f} rows/s, {requests_made / elapsed:.1f} req/s'
+                )
+
+            if options['credits']:
+                credit_failures = self.seed_credits(executor, seeded_ids, known_genre_ids)
+
+        elapsed = time.monotonic() - started
+        summary = f'Seeded {rows} rows ({created} new) from {requests_made} requests in {elapsed:.1f}s'
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{summary}; {failed} pages failed, rerun with --resume to retry them'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+        if credit_failures:
+            self.stdout.write(self.style.WARNING(
+                f'{credit_failures} movies failed to fetch credits, rerun with --credits to retry them'
+            ))
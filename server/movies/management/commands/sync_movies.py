@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from movies.ingest import upsert_movies
+from movies.genres import genre_registry
+from movies.models import Movie, SyncState
+from movies.throttle import BULK
+from movies.tmdb import get_tmdb_client, error_status
+import requests
+
+STATE_KEY = 'sync_movies'
+MAX_WINDOW = timedelta(days=14)  # widest range TMDB's changes feed accepts
+LOOKUP_CHUNK = 500
+
+
+class Command(BaseCommand):
+    help = 'Refresh local movies (details, cast and crew) that changed on TMDB since the last sync'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Start from this ISO date instead of the stored watermark')
+        parser.add_argument('--batch-size', type=int, default=100, help='Movies re-fetched and written per batch')
+        parser.add_argument('--concurrency', type=int, default=8, help='Detail requests in flight per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Report what changed without fetching details')
+
+    def get_since(self, options, state):
+        if options['since']:
+            try:
+                since = datetime.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be an ISO date, e.g. 2024-12-01')
+            return since if timezone.is_aware(since) else timezone.make_aware(since)
+        if state.data.get('watermark'):
+            return datetime.fromisoformat(state.data['watermark'])
+        return timezone.now() - timedelta(days=1)
+
+    def changed_ids(self, start, end):
+        """Every movie id in the changes feed for [start, end], across all pages"""
+        client = get_tmdb_client(BULK)
+        ids = set()
+        page, total_pages = 1, 1
+        while page <= total_pages:
+            data = client.changes(start.date(), end.date(), page=page)
+            ids.update(change['id'] for change in data['results'])
+            total_pages = data.get('total_pages', 1)
+            page += 1
+        return ids
+
+    def local_ids(self, tmdb_ids):
+        """The subset of tmdb_ids present in the local catalog"""
+        tmdb_ids = sorted(tmdb_ids)
+        found = []
+        for i in range(0, len(tmdb_ids), LOOKUP_CHUNK):
+            chunk = tmdb_ids[i:i + LOOKUP_CHUNK]
+            found.extend(Movie.objects.filter(tmdb_id__in=chunk).values_list('tmdb_id', flat=True))
+        return found
+
+    def fetch_details(self, tmdb_id):
+        return get_tmdb_client(BULK).movie(tmdb_id, append_to_response='credits')
+
+    def refresh(self, tmdb_ids, options, known_genre_ids):
+        """Re-fetch tmdb_ids concurrently and bulk-update them batch by batch; returns (updated, failed)"""
+        updated = failed = 0
+        batch_size = options['batch_size']
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            for i in range(0, len(tmdb_ids), batch_size):
+                batch = tmdb_ids[i:i + batch_size]
+                futures = {executor.submit(self.fetch_details, tmdb_id): tmdb_id for tmdb_id in batch}
+                fetched = []
+                for future in as_completed(futures):
+                    try:
+                        fetched.append(future.result())
+                    except requests.exceptions.RequestException as e:
+                        # 404 means the movie was removed upstream; nothing to refresh
+                        if error_status(e) != 404:
+                            failed += 1
+                            self.stdout.write(self.style.ERROR(f'Error fetching movie {futures[future]}: {str(e)}'))
+                if fetched:
+                    updated += upsert_movies(fetched, known_genre_ids, details=True).updated
+                self.stdout.write(f'Refreshed {min(i + batch_size, len(tmdb_ids))}/{len(tmdb_ids)} movies')
+        return updated, failed
+
+    def handle(self, *args, **options):
+        state = SyncState.load(STATE_KEY)
+        since = self.get_since(options, state)
+        run_started = timezone.now()
+        known_genre_ids = set(genre_registry.refresh())
+        started = time.monotonic()
+        total_changed = total_updated = 0
+
+        window_start = since
+        while window_start < run_started:
+            window_end = min(window_start + MAX_WINDOW, run_started)
+            try:
+                changed = self.changed_ids(window_start, window_end)
+            except requests.exceptions.RequestException as e:
+                raise CommandError(f'Error fetching TMDB changes: {str(e)}')
+
+            stale = self.local_ids(changed)
+            total_changed += len(stale)
+            self.stdout.write(
+                f'{window_start.date()} to {window_end.date()}: {len(changed)} changed on TMDB, {len(stale)} stored locally'
+            )
+
+            if not options['dry_run']:
+                updated, failed = self.refresh(stale, options, known_genre_ids)
+                total_updated += updated
+                if failed:
+                    raise CommandError(
+                        f'{failed} movies failed to refresh; watermark kept at {window_start.isoformat()}, rerun to retry'
+                    )
+                # Advance the watermark only once a whole window has been applied
+                state.data['watermark'] = window_end.isoformat()
+                state.save(update_fields=['data', 'updated_at'])
+            window_start = window_end
+
+        elapsed = time.monotonic() - started
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{total_changed} local movies would be refreshed'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Refreshed {total_updated} of {total_changed} changed movies in {elapsed:.1f}s; '
+                f'watermark {state.data.get("watermark")}'
+            ))
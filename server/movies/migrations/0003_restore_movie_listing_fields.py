@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-18 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_remove_movie_genres_remove_movie_overview_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='genres',
+            field=models.ManyToManyField(blank=True, related_name='movies', to='movies.genre'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='overview',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='poster_path',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='release_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='vote_average',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX movies_movie_search_idx ON movies_movie USING GIN (
+        to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(original_title, ''))
+    )
+    """,
+]
+POSTGRES_REVERSE = [
+    'DROP INDEX IF EXISTS movies_movie_search_idx',
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE movies_movie_fts USING fts5(
+        title, original_title,
+        content='movies_movie', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER movies_movie_fts_insert AFTER INSERT ON movies_movie BEGIN
+        INSERT INTO movies_movie_fts(rowid, title, original_title)
+        VALUES (new.id, new.title, new.original_title);
+    END
+    """,
+    """
+    CREATE TRIGGER movies_movie_fts_delete AFTER DELETE ON movies_movie BEGIN
+        INSERT INTO movies_movie_fts(movies_movie_fts, rowid, title, original_title)
+        VALUES ('delete', old.id, old.title, old.original_title);
+    END
+    """,
+    """
+    CREATE TRIGGER movies_movie_fts_update AFTER UPDATE OF title, original_title ON movies_movie BEGIN
+        INSERT INTO movies_movie_fts(movies_movie_fts, rowid, title, original_title)
+        VALUES ('delete', old.id, old.title, old.original_title);
+        INSERT INTO movies_movie_fts(rowid, title, original_title)
+        VALUES (new.id, new.title, new.original_title);
+    END
+    """,
+    "INSERT INTO movies_movie_fts(movies_movie_fts) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS movies_movie_fts_insert',
+    'DROP TRIGGER IF EXISTS movies_movie_fts_delete',
+    'DROP TRIGGER IF EXISTS movies_movie_fts_update',
+    'DROP TABLE IF EXISTS movies_movie_fts',
+]
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        statements = {'postgresql': postgres, 'sqlite': sqlite}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+    """Full-text index over movie titles: tsvector + GIN on Postgres, FTS5 on SQLite"""
+
+    dependencies = [
+        ('movies', '0005_syncstate'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_REVERSE, SQLITE_REVERSE),
+        ),
+    ]
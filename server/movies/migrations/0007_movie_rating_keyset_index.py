@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_movie_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-vote_average', '-id'], name='movie_rating_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_movie_rating_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Person',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('profile_path', models.CharField(blank=True, max_length=255, null=True)),
+                ('known_for_department', models.CharField(blank=True, default='', max_length=100)),
+                ('popularity', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='credits_fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Credit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('credit_id', models.CharField(max_length=64, unique=True)),
+                ('role', models.CharField(choices=[('cast', 'Cast'), ('crew', 'Crew')], max_length=4)),
+                ('character', models.CharField(blank=True, default='', max_length=500)),
+                ('job', models.CharField(blank=True, default='', max_length=100)),
+                ('department', models.CharField(blank=True, default='', max_length=100)),
+                ('order', models.PositiveIntegerField(blank=True, null=True)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='movies.movie')),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='movies.person')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['movie', 'role', 'order'], name='credit_movie_role_idx'), models.Index(fields=['person', 'job'], name='credit_person_job_idx')],
+            },
+        ),
+    ]
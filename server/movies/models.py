@@ -1,4 +1,8 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 class Genre(models.Model):
     id = models.IntegerField(primary_key=True)
@@ -11,6 +15,106 @@ class Movie(models.Model):
     id = models.IntegerField(primary_key=True)
     title = models.CharField(max_length=255)
     tmdb_id = models.IntegerField(unique=True)
+    original_title = models.CharField(max_length=255, blank=True, default='')
+    original_language = models.CharField(max_length=10, blank=True, default='')
+    overview = models.TextField(blank=True, default='')
+    poster_path = models.CharField(max_length=255, null=True, blank=True)
+    backdrop_path = models.CharField(max_length=255, null=True, blank=True)
+    release_date = models.DateField(null=True, blank=True, db_index=True)
+    runtime = models.PositiveIntegerField(null=True, blank=True)
+    adult = models.BooleanField(default=False)
+    popularity = models.FloatField(default=0)
+    vote_average = models.FloatField(default=0, db_index=True)
+    vote_count = models.PositiveIntegerField(default=0)
+    genres = models.ManyToManyField(Genre, blank=True, related_name='movies')
+    # Last full TMDB details payload and when it was fetched
+    tmdb_payload = models.JSONField(null=True, blank=True)
+    fetched_at = models.DateTimeField(null=True, blank=True)
+    # When cast and crew were last stored in Credit; null if they never were
+    credits_fetched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the discover list
+            models.Index(fields=['-vote_average', '-id'], name='movie_rating_keyset_idx'),
+        ]
     
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    @property
+    def is_fresh(self):
+        """Whether the stored TMDB payload is recent enough to serve without refreshing"""
+        if self.tmdb_payload is None or self.fetched_at is None:
+            return False
+        max_age = timedelta(seconds=settings.TMDB_CATALOG_MAX_AGE)
+        return timezone.now() - self.fetched_at < max_age
+
+    def as_tmdb_result(self):
+        """This movie in the shape of a TMDB list result (prefetch genres when serializing many)"""
+        return {
+            'id': self.tmdb_id,
+            'title': self.title,
+            'original_title': self.original_title,
+            'original_language': self.original_language,
+            'overview': self.overview,
+            'poster_path': self.poster_path,
+            'backdrop_path': self.backdrop_path,
+            'release_date': self.release_date.isoformat() if self.release_date else '',
+            'adult': self.adult,
+            'popularity': self.popularity,
+            'vote_average': self.vote_average,
+            'vote_count': self.vote_count,
+            'genre_ids': [genre.id for genre in self.genres.all()],
+        }
+
+class Person(models.Model):
+    """A cast or crew member, keyed by TMDB person id"""
+    id = models.IntegerField(primary_key=True)
+    name = models.CharField(max_length=255)
+    profile_path = models.CharField(max_length=255, null=True, blank=True)
+    known_for_department = models.CharField(max_length=100, blank=True, default='')
+    popularity = models.FloatField(default=0)
+
+    def __str__(self):
+        return self.name
+
+class Credit(models.Model):
+    """One cast role or crew job of a person in a movie"""
+    CAST = 'cast'
+    CREW = 'crew'
+    ROLE_CHOICES = [
+        (CAST, 'Cast'),
+        (CREW, 'Crew'),
+    ]
+
+    credit_id = models.CharField(max_length=64, unique=True)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='credits')
+    person = models.ForeignKey(Person, on_delete=models.CASCADE, related_name='credits')
+    role = models.CharField(max_length=4, choices=ROLE_CHOICES)
+    character = models.CharField(max_length=500, blank=True, default='')
+    job = models.CharField(max_length=100, blank=True, default='')
+    department = models.CharField(max_length=100, blank=True, default='')
+    order = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['movie', 'role', 'order'], name='credit_movie_role_idx'),
+            models.Index(fields=['person', 'job'], name='credit_person_job_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.person} in {self.movie} ({self.character or self.job})"
+
+class SyncState(models.Model):
+    """Checkpoints and watermarks of long-running TMDB jobs, keyed by job name"""
+    key = models.CharField(max_length=100, unique=True)
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
+
+    @classmethod
+    def load(cls, key):
+        return cls.objects.get_or_create(key=key)[0]
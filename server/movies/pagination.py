@@ -0,0 +1,159 @@
+"""
+This module contains the cursor pagination of the popular, discover and
+genre-filtered movie lists.
+
+Both lists hand out opaque cursors in a `next` link. discover pages through
+the local catalog by keyset on (vote_average, id); popular pages through TMDB's
+list, whose page number is signed into the cursor. While a page is served the
+following one is prepared in the background: the next popular page is put in
+the response cache and, when discover nears the end of the catalog, another
+TMDB discover page is ingested, so scrolling does not wait on TMDB.
+"""
+
+import logging
+
+import numpy as np
+from django.core import signing
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+from .cache import tmdb_cache
+from .ingest import upsert_movies
+from .models import SyncState
+from .singleflight import tmdb_flight
+from .tasks import submit_once
+from .throttle import PREFETCH
+from .tmdb import get_tmdb_client
+
+logger = logging.getLogger(__name__)
+
+CURSOR_PARAM = 'cursor'
+CURSOR_SALT = 'movies.pagination'
+DISCOVER_STATE_KEY = 'discover_feed'
+TMDB_MAX_PAGE = 500  # TMDB refuses list pages beyond this
+
+
+class RatingCursorPagination(CursorPagination):
+    """Highest rated movies first, paginated by keyset on (vote_average, id)"""
+    page_size = 20
+    ordering = ('-vote_average', '-id')
+    cursor_query_param = CURSOR_PARAM
+
+
+def encode_cursor(key, value):
+    return signing.dumps({key: value}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, key):
+    """The int stored under key in a signed cursor; raises ValueError if it was tampered with"""
+    try:
+        value = signing.loads(cursor, salt=CURSOR_SALT)[key]
+    except (signing.BadSignature, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(value, int) or value < 1:
+        raise ValueError('Invalid cursor')
+    return value
+
+
+def encode_page_cursor(page):
+    return encode_cursor('page', page)
+
+
+def decode_page_cursor(cursor):
+    """TMDB page number in a popular cursor (1 without one); raises ValueError if it was tampered with"""
+    if not cursor:
+        return 1
+    page = decode_cursor(cursor, 'page')
+    if page > TMDB_MAX_PAGE:
+        raise ValueError('Invalid cursor')
+    return page
+
+
+def cursor_link(request, cursor):
+    return replace_query_param(request.build_absolute_uri(), CURSOR_PARAM, cursor)
+
+
+def page_link(request, page):
+    return cursor_link(request, encode_page_cursor(page))
+
+
+def id_page(movie_ids, cursor, page_size):
+    """
+    One page of a sorted id array, highest id first, keyed by a signed 'before'
+    cursor. Returns (page ids, next cursor or None); raises ValueError for a bad cursor.
+    """
+    end = len(movie_ids)
+    if cursor:
+        end = int(np.searchsorted(movie_ids, decode_cursor(cursor, 'before')))
+    start = max(end - page_size, 0)
+    page = movie_ids[start:end][::-1].tolist()
+    return page, encode_cursor('before', page[-1]) if start > 0 else None
+
+
+def popular_response(request, page, popular_data):
+    """A TMDB popular page with links to its neighbours; queues the next page for prefetch"""
+    total_pages = min(popular_data.get('total_pages') or 1, TMDB_MAX_PAGE)
+    results = popular_data['results']
+    has_next = page < total_pages
+    if has_next:
+        prefetch_popular_page(page + 1)
+    return {
+        'page': page,
+        'results': results,
+        'total_pages': total_pages,
+        'total_results': popular_data.get('total_results', len(results)),
+        'next': page_link(request, page + 1) if has_next else None,
+        'previous': page_link(request, page - 1) if page > 1 else None
+    }
+
+
+def prefetch_popular_page(page):
+    """Put popular page `page` in the response cache in the background unless it is already fresh"""
+    key = tmdb_cache.make_key('popular', {'page': page})
+    if tmdb_cache.lookup(key)[1] == 'fresh':
+        return
+    submit_once(('prefetch', key), _prefetch, 'popular', {'page': page}, lambda client: client.popular(page))
+
+
+def _prefetch(endpoint, params, fetch):
+    try:
+        tmdb_cache.fetch(endpoint, params, fetch, flight=tmdb_flight, priority=PREFETCH)
+    except Exception as e:
+        logger.warning(f"Failed to prefetch TMDB {endpoint} {params}: {str(e)}")
+
+
+def ingest_discover_page(client=None):
+    """
+    Ingest the next TMDB discover page the catalog has not seen yet; the page
+    counter is kept in SyncState so every worker continues where the last left off.
+    Returns the number of movies stored.
+    """
+    state = SyncState.load(DISCOVER_STATE_KEY)
+    page = state.data.get('next_page', 1)
+    if page > min(state.data.get('total_pages', TMDB_MAX_PAGE), TMDB_MAX_PAGE):
+        return 0
+    discover_data = (client or get_tmdb_client(PREFETCH)).discover(page=page)
+    result = upsert_movies(discover_data['results'])
+    state.data = {'next_page': page + 1, 'total_pages': discover_data.get('total_pages', page)}
+    state.save(update_fields=['data', 'updated_at'])
+    return len(result.ids)
+
+
+def _prefetch_discover():
+    try:
+        ingest_discover_page()
+    except Exception as e:
+        logger.warning(f"Failed to prefetch a TMDB discover page: {str(e)}")
+
+
+def prefetch_discover():
+    submit_once('prefetch-discover', _prefetch_discover)
+
+
+def has_full_page_after(queryset, movie, page_size):
+    """True when at least page_size more movies follow `movie` in (-vote_average, -id) order"""
+    after = queryset.filter(
+        Q(vote_average__lt=movie.vote_average) | Q(vote_average=movie.vote_average, id__lt=movie.id)
+    ).order_by('-vote_average', '-id')
+    return after[page_size - 1:page_size].exists()
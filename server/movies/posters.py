@@ -0,0 +1,312 @@
+"""
+This module contains the poster cache behind /api/movies/poster/<size>/<path>.
+
+Images are stored on disk by the SHA-256 of their bytes (blobs/ab/abcdef...),
+with a small ref file mapping each (size, path) to its blob, so identical
+images are kept once and a blob's name doubles as its ETag. Sizes smaller than
+POSTER_SOURCE_SIZE are resized locally from the source image, so each poster is
+downloaded at most once per source size. Downloads that do not decode as
+images raise InvalidImage and are never stored. The cache is capped at
+POSTER_CACHE_MAX_BYTES: the store keeps an in-memory LRU index of blob sizes,
+read from disk (ordered by mtime) on first use and updated as blobs are served
+and written, and evicts from its cold end when the cap is exceeded. Served
+blobs are also touched on disk so a restart keeps their order. Downloads go
+through a pluggable fetcher (POSTER_FETCHER) so tests can serve images from a
+directory.
+"""
+
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .singleflight import SingleFlight
+
+try:
+    from PIL import Image
+except ImportError:  # Resizing is optional; without Pillow every size is downloaded
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# TMDB image sizes by width; 'original' is never resized
+POSTER_WIDTHS = {
+    'w45': 45, 'w92': 92, 'w154': 154, 'w185': 185, 'w300': 300, 'w342': 342,
+    'w500': 500, 'w780': 780, 'w1280': 1280, 'original': None,
+}
+POSTER_PATH_RE = re.compile(r'^[A-Za-z0-9_-]+\.(jpg|jpeg|png|webp)$')
+
+# Refresh a blob's mtime (its LRU position) at most this often (seconds)
+TOUCH_INTERVAL = 60
+
+
+# Leading bytes of each format POSTER_PATH_RE allows, for checking downloads without Pillow
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'RIFF')
+
+
+class PosterNotFound(Exception):
+    """The image does not exist upstream"""
+
+
+class InvalidImage(Exception):
+    """Upstream answered with something that is not a decodable image"""
+
+
+class HTTPImageFetcher:
+    """Downloads images from TMDB's image CDN (TMDB_IMAGE_BASE_URL)"""
+
+    def __init__(self, base_url=None):
+        self.base_url = (base_url or settings.TMDB_IMAGE_BASE_URL).rstrip('/')
+        self.session = requests.Session()
+
+    def fetch(self, size, path):
+        """Image bytes of path at size; raises PosterNotFound or requests.RequestException"""
+        response = self.session.get(
+            f'{self.base_url}/{size}/{path}',
+            timeout=(settings.TMDB_CONNECT_TIMEOUT, settings.TMDB_READ_TIMEOUT)
+        )
+        if response.status_code == 404:
+            raise PosterNotFound(path)
+        response.raise_for_status()
+        if not response.headers.get('Content-Type', '').startswith('image/'):
+            raise InvalidImage(f"{path} was served as {response.headers.get('Content-Type')}")
+        return response.content
+
+
+class DirectoryFetcher:
+    """Serves images from a local directory (POSTER_FETCHER_DIR/<path>) at every size, for tests"""
+
+    def __init__(self, root=None):
+        self.root = root or settings.POSTER_FETCHER_DIR
+
+    def fetch(self, size, path):
+        try:
+            with open(os.path.join(self.root, path), 'rb') as image_file:
+                return image_file.read()
+        except FileNotFoundError:
+            raise PosterNotFound(path)
+
+
+def validate(content, path):
+    """Raise InvalidImage unless content decodes as an image (or, without Pillow, starts like one)"""
+    if Image is None:
+        if not content.startswith(IMAGE_SIGNATURES):
+            raise InvalidImage(f'{path} is not an image')
+        return
+    try:
+        Image.open(io.BytesIO(content)).verify()
+    except Exception as e:  # Pillow raises a range of errors for corrupt files
+        raise InvalidImage(f'{path} is not a valid image: {str(e)}')
+
+
+def resize(content, width, path):
+    """content scaled down to width pixels wide, in the format of path; unchanged if already narrower"""
+    image = Image.open(io.BytesIO(content))
+    if image.width <= width:
+        return content
+    height = max(round(image.height * width / image.width), 1)
+    image = image.resize((width, height), Image.LANCZOS)
+    output = io.BytesIO()
+    image_format = Image.registered_extensions().get(os.path.splitext(path)[1].lower(), image.format)
+    if image_format == 'JPEG':
+        image.convert('RGB').save(output, 'JPEG', quality=85, optimize=True, progressive=True)
+    else:
+        image.save(output, image_format)
+    return output.getvalue()
+
+
+class PosterStore:
+    """Content-addressable on-disk image cache with an LRU size cap"""
+
+    def __init__(self, root=None, max_bytes=None, fetcher=None, source_size=None):
+        self.root = root or settings.POSTER_CACHE_DIR
+        self.max_bytes = max_bytes or settings.POSTER_CACHE_MAX_BYTES
+        self.fetcher = fetcher or import_string(settings.POSTER_FETCHER)()
+        self.source_size = source_size or settings.POSTER_SOURCE_SIZE
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._index = None  # blob file path -> size, least recently used first
+        self._size = None
+        self._counters = dict.fromkeys(('hits', 'downloads', 'resizes', 'evictions'), 0)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, 'blobs', digest[:2], digest)
+
+    def _ref_path(self, size, path):
+        key = hashlib.sha1(f'{size}/{path}'.encode()).hexdigest()
+        return os.path.join(self.root, 'refs', key[:2], key)
+
+    def _write_atomic(self, target, content):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(target), prefix='.tmp', delete=False) as temp_file:
+            temp_file.write(content)
+        os.replace(temp_file.name, target)
+
+    def lookup(self, size, path):
+        """(blob file path, digest) of a cached image, or None"""
+        try:
+            with open(self._ref_path(size, path)) as ref_file:
+                digest = ref_file.read().strip()
+            blob_path = self._blob_path(digest)
+            stat = os.stat(blob_path)
+        except (FileNotFoundError, ValueError):
+            return None  # never cached, or its blob was evicted
+        self._used(blob_path, stat.st_size)
+        if time.time() - stat.st_mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(blob_path)
+            except FileNotFoundError:
+                return None
+        return blob_path, digest
+
+    def _store(self, size, path, content):
+        digest = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            self._write_atomic(blob_path, content)
+            self._grow(blob_path, len(content))
+        self._write_atomic(self._ref_path(size, path), digest.encode())
+        return blob_path, digest
+
+    def _download_or_resize(self, size, path):
+        width = POSTER_WIDTHS[size]
+        source_width = POSTER_WIDTHS[self.source_size]
+        if Image is not None and width is not None and (source_width is None or width < source_width):
+            source_file, _ = self.open_blob(self.source_size, path)
+            with source_file:
+                try:
+                    content = resize(source_file.read(), width, path)
+                except (OSError, ValueError, SyntaxError) as e:  # e.g. a truncated source
+                    raise InvalidImage(f'Failed to resize {path}: {str(e)}')
+            self._count('resizes')
+        else:
+            content = self.fetcher.fetch(size, path)
+            self._count('downloads')
+            # Checked before storing: a stored blob is served as immutable for a year
+            validate(content, path)
+        return content
+
+    def _produce(self, size, path):
+        return self._store(size, path, self._download_or_resize(size, path))
+
+    def open_blob(self, size, path):
+        """
+        (open blob file, digest) of path at size, as get(); a blob evicted between
+        get() and opening it is produced again once.
+        """
+        for attempt in range(2):
+            blob_path, digest = self.get(size, path)
+            try:
+                return open(blob_path, 'rb'), digest
+            except FileNotFoundError:
+                if attempt:
+                    raise
+
+    def get(self, size, path):
+        """
+        (blob file path, digest) of path at size, downloading or resizing it on a miss;
+        concurrent misses for the same image share one download.
+        """
+        cached = self.lookup(size, path)
+        if cached:
+            self._count('hits')
+            return cached
+        return self._flight.do(('poster', size, path), lambda: self._produce(size, path))
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _load_index(self):
+        """Read every blob on disk into the index, oldest first; called with the lock held"""
+        if self._index is None:
+            self._index = OrderedDict(
+                (blob_path, size) for _, size, blob_path in sorted(self._blobs())
+            )
+            self._size = sum(self._index.values())
+
+    def _used(self, blob_path, size):
+        """Mark a served blob as most recently used (another process may have written it)"""
+        with self._lock:
+            if self._index is None:
+                return
+            if blob_path in self._index:
+                self._index.move_to_end(blob_path)
+            else:
+                self._index[blob_path] = size
+                self._size += size
+
+    def _grow(self, blob_path, added):
+        with self._lock:
+            self._load_index()
+            if blob_path not in self._index:
+                self._index[blob_path] = added
+                self._size += added
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _blobs(self):
+        """(mtime, size, file path) of every blob on disk"""
+        blobs = []
+        for directory, _, files in os.walk(os.path.join(self.root, 'blobs')):
+            for name in files:
+                if name.startswith('.tmp'):
+                    continue  # a write in progress
+                blob_path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(blob_path)
+                except FileNotFoundError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, blob_path))
+        return blobs
+
+    def evict(self):
+        """Delete least recently used blobs until the cache is under 90% of its cap"""
+        evicted = []
+        with self._lock:
+            self._load_index()
+            target = self.max_bytes * 0.9
+            while self._index and self._size > target:
+                blob_path, size = self._index.popitem(last=False)
+                self._size -= size
+                self._counters['evictions'] += 1
+                evicted.append(blob_path)
+            total = self._size
+        for blob_path in evicted:
+            try:
+                os.remove(blob_path)
+            except FileNotFoundError:
+                pass  # already evicted by another process
+        logger.info(f"Evicted {len(evicted)} posters down to {total} bytes")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['bytes'] = self._size
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+
+def content_type(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+_poster_store = None
+
+
+def get_poster_store():
+    global _poster_store
+    if _poster_store is None:
+        _poster_store = PosterStore()
+    return _poster_store
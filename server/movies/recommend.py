@@ -0,0 +1,233 @@
+"""
+This module contains the content-based movie recommender behind an event's
+movie_suggestions.
+
+Every local movie is a row in a NumPy feature matrix: one-hot genres, the
+standardized release year and rating, and hashed ids of its top-billed cast
+and directors. Rows are L2-normalized, so scoring all candidates against an
+event's liked movies is one matrix product. The matrix is built in the
+background, at startup (warm_indexes) or on first use; until it is ready,
+suggestions are the movies sharing the most genres with the liked ones. Movies
+written afterwards are marked dirty and only their rows are recomputed before
+the next recommendation, and the whole matrix is rebuilt in the background
+every MOVIE_RECOMMEND_REBUILD_INTERVAL seconds.
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .genres import genre_registry
+from .tasks import submit_once
+
+logger = logging.getLogger(__name__)
+
+TOP_BILLED_CAST = 5
+DISLIKE_WEIGHT = 0.5
+
+
+class RecommendationEngine:
+    """Feature matrix of the local catalog with batched cosine-similarity scoring"""
+
+    def __init__(self, cast_buckets=None, weights=None, rebuild_interval=None):
+        self.cast_buckets = cast_buckets or settings.MOVIE_RECOMMEND_CAST_BUCKETS
+        self.weights = weights or settings.MOVIE_RECOMMEND_WEIGHTS
+        self.rebuild_interval = (
+            settings.MOVIE_RECOMMEND_REBUILD_INTERVAL if rebuild_interval is None else rebuild_interval
+        )
+        self._lock = threading.RLock()
+        self._dirty = set()
+        self._built_at = None
+        self._genre_columns = {}
+        self._ids = np.empty(0, dtype=np.int64)
+        self._rows = {}
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._valid = np.empty(0, dtype=bool)
+        self._popularity = np.empty(0, dtype=np.float32)
+        self._year_stats = (2000.0, 20.0)
+
+    def _load(self, movie_ids=None):
+        """Raw features of movie_ids (or every movie) as (movies, genre links, people links)"""
+        from .models import Credit, Movie
+
+        movies = Movie.objects.all()
+        genres = Movie.genres.through.objects.all()
+        credits = Credit.objects.filter(
+            Q(role=Credit.CAST, order__lt=TOP_BILLED_CAST) | Q(role=Credit.CREW, job='Director')
+        )
+        if movie_ids is not None:
+            movies = movies.filter(id__in=movie_ids)
+            genres = genres.filter(movie_id__in=movie_ids)
+            credits = credits.filter(movie_id__in=movie_ids)
+        return (
+            list(movies.values_list('id', 'release_date', 'vote_average', 'popularity', 'adult')),
+            list(genres.values_list('movie_id', 'genre_id')),
+            list(credits.values_list('movie_id', 'person_id')),
+        )
+
+    def _features(self, movies, genre_links, people_links, rows):
+        """Normalized feature rows for movies; rows maps movie id to its row in the result"""
+        weights = self.weights
+        matrix = np.zeros((len(movies), len(self._genre_columns) + 2 + self.cast_buckets), dtype=np.float32)
+        year_mean, year_std = self._year_stats
+
+        years = np.array(
+            [movie[1].year if movie[1] else year_mean for movie in movies], dtype=np.float32
+        )
+        ratings = np.array([movie[2] or 0 for movie in movies], dtype=np.float32)
+        genre_offset = len(self._genre_columns)
+        matrix[:, genre_offset] = weights['year'] * (years - year_mean) / year_std
+        matrix[:, genre_offset + 1] = weights['rating'] * (ratings - 5) / 2.5
+
+        links = [(rows[movie_id], self._genre_columns[genre_id])
+                 for movie_id, genre_id in genre_links if genre_id in self._genre_columns]
+        if links:
+            link_rows, columns = np.array(links).T
+            matrix[link_rows, columns] = weights['genres']
+
+        if people_links:
+            link_rows = np.array([rows[movie_id] for movie_id, _ in people_links])
+            columns = genre_offset + 2 + np.array([person_id for _, person_id in people_links]) % self.cast_buckets
+            matrix[link_rows, columns] = weights['people']
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return matrix
+
+    def build(self):
+        """Recompute the whole feature matrix from the database"""
+        started = time.monotonic()
+        genre_ids = sorted(genre_registry.refresh())
+        with self._lock:
+            self._dirty.clear()
+        movies, genre_links, people_links = self._load()
+        genre_columns = {genre_id: column for column, genre_id in enumerate(genre_ids)}
+        dated = np.array([movie[1].year for movie in movies if movie[1]], dtype=np.float32)
+        year_stats = (float(dated.mean()), float(dated.std()) or 1.0) if len(dated) else (2000.0, 20.0)
+
+        with self._lock:
+            self._genre_columns = genre_columns
+            self._year_stats = year_stats
+            rows = {movie[0]: row for row, movie in enumerate(movies)}
+            self._matrix = self._features(movies, genre_links, people_links, rows)
+            self._ids = np.array([movie[0] for movie in movies], dtype=np.int64)
+            self._rows = rows
+            self._valid = np.array([not movie[4] for movie in movies], dtype=bool)
+            self._popularity = np.array([movie[3] or 0 for movie in movies], dtype=np.float32)
+            self._built_at = time.monotonic()
+        logger.info(
+            f"Built recommendation matrix {self._matrix.shape} in {(time.monotonic() - started) * 1000:.0f}ms"
+        )
+
+    def mark_dirty(self, movie_ids):
+        """Queue movies whose features changed; their rows are recomputed before the next recommendation"""
+        with self._lock:
+            if self._built_at is not None:
+                self._dirty.update(movie_ids)
+
+    def _apply_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        movies, genre_links, people_links = self._load(dirty)
+        if any(genre_id not in self._genre_columns for _, genre_id in genre_links):
+            # A new genre adds a column; keep serving the current matrix until it is rebuilt
+            submit_once('recommend-rebuild', self.build)
+            return
+
+        with self._lock:
+            new_ids = [movie[0] for movie in movies if movie[0] not in self._rows]
+            if new_ids:
+                first = len(self._ids)
+                self._rows.update({movie_id: first + i for i, movie_id in enumerate(new_ids)})
+                self._ids = np.concatenate([self._ids, np.array(new_ids, dtype=np.int64)])
+                self._matrix = np.vstack([self._matrix, np.zeros((len(new_ids), self._matrix.shape[1]), np.float32)])
+                self._valid = np.concatenate([self._valid, np.zeros(len(new_ids), dtype=bool)])
+                self._popularity = np.concatenate([self._popularity, np.zeros(len(new_ids), dtype=np.float32)])
+
+            local_rows = {movie[0]: row for row, movie in enumerate(movies)}
+            features = self._features(movies, genre_links, people_links, local_rows)
+            target_rows = np.array([self._rows[movie[0]] for movie in movies], dtype=np.int64)
+            if len(target_rows):
+                self._matrix[target_rows] = features
+                self._valid[target_rows] = [not movie[4] for movie in movies]
+                self._popularity[target_rows] = [movie[3] or 0 for movie in movies]
+
+            # Movies that were deleted stay in the matrix but are never suggested
+            found = set(local_rows)
+            removed = [self._rows[movie_id] for movie_id in dirty - found if movie_id in self._rows]
+            self._valid[removed] = False
+
+    def ensure_current(self):
+        """Whether the matrix is ready; queues the first build in the background if not"""
+        if self._built_at is None:
+            submit_once('recommend-rebuild', self.build)
+            return False
+        if self.rebuild_interval and time.monotonic() - self._built_at > self.rebuild_interval:
+            submit_once('recommend-rebuild', self.build)
+        self._apply_dirty()
+        return True
+
+    def recommend(self, liked_ids, disliked_ids=(), exclude_ids=(), limit=10):
+        """
+        Ids of the `limit` movies most similar to liked_ids (and least to disliked_ids),
+        best first, never returning anything in liked_ids, disliked_ids or exclude_ids.
+        """
+        if not self.ensure_current():
+            return self._recommend_from_database(liked_ids, disliked_ids, exclude_ids, limit)
+        with self._lock:
+            liked = [self._rows[movie_id] for movie_id in liked_ids if movie_id in self._rows]
+            if not liked or not len(self._ids):
+                return []
+            disliked = [self._rows[movie_id] for movie_id in disliked_ids if movie_id in self._rows]
+
+            # Batched cosine similarity: one (movies x liked) product, averaged per candidate
+            scores = (self._matrix @ self._matrix[liked].T).mean(axis=1)
+            if disliked:
+                scores -= DISLIKE_WEIGHT * (self._matrix @ self._matrix[disliked].T).mean(axis=1)
+            # Popularity only breaks near-ties
+            scores += 1e-3 * np.log1p(self._popularity)
+
+            candidates = self._valid.copy()
+            skipped = [self._rows[movie_id] for movie_id in (*liked_ids, *disliked_ids, *exclude_ids)
+                       if movie_id in self._rows]
+            candidates[skipped] = False
+            scores = np.where(candidates, scores, -np.inf)
+
+            limit = min(limit, int(candidates.sum()))
+            if limit <= 0:
+                return []
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            top = top[np.argsort(-scores[top])]
+            return self._ids[top].tolist()
+
+    def _recommend_from_database(self, liked_ids, disliked_ids, exclude_ids, limit):
+        """Degraded ranking while the matrix is being built: most genres in common, then popularity"""
+        from .models import Movie
+
+        if not liked_ids:
+            return []
+        genre_ids = Movie.genres.through.objects.filter(movie_id__in=liked_ids).values('genre_id')
+        movies = Movie.objects.filter(adult=False, genres__in=genre_ids).exclude(
+            id__in=[*liked_ids, *disliked_ids, *exclude_ids]
+        ).annotate(shared=Count('genres')).order_by('-shared', '-popularity', 'id')
+        return list(movies.values_list('id', flat=True)[:limit])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'movies': int(len(self._ids)),
+                'features': int(self._matrix.shape[1]) if self._matrix.ndim == 2 else 0,
+                'memory_bytes': int(self._matrix.nbytes + self._ids.nbytes + self._valid.nbytes
+                                    + self._popularity.nbytes),
+                'dirty': len(self._dirty),
+                'age_seconds': round(time.monotonic() - self._built_at) if self._built_at is not None else None,
+            }
+
+
+recommendation_engine = RecommendationEngine()
@@ -0,0 +1,122 @@
+"""
+This module contains the local full-text search over the movie catalog.
+
+Postgres uses a GIN index on a tsvector of the titles and SQLite an FTS5 table
+kept in sync by triggers (see migration 0006). Every query token is matched as
+a prefix, so "star wa" finds "Star Wars". Other databases fall back to
+case-insensitive substring matching.
+"""
+
+import re
+
+from django.db import connection
+
+from .autocomplete import normalize
+from .cache import tmdb_cache
+from .ingest import upsert_movies
+from .models import Movie
+
+SEARCH_SOURCES = ('auto', 'local', 'tmdb')
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+POSTGRES_SEARCH = """
+    SELECT id FROM movies_movie
+    WHERE to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(original_title, ''))
+          @@ to_tsquery('simple', %s)
+    ORDER BY ts_rank(
+        to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(original_title, '')),
+        to_tsquery('simple', %s)
+    ) DESC, popularity DESC
+    LIMIT %s
+"""
+
+SQLITE_SEARCH = """
+    SELECT m.id FROM movies_movie_fts f
+    JOIN movies_movie m ON m.id = f.rowid
+    WHERE movies_movie_fts MATCH %s
+    ORDER BY bm25(movies_movie_fts), m.popularity DESC
+    LIMIT %s
+"""
+
+
+def normalize_query(query):
+    """Cache key form of a search query: lowercased with whitespace collapsed"""
+    return ' '.join(query.lower().split())
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+def ranked_ids(query, limit):
+    """Ids of the best catalog matches for query, best first"""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            tsquery = ' & '.join(f'{token}:*' for token in tokens)
+            cursor.execute(POSTGRES_SEARCH, [tsquery, tsquery, limit])
+        elif connection.vendor == 'sqlite':
+            match = ' '.join(f'"{token}"*' for token in tokens)
+            cursor.execute(SQLITE_SEARCH, [match, limit])
+        else:
+            movies = Movie.objects.all()
+            for token in tokens:
+                movies = movies.filter(title__icontains=token)
+            return list(movies.order_by('-popularity').values_list('id', flat=True)[:limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_catalog(query, limit=20):
+    """Best catalog matches for query as TMDB-shaped list results"""
+    ids = ranked_ids(query, limit)
+    movies = Movie.objects.prefetch_related('genres').in_bulk(ids)
+    return [movies[movie_id].as_tmdb_result() for movie_id in ids if movie_id in movies]
+
+
+def search_response(results, source):
+    return {
+        'page': 1,
+        'results': results,
+        'total_pages': 1,
+        'total_results': len(results),
+        'source': source
+    }
+
+
+def ingest_search_results(search_data):
+    """Store TMDB search hits in the catalog so later searches can be answered locally"""
+    upsert_movies(search_data.get('results') or [])
+    return search_data
+
+
+def is_complete(search_data):
+    """True when a TMDB search response holds every match (a single, partly filled page)"""
+    results = search_data.get('results') or []
+    return search_data.get('total_pages', 1) <= 1 and search_data.get('total_results', 0) <= len(results)
+
+
+def matches_tokens(movie_data, tokens):
+    """Every token is the start of a word in the movie's title or original title"""
+    words = normalize(f"{movie_data.get('title') or ''} {movie_data.get('original_title') or ''}").split()
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+def reuse_prefix_results(query):
+    """
+    Answer a normalized query from the cached TMDB results of a shorter prefix
+    whose result set is complete, e.g. "star wa" from a complete "star w".
+    Returns a search response with source 'prefix', or None.
+    """
+    tokens = normalize(query).split()
+    for length in range(len(query) - 1, 0, -1):
+        search_data, state = tmdb_cache.lookup(tmdb_cache.make_key('search', {'query': query[:length]}))
+        if state is not None and is_complete(search_data):
+            return search_response(
+                [movie_data for movie_data in search_data['results'] if matches_tokens(movie_data, tokens)],
+                'prefix'
+            )
+    return None
@@ -11,5 +11,7 @@ class MovieSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Movie
-        fields = ['id', 'tmdb_id', 'title', 'overview', 'poster_path', 
-                'release_date', 'genres', 'vote_average']
\ No newline at end of file
+        fields = ['id', 'tmdb_id', 'title', 'original_title', 'original_language', 'overview',
+                'poster_path', 'backdrop_path', 'release_date', 'runtime', 'genres',
+                'popularity', 'vote_average', 'vote_count', 'fetched_at']
+        read_only_fields = ['fetched_at']
\ No newline at end of file
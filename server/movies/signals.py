@@ -0,0 +1,44 @@
+"""
+This module contains the signal handlers that keep the autocomplete title index,
+the genre index and the recommendation matrix in step with single-row Movie
+writes. Bulk writes update them from ingest.py.
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .autocomplete import title_index
+from .genres import genre_index
+from .recommend import recommendation_engine
+from .models import Movie
+from .tasks import submit_once
+
+
+@receiver(post_save, sender=Movie)
+def index_movie(sender, instance, **kwargs):
+    transaction.on_commit(lambda: title_index.upsert([instance]))
+    transaction.on_commit(lambda: recommendation_engine.mark_dirty([instance.pk]))
+
+
+@receiver(post_delete, sender=Movie)
+def unindex_movie(sender, instance, **kwargs):
+    transaction.on_commit(lambda: title_index.remove([instance.pk]))
+    transaction.on_commit(lambda: recommendation_engine.mark_dirty([instance.pk]))
+    transaction.on_commit(lambda: genre_index.mark_dirty([instance.pk]))
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def index_movie_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    # From the Genre side (genre.movies.add(...)) pk_set holds movie ids; a reverse clear does not list them
+    if not reverse:
+        movie_ids = [instance.pk]
+    elif pk_set is not None:
+        movie_ids = list(pk_set)
+    else:
+        transaction.on_commit(lambda: submit_once('genre-index-rebuild', genre_index.build))
+        return
+    transaction.on_commit(lambda: genre_index.mark_dirty(movie_ids))
+    transaction.on_commit(lambda: recommendation_engine.mark_dirty(movie_ids))
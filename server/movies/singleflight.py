@@ -0,0 +1,188 @@
+"""
+This module contains single-flight coalescing of identical upstream requests.
+
+While a call for a key is in flight, every other caller asking for the same
+key waits for that call and receives its result (or its exception) instead of
+issuing a duplicate request. Within a process this uses threading events; an
+optional shared lock store extends it across workers. AsyncSingleFlight does
+the same for coroutines running on one event loop.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import uuid
+import weakref
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class CacheLockStore:
+    """Cross-worker lock and result store backed by a Django cache (e.g. Redis or Memcached)"""
+
+    def __init__(self, cache, prefix='singleflight'):
+        self.cache = cache
+        self.prefix = prefix
+
+    def _key(self, kind, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return f'{self.prefix}:{kind}:{digest}'
+
+    def acquire(self, key, ttl):
+        """Try to become the leader for key; returns a token on success, None otherwise"""
+        token = uuid.uuid4().hex
+        if self.cache.add(self._key('lock', key), token, ttl):
+            self.cache.delete(self._key('result', key))
+            return token
+        return None
+
+    def release(self, key, token):
+        lock_key = self._key('lock', key)
+        if self.cache.get(lock_key) == token:
+            self.cache.delete(lock_key)
+
+    def is_locked(self, key):
+        return self.cache.get(self._key('lock', key)) is not None
+
+    def publish(self, key, outcome, ttl):
+        try:
+            self.cache.set(self._key('result', key), outcome, ttl)
+        except Exception:
+            # Exceptions that cannot be pickled are shared as a plain message
+            kind, value = outcome
+            self.cache.set(self._key('result', key), (kind, RuntimeError(str(value))), ttl)
+
+    def outcome(self, key):
+        return self.cache.get(self._key('result', key))
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution"""
+
+    def __init__(self, store=None, timeout=None, poll_interval=0.05):
+        self.store = store
+        self.timeout = timeout or settings.TMDB_SINGLEFLIGHT_TIMEOUT
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Run fn() once for all concurrent callers of key and return its result to each of them"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                logger.warning(f"Timed out waiting for in-flight call {key!r}, running it directly")
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, fn)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def _run(self, key, fn):
+        if self.store is None:
+            return fn()
+
+        token = self.store.acquire(key, self.timeout)
+        if token is None:
+            outcome = self._wait_for_peer(key)
+            if outcome is not None:
+                kind, value = outcome
+                if kind == 'error':
+                    raise value
+                return value
+            return fn()
+
+        try:
+            result = fn()
+        except Exception as e:
+            self.store.publish(key, ('error', e), self.timeout)
+            raise
+        else:
+            self.store.publish(key, ('result', result), self.timeout)
+            return result
+        finally:
+            self.store.release(key, token)
+
+    def _wait_for_peer(self, key):
+        """Poll the shared store until another worker publishes an outcome or gives up the lock"""
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            outcome = self.store.outcome(key)
+            if outcome is not None:
+                return outcome
+            if not self.store.is_locked(key):
+                return self.store.outcome(key)
+            time.sleep(self.poll_interval)
+        return None
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """Coalesces concurrent awaits for the same key into one shared task per event loop"""
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, fn):
+        """Await fn() once for all concurrent callers of key and return its result to each of them"""
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        task = calls.get(key)
+        if task is None:
+            task = calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._finish(calls, key, t))
+        # Shield the shared task so one caller disconnecting does not cancel it for the others
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _finish(calls, key, task):
+        if calls.get(key) is task:
+            del calls[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def in_flight(self):
+        try:
+            return len(self._calls.get(asyncio.get_running_loop(), {}))
+        except RuntimeError:
+            return 0
+
+
+def _shared_store():
+    alias = settings.TMDB_SINGLEFLIGHT_CACHE
+    return CacheLockStore(caches[alias]) if alias else None
+
+
+tmdb_flight = SingleFlight(store=_shared_store())
+async_tmdb_flight = AsyncSingleFlight()
@@ -0,0 +1,104 @@
+"""
+This module contains the thread pools used for TMDB work outside the request thread.
+
+Background jobs are keyed so the same refresh is never queued twice while one
+is still pending, and every job releases its database connection when it
+finishes. The separate fan-out pool runs concurrent upstream calls on behalf
+of a request that waits for them. warm_indexes queues the in-memory index
+builds when a server process starts, so they are usually ready before the
+first request that needs them.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_fanout_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def _reset_after_fork():
+    """Pool threads do not survive a fork (e.g. gunicorn --preload), so a child starts with fresh pools"""
+    global _executor, _fanout_executor, _executor_lock, _pending
+    _executor = _fanout_executor = None
+    _executor_lock = threading.Lock()
+    _pending = set()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.TMDB_BACKGROUND_WORKERS,
+                    thread_name_prefix='tmdb-background'
+                )
+    return _executor
+
+
+def _run(key, fn, args, kwargs):
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background job {key!r} failed")
+    finally:
+        close_old_connections()
+        with _executor_lock:
+            _pending.discard(key)
+
+
+def submit_once(key, fn, *args, **kwargs):
+    """Queue fn in the background unless a job with the same key is already pending"""
+    with _executor_lock:
+        if key in _pending:
+            return False
+        _pending.add(key)
+    get_executor().submit(_run, key, fn, args, kwargs)
+    return True
+
+
+def get_fanout_executor():
+    global _fanout_executor
+    if _fanout_executor is None:
+        with _executor_lock:
+            if _fanout_executor is None:
+                _fanout_executor = ThreadPoolExecutor(
+                    max_workers=settings.TMDB_FANOUT_WORKERS,
+                    thread_name_prefix='tmdb-fanout'
+                )
+    return _fanout_executor
+
+
+def run_concurrently(fn, items):
+    """Call fn(item) for every item on the fan-out pool and return a list of (item, result, error)"""
+    futures = {get_fanout_executor().submit(fn, item): item for item in items}
+    outcomes = []
+    for future in as_completed(futures):
+        try:
+            outcomes.append((futures[future], future.result(), None))
+        except Exception as e:
+            outcomes.append((futures[future], None, e))
+    return outcomes
+
+
+def warm_indexes():
+    """Queue the builds of the in-memory indexes in the background"""
+    from .autocomplete import title_index
+    from .genres import genre_index
+    from .recommend import recommendation_engine
+
+    title_index.ensure_built()
+    genre_index.ensure_current()
+    recommendation_engine.ensure_current()
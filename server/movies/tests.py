@@ -1,3 +1,1169 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipIf
+
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+import httpx
+import numpy as np
+import requests
+
+from . import posters
+from .autocomplete import TitleIndex
+from .breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from .cache import MISS, ResponseCache, tmdb_cache
+from .catalog import catalog_details, catalog_movie_ids, refresh_movie_details
+from .genres import MATCH_ALL, MATCH_ANY, GenreIndex, genre_registry
+from .ingest import upsert_movies
+from .management.commands.import_tmdb_export import read_export, upsert_batch
+from .models import Credit, Genre, Movie, SyncState
+from .pagination import decode_page_cursor, encode_cursor, encode_page_cursor, id_page
+from .posters import DirectoryFetcher, PosterStore
+from .recommend import RecommendationEngine
+from .search import reuse_prefix_results, search_catalog
+from .singleflight import AsyncSingleFlight, CacheLockStore, SingleFlight
+from .throttle import BULK, INTERACTIVE, PREFETCH, MemoryBucketStore, RequestScheduler, TokenBucket
+from .tmdb import TMDBClient, get_tmdb_client
+
+
+class GateStore:
+    """A bucket store that grants exactly the tokens a test releases"""
+
+    def __init__(self):
+        self.tokens = 0
+        self.lock = threading.Lock()
+
+    def take(self, key, tokens, rate, capacity, reserve=0):
+        with self.lock:
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+        return 0.01
+
+    def release(self, tokens=1):
+        with self.lock:
+            self.tokens += tokens
+
+    def pause(self, key, seconds):
+        pass
+
+    def paused_for(self, key):
+        return 0
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not met in time')
+        time.sleep(0.005)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_reserve_is_left_in_the_bucket(self):
+        bucket = TokenBucket(rate=1, capacity=4)
+        self.assertEqual(bucket.try_acquire(reserve=2), 0)
+        self.assertEqual(bucket.try_acquire(reserve=2), 0)
+        self.assertGreater(bucket.try_acquire(reserve=2), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+
+
+class RequestSchedulerTests(SimpleTestCase):
+    def make_scheduler(self, store=None, timeout=0):
+        return RequestScheduler(
+            store=store or MemoryBucketStore(), rate=10,
+            reserves={INTERACTIVE: 0, PREFETCH: 0.2, BULK: 0.5},
+            timeouts=dict.fromkeys((INTERACTIVE, PREFETCH, BULK), timeout)
+        )
+
+    def test_lower_priorities_leave_their_reserve_to_higher_ones(self):
+        scheduler = self.make_scheduler()
+        granted = 0
+        while scheduler.acquire(BULK):
+            granted += 1
+        self.assertEqual(granted, 5)
+        self.assertTrue(scheduler.acquire(PREFETCH))
+        self.assertTrue(scheduler.acquire(INTERACTIVE))
+        stats = scheduler.stats()['priorities']
+        self.assertEqual(stats[BULK]['granted'], 5)
+        self.assertEqual(stats[BULK]['timeouts'], 1)
+
+    def test_waiters_are_served_highest_priority_first(self):
+        store = GateStore()
+        scheduler = self.make_scheduler(store, timeout=None)
+        order = []
+
+        def wait_for_token(priority):
+            scheduler.acquire(priority)
+            order.append(priority)
+
+        threads = []
+        for priority in (BULK, PREFETCH, INTERACTIVE):
+            thread = threading.Thread(target=wait_for_token, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            wait_until(lambda: scheduler.queue_depths()[priority] == 1)
+
+        for granted in range(1, 4):
+            store.release()
+            wait_until(lambda: len(order) == granted)
+        for thread in threads:
+            thread.join(1)
+        self.assertEqual(order, [INTERACTIVE, PREFETCH, BULK])
+
+    def test_pause_holds_back_every_priority(self):
+        scheduler = self.make_scheduler()
+        scheduler.pause(30)
+        self.assertFalse(scheduler.acquire(INTERACTIVE))
+        self.assertGreater(scheduler.stats()['paused_for'], 0)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ResponseCache(max_entries=10, ttls={'default': 60}, stale_ttl=60)
+        self.key = self.cache.make_key('details', {'tmdb_id': 1})
+        patcher = mock.patch('movies.cache.get_tmdb_client', side_effect=lambda priority=INTERACTIVE: priority)
+        self.get_tmdb_client = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fetch_passes_an_interactive_client(self):
+        fetch = mock.Mock(return_value={'id': 1})
+        self.assertEqual(self.cache.fetch('details', {'tmdb_id': 1}, fetch), {'id': 1})
+        fetch.assert_called_once_with(INTERACTIVE)
+        self.assertEqual(self.cache.peek(self.key), {'id': 1})
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ResponseCache(max_entries=2, ttls={'default': 60}, stale_ttl=0)
+        for tmdb_id in (1, 2):
+            cache.set(cache.make_key('details', {'tmdb_id': tmdb_id}), tmdb_id)
+        cache.get_cached('details', {'tmdb_id': 1}, mock.Mock())
+        cache.set(cache.make_key('details', {'tmdb_id': 3}), 3)
+        self.assertIs(cache.get_cached('details', {'tmdb_id': 2}, mock.Mock()), MISS)
+        self.assertEqual(cache.get_cached('details', {'tmdb_id': 1}, mock.Mock()), 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_entries_past_the_stale_window_are_misses(self):
+        cache = ResponseCache(max_entries=10, ttls={'default': 60}, stale_ttl=0)
+        cache.set(self.key, {'id': 1}, ttl=-1)
+        fetch = mock.Mock()
+        self.assertIs(cache.get_cached('details', {'tmdb_id': 1}, fetch), MISS)
+        fetch.assert_not_called()
+
+    def test_failed_fetches_are_not_cached(self):
+        fetch = mock.Mock(side_effect=requests.ConnectionError())
+        with self.assertRaises(requests.ConnectionError):
+            self.cache.get_or_fetch('details', {'tmdb_id': 1}, fetch)
+        self.assertIsNone(self.cache.peek(self.key))
+
+    def test_stale_entries_refresh_at_prefetch_priority(self):
+        self.cache.set(self.key, {'id': 1, 'title': 'Old'}, ttl=-1)
+        fetch = mock.Mock(return_value={'id': 1, 'title': 'New'})
+        with mock.patch('movies.cache.submit_once', side_effect=lambda key, fn, *args: fn(*args)):
+            self.assertEqual(self.cache.get_cached('details', {'tmdb_id': 1}, fetch), {'id': 1, 'title': 'Old'})
+        fetch.assert_called_once_with(PREFETCH)
+        self.assertEqual(self.cache.peek(self.key), {'id': 1, 'title': 'New'})
+
+
+@skipIf(posters.Image is None, 'Pillow is not installed')
+class PosterStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source_dir)
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.write_image('abc.jpg')
+        with open(os.path.join(self.source_dir, 'bad.jpg'), 'wb') as bad_file:
+            bad_file.write(b'<html>not an image</html>')
+
+    def write_image(self, name, color=(200, 30, 30)):
+        posters.Image.new('RGB', (780, 1170), color).save(os.path.join(self.source_dir, name), quality=95)
+
+    def make_store(self, **kwargs):
+        return PosterStore(
+            root=self.cache_dir, fetcher=DirectoryFetcher(self.source_dir), source_size='w780', **kwargs
+        )
+
+    def test_smaller_sizes_are_resized_from_one_download(self):
+        store = self.make_store()
+        blob_path, _ = store.get('w92', 'abc.jpg')
+        with open(blob_path, 'rb') as image_file:
+            self.assertEqual(posters.Image.open(io.BytesIO(image_file.read())).size, (92, 138))
+        store.get('w185', 'abc.jpg')
+        store.get('w92', 'abc.jpg')
+        stats = store.stats()
+        self.assertEqual((stats['downloads'], stats['resizes'], stats['hits']), (1, 2, 2))
+
+    def test_invalid_download_is_rejected_and_not_stored(self):
+        store = self.make_store()
+        with self.assertRaises(posters.InvalidImage):
+            store.get('w780', 'bad.jpg')
+        self.assertIsNone(store.lookup('w780', 'bad.jpg'))
+
+    def test_least_recently_used_blobs_are_evicted_over_the_cap(self):
+        store = self.make_store(max_bytes=20000)
+        for i in range(5):
+            self.write_image(f'p{i}.jpg', (i * 40, 30, 30))
+            store.get('w780', f'p{i}.jpg')
+        self.assertGreater(store.stats()['evictions'], 0)
+        self.assertLessEqual(store.stats()['bytes'], 20000)
+        self.assertIsNotNone(store.lookup('w780', 'p4.jpg'))
+
+    def test_eviction_follows_use_without_rescanning_the_disk(self):
+        store = self.make_store(max_bytes=20000)
+        with mock.patch.object(store, '_blobs', wraps=store._blobs) as blobs:
+            for i in range(5):
+                self.write_image(f'p{i}.jpg', (i * 40, 30, 30))
+                store.get('w780', f'p{i}.jpg')
+                store.get('w780', 'p0.jpg')
+        self.assertEqual(blobs.call_count, 1)
+        self.assertIsNotNone(store.lookup('w780', 'p0.jpg'))
+        self.assertIsNone(store.lookup('w780', 'p1.jpg'))
+        on_disk = sum(size for _, size, _ in store._blobs())
+        self.assertEqual(store.stats()['bytes'], on_disk)
+
+    def test_concurrent_hits_are_all_counted(self):
+        store = self.make_store()
+        store.get('w780', 'abc.jpg')
+
+        def hit():
+            for _ in range(200):
+                store.get('w780', 'abc.jpg')
+
+        threads = [threading.Thread(target=hit) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(store.stats()['hits'], 800)
+
+    def test_blob_evicted_before_it_is_opened_is_produced_again(self):
+        store = self.make_store()
+        blob_path, _ = store.get('w780', 'abc.jpg')
+        get = store.get
+
+        def evicting_get(size, path):
+            result = get(size, path)
+            store.get = get
+            os.remove(blob_path)
+            return result
+
+        store.get = evicting_get
+        image_file, _ = store.open_blob('w780', 'abc.jpg')
+        with image_file:
+            self.assertTrue(image_file.read())
+
+    def test_poster_view(self):
+        with mock.patch.object(posters, '_poster_store', self.make_store()):
+            response = self.client.get('/api/movies/poster/w92/abc.jpg')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'image/jpeg')
+            self.assertIn('immutable', response['Cache-Control'])
+            b''.join(response.streaming_content)
+            response.close()
+
+            cached = self.client.get('/api/movies/poster/w92/abc.jpg', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(cached.status_code, 304)
+
+            self.assertEqual(self.client.get('/api/movies/poster/w92/missing.jpg').status_code, 404)
+            self.assertEqual(self.client.get('/api/movies/poster/w999/abc.jpg').status_code, 400)
+            invalid = self.client.get('/api/movies/poster/w92/bad.jpg')
+            self.assertEqual(invalid.status_code, 502)
+            self.assertFalse(invalid.has_header('Cache-Control'))
+
+
+class ImportTMDBExportTests(TestCase):
+    def write_export(self, lines, name='movie_ids_01_01_2025.json.gz'):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, name)
+        with (gzip.open if name.endswith('.gz') else open)(path, 'wt', encoding='utf-8') as export_file:
+            export_file.write('\n'.join(lines) + '\n')
+        return path
+
+    def export_line(self, movie_id, title, popularity=1.5, adult=False):
+        return json.dumps({'adult': adult, 'id': movie_id, 'original_title': title, 'popularity': popularity})
+
+    def test_malformed_lines_are_skipped(self):
+        path = self.write_export([
+            self.export_line(1, 'One'),
+            '{"id": "not a number"}',
+            '',
+            '{truncated',
+            self.export_line(2, 'Two', adult=True),
+        ], name='movie_ids.json')
+        self.assertEqual(
+            list(read_export(path)),
+            [(1, 'One', 1.5, False), None, None, (2, 'Two', 1.5, True)]
+        )
+
+    def test_import_inserts_new_movies_and_updates_existing_ones(self):
+        Movie.objects.create(id=1, tmdb_id=1, title='Localized title', original_title='Old', popularity=0)
+        path = self.write_export([self.export_line(1, 'One', 9.0), 'garbage', self.export_line(2, 'Two')])
+        output = io.StringIO()
+        call_command('import_tmdb_export', path, '--batch-size', '2', stdout=output)
+
+        self.assertIn('Imported 2 rows', output.getvalue())
+        self.assertIn('skipped 1 malformed lines', output.getvalue())
+        existing = Movie.objects.get(id=1)
+        self.assertEqual((existing.title, existing.original_title, existing.popularity), ('Localized title', 'One', 9.0))
+        self.assertEqual(Movie.objects.get(id=2).title, 'Two')
+
+    def test_orm_upsert_matches_the_sql_writers(self):
+        Movie.objects.create(id=1, tmdb_id=1, title='Localized title', original_title='Old', popularity=0)
+        upsert_batch([(1, 'One', 9.0, False), (3, 'Three', 2.0, True)])
+        self.assertEqual(Movie.objects.get(id=1).title, 'Localized title')
+        self.assertEqual(Movie.objects.get(id=1).popularity, 9.0)
+        self.assertTrue(Movie.objects.get(id=3).adult)
+
+
+class SyncMoviesCommandTests(TestCase):
+    def setUp(self):
+        Movie.objects.create(id=1, tmdb_id=1, title='Old title')
+        patcher = mock.patch('movies.management.commands.sync_movies.get_tmdb_client')
+        self.client_mock = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.client_mock.changes.side_effect = lambda start, end, page: {
+            'results': [{'id': 1}, {'id': 2}] if page == 1 else [{'id': 3}], 'total_pages': 2
+        }
+        self.client_mock.movie.return_value = {'id': 1, 'title': 'New title', 'credits': {'cast': [], 'crew': []}}
+
+    def test_changed_local_movies_are_refreshed(self):
+        since = (timezone.now() - timedelta(days=2)).isoformat()
+        output = io.StringIO()
+        call_command('sync_movies', '--since', since, stdout=output)
+
+        self.assertEqual(self.client_mock.changes.call_count, 2)
+        self.client_mock.movie.assert_called_once_with(1, append_to_response='credits')
+        self.assertEqual(Movie.objects.get(id=1).title, 'New title')
+        self.assertFalse(Movie.objects.filter(id__in=[2, 3]).exists())
+        self.assertIn('Refreshed 1 of 1 changed movies', output.getvalue())
+        self.assertIn('watermark', SyncState.load('sync_movies').data)
+
+    def test_dry_run_changes_nothing(self):
+        output = io.StringIO()
+        call_command('sync_movies', '--dry-run', stdout=output)
+        self.client_mock.movie.assert_not_called()
+        self.assertEqual(Movie.objects.get(id=1).title, 'Old title')
+        self.assertIn('1 local movies would be refreshed', output.getvalue())
+        self.assertNotIn('watermark', SyncState.load('sync_movies').data)
+
+    def test_long_ranges_are_split_into_fourteen_day_windows(self):
+        since = timezone.now() - timedelta(days=20)
+        call_command('sync_movies', '--since', since.isoformat(), '--dry-run', stdout=io.StringIO())
+        windows = sorted({(call.args[0], call.args[1]) for call in self.client_mock.changes.call_args_list})
+        self.assertEqual(len(windows), 2)
+        self.assertEqual(windows[0], (since.date(), (since + timedelta(days=14)).date()))
+
+    def test_failed_refresh_keeps_the_watermark(self):
+        watermark = (timezone.now() - timedelta(days=1)).isoformat()
+        SyncState.objects.create(key='sync_movies', data={'watermark': watermark})
+        self.client_mock.movie.side_effect = requests.ConnectionError('down')
+        with self.assertRaisesMessage(CommandError, f'watermark kept at {watermark}'):
+            call_command('sync_movies', stdout=io.StringIO())
+        self.assertEqual(SyncState.load('sync_movies').data['watermark'], watermark)
+        self.assertEqual(Movie.objects.get(id=1).title, 'Old title')
+
+    def test_movies_removed_upstream_are_skipped(self):
+        self.client_mock.movie.side_effect = requests.HTTPError(response=json_response(404))
+        output = io.StringIO()
+        call_command('sync_movies', stdout=output)
+        self.assertIn('Refreshed 0 of 1 changed movies', output.getvalue())
+        self.assertIn('watermark', SyncState.load('sync_movies').data)
+
+
+class CatalogMovieIdsTests(TestCase):
+    def setUp(self):
+        Movie.objects.create(id=1, tmdb_id=1, title='Catalogued')
+        patcher = mock.patch('movies.catalog.get_tmdb_client')
+        self.movie = patcher.start().return_value.movie
+        self.addCleanup(patcher.stop)
+
+    def test_missing_movies_are_fetched_concurrently(self):
+        # Each fetch waits for the other, so fetching one after the other would break the barrier
+        barrier = threading.Barrier(2, timeout=2)
+
+        def fetch(tmdb_id):
+            barrier.wait()
+            return {'id': tmdb_id, 'title': f'Movie {tmdb_id}'}
+
+        self.movie.side_effect = fetch
+        self.assertEqual(catalog_movie_ids([1, 2, 3]), {1: 1, 2: 2, 3: 3})
+        self.assertEqual(sorted(call.args[0] for call in self.movie.call_args_list), [2, 3])
+        self.assertEqual(Movie.objects.get(id=3).title, 'Movie 3')
+
+    def test_failed_fetch_is_raised_after_the_others_are_stored(self):
+        def fetch(tmdb_id):
+            if tmdb_id == 2:
+                raise requests.HTTPError(response=mock.Mock(status_code=404))
+            return {'id': tmdb_id, 'title': f'Movie {tmdb_id}'}
+
+        self.movie.side_effect = fetch
+        with self.assertRaises(requests.HTTPError):
+            catalog_movie_ids([2, 3])
+        self.assertTrue(Movie.objects.filter(id=3).exists())
+        self.assertFalse(Movie.objects.filter(id=2).exists())
+
+
+class TitleIndexTests(TestCase):
+    def setUp(self):
+        titles = [
+            ('Star Wars', 8.2), ('Stardust', 7.1), ('The Last Starfighter', 6.5),
+            ('Wars of the Roses', 5.0), ('Amélie', 7.9), ('Alien', 8.4),
+        ]
+        for tmdb_id, (title, rating) in enumerate(titles, start=1):
+            Movie.objects.create(id=tmdb_id, tmdb_id=tmdb_id, title=title, vote_average=rating, popularity=tmdb_id)
+        self.index = TitleIndex(rebuild_interval=0)
+
+    def titles(self, query, limit=10):
+        return [movie.title for movie in self.index.suggest(query, limit)]
+
+    def test_unbuilt_index_queues_a_build_and_queries_the_database(self):
+        with mock.patch('movies.autocomplete.submit_once') as submit_once:
+            self.assertEqual(self.titles('star'), ['Star Wars', 'Stardust'])
+        submit_once.assert_called_once_with('autocomplete-rebuild', self.index.build)
+        self.assertIsNone(self.index.stats()['age_seconds'])
+
+    def test_matches_any_title_word_best_rated_first(self):
+        self.index.build()
+        self.assertEqual(self.titles('star'), ['Star Wars', 'Stardust', 'The Last Starfighter'])
+        self.assertEqual(self.titles('wars'), ['Star Wars', 'Wars of the Roses'])
+        self.assertEqual(self.titles('star w'), ['Star Wars'])
+        self.assertEqual(self.titles('ame'), ['Amélie'])
+
+    @override_settings(MOVIE_AUTOCOMPLETE_SCAN_LIMIT=1)
+    def test_common_prefixes_walk_the_ranking_instead_of_every_match(self):
+        self.index.build()
+        self.assertEqual(self.titles('s', limit=2), ['Star Wars', 'Stardust'])
+        self.assertEqual(self.titles('a'), ['Alien', 'Amélie'])
+
+    def test_autocomplete_endpoint(self):
+        self.index.build()
+        with mock.patch('movies.views.title_index', self.index):
+            response = self.client.get('/api/movies/autocomplete/', {'q': 'Star', 'limit': 2})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['query'], 'Star')
+            self.assertEqual([movie['title'] for movie in response.json()['results']], ['Star Wars', 'Stardust'])
+            self.assertEqual(response.json()['results'][0]['release_date'], '')
+            response = self.client.get('/api/movies/autocomplete/', {'q': 'star', 'limit': 'ten'})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': 'limit must be an integer'})
+
+    def test_upserts_and_removals_keep_the_ranking(self):
+        self.index.build()
+        self.assertEqual(self.titles('st', limit=1), ['Star Wars'])
+        Movie.objects.filter(title='Stardust').update(vote_average=9.0)
+        stardust = Movie.objects.get(title='Stardust')
+        star_wars = Movie.objects.get(title='Star Wars')
+        self.index.upsert([stardust])
+        self.index.remove([star_wars.id])
+        with override_settings(MOVIE_AUTOCOMPLETE_SCAN_LIMIT=1):
+            self.assertEqual(self.titles('st'), ['Stardust', 'The Last Starfighter'])
+
+
+class RecommendationEngineTests(TestCase):
+    def setUp(self):
+        action, comedy, drama = (Genre.objects.create(id=genre_id, name=name) for genre_id, name in
+                                 ((28, 'Action'), (35, 'Comedy'), (18, 'Drama')))
+        movies = {
+            1: ('Liked', [action, drama]), 2: ('Action drama', [action, drama]), 3: ('Action', [action]),
+            4: ('Comedy', [comedy]), 5: ('Excluded', [action, drama]),
+        }
+        for movie_id, (title, genres) in movies.items():
+            Movie.objects.create(id=movie_id, tmdb_id=movie_id, title=title, popularity=movie_id).genres.set(genres)
+        self.engine = RecommendationEngine(rebuild_interval=0)
+
+    def test_unbuilt_engine_queues_a_build_and_ranks_by_shared_genres(self):
+        with mock.patch('movies.recommend.submit_once') as submit_once:
+            self.assertEqual(self.engine.recommend([1], exclude_ids=[5]), [2, 3])
+        submit_once.assert_called_once_with('recommend-rebuild', self.engine.build)
+        self.assertIsNone(self.engine.stats()['age_seconds'])
+
+    def test_built_engine_ranks_by_similarity(self):
+        self.engine.build()
+        self.assertEqual(self.engine.recommend([1], exclude_ids=[5]), [2, 3, 4])
+        self.assertEqual(self.engine.recommend([1], disliked_ids=[2], limit=1), [5])
+
+    def test_new_genre_rebuilds_in_the_background(self):
+        self.engine.build()
+        Genre.objects.create(id=99, name='Western')
+        Movie.objects.get(id=4).genres.add(99)
+        self.engine.mark_dirty([4])
+        with mock.patch('movies.recommend.submit_once') as submit_once:
+            self.assertEqual(self.engine.recommend([1], exclude_ids=[5], limit=2), [2, 3])
+        submit_once.assert_called_once_with('recommend-rebuild', self.engine.build)
+
+
+class GenreIndexTests(TestCase):
+    def setUp(self):
+        action, comedy, drama = (Genre.objects.create(id=genre_id, name=name) for genre_id, name in
+                                 ((28, 'Action'), (35, 'Comedy'), (18, 'Drama')))
+        for movie_id, genres in ((1, [action, drama]), (2, [action]), (3, [comedy]), (4, [drama, comedy])):
+            Movie.objects.create(id=movie_id, tmdb_id=movie_id, title=f'Movie {movie_id}').genres.set(genres)
+        self.index = GenreIndex(rebuild_interval=0)
+
+    def lookups(self):
+        return [
+            self.index.movie_ids([28, 18], MATCH_ALL).tolist(),
+            self.index.movie_ids([28, 18], MATCH_ANY).tolist(),
+            self.index.movie_ids([35], MATCH_ALL).tolist(),
+        ]
+
+    def test_unbuilt_index_queues_a_build_and_queries_the_links(self):
+        with mock.patch('movies.genres.submit_once') as submit_once:
+            self.assertEqual(self.lookups(), [[1], [1, 2, 4], [3, 4]])
+        submit_once.assert_called_with('genre-index-rebuild', self.index.build)
+        self.assertEqual(self.index.stats()['genres'], 0)
+
+    @override_settings(MOVIE_GENRE_PAGE_SIZE=2)
+    def test_genre_filtered_list_pages_by_cursor(self):
+        genre_registry.refresh()
+        self.index.build()
+        with mock.patch('movies.views.genre_index', self.index):
+            first = self.client.get('/api/movies/', {'genres': '28,18', 'match': 'any'}).json()
+            self.assertEqual((first['count'], [movie['id'] for movie in first['results']]), (3, [4, 2]))
+            second = self.client.get(first['next']).json()
+            self.assertEqual(([movie['id'] for movie in second['results']], second['next']), ([1], None))
+
+            response = self.client.get('/api/movies/', {'genres': '28,99'})
+            self.assertEqual(response.json(), {'error': 'Unknown genre ids: 99'})
+            response = self.client.get('/api/movies/', {'genres': '28', 'match': 'some'})
+            self.assertEqual(response.status_code, 400)
+
+    def test_built_index_matches_the_database(self):
+        self.index.build()
+        self.assertEqual(self.lookups(), [[1], [1, 2, 4], [3, 4]])
+        Movie.objects.get(id=2).genres.add(18)
+        self.index.mark_dirty([2])
+        self.assertEqual(self.index.movie_ids([28, 18]).tolist(), [1, 2])
+
+
+def json_response(status_code=200, body=None, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body or {}).encode()
+    response.headers.update(headers or {})
+    return response
+
+
+class TMDBClientTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = mock.Mock()
+        self.scheduler = mock.Mock()
+        self.client = TMDBClient(
+            api_key='key', base_url='https://tmdb.test/3/', max_retries=0,
+            breaker=self.breaker, scheduler=self.scheduler
+        )
+
+    def test_shared_client_is_reused_at_every_priority(self):
+        client = get_tmdb_client()
+        self.assertIs(get_tmdb_client(), client)
+        prefetch = get_tmdb_client(PREFETCH)
+        self.assertEqual(prefetch.priority, PREFETCH)
+        self.assertIs(prefetch.session, client.session)
+
+    def test_get_sends_the_api_key_on_the_pooled_session(self):
+        with mock.patch.object(self.client.session, 'get', return_value=json_response(body={'id': 7})) as get:
+            self.assertEqual(self.client.movie(7, append_to_response='credits'), {'id': 7})
+        get.assert_called_once_with(
+            'https://tmdb.test/3/movie/7',
+            params={'api_key': 'key', 'append_to_response': 'credits'},
+            timeout=self.client.timeout
+        )
+        self.scheduler.acquire.assert_called_once_with(INTERACTIVE)
+        self.breaker.record.assert_called_once_with(mock.ANY, False)
+
+    def test_not_found_is_raised_but_not_counted_as_an_outage(self):
+        with mock.patch.object(self.client.session, 'get', return_value=json_response(404)):
+            with self.assertRaises(requests.HTTPError):
+                self.client.movie(7)
+        self.breaker.record.assert_called_once_with(mock.ANY, False)
+
+    def test_rate_limited_response_pauses_the_scheduler(self):
+        response = json_response(429, headers={'Retry-After': '3'})
+        with mock.patch.object(self.client.session, 'get', return_value=response):
+            with self.assertRaises(requests.HTTPError):
+                self.client.popular()
+        self.scheduler.pause.assert_called_once_with(3.0)
+        self.breaker.record.assert_called_once_with(mock.ANY, True)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def run_concurrent_calls(self, flight, fn, callers=4):
+        """Start callers threads on the same key; returns once every one is waiting on the first call"""
+        outcomes = []
+        entered = []
+
+        def call():
+            entered.append(1)
+            try:
+                outcomes.append(flight.do('movie/1', fn))
+            except Exception as e:
+                outcomes.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        wait_until(lambda: len(entered) == callers and flight.in_flight() == 1)
+        time.sleep(0.05)  # let the last caller reach the in-flight call
+        return threads, outcomes
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight(timeout=2)
+        release = threading.Event()
+        fn = mock.Mock(side_effect=lambda: release.wait(2) and {'id': 1})
+        threads, outcomes = self.run_concurrent_calls(flight, fn)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(outcomes, [{'id': 1}] * 4)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_errors_are_shared_and_not_remembered(self):
+        flight = SingleFlight(timeout=2)
+        release = threading.Event()
+
+        def fail():
+            release.wait(2)
+            raise requests.ConnectionError('down')
+
+        threads, outcomes = self.run_concurrent_calls(flight, fail, callers=2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(isinstance(outcome, requests.ConnectionError) for outcome in outcomes))
+        self.assertEqual(flight.do('movie/1', lambda: 'retried'), 'retried')
+
+    def test_result_published_by_another_worker_is_reused(self):
+        store = CacheLockStore(LocMemCache('singleflight-tests', {}))
+        peer_token = store.acquire('movie/1', 5)
+        store.publish('movie/1', ('result', {'id': 1}), 5)
+        store.release('movie/1', peer_token)
+        store.acquire = mock.Mock(return_value=None)  # the peer still holds the lock
+        fn = mock.Mock()
+        self.assertEqual(SingleFlight(store=store, timeout=1).do('movie/1', fn), {'id': 1})
+        fn.assert_not_called()
+
+    def test_async_awaits_share_one_task(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {'id': 1}
+
+        async def main():
+            return await asyncio.gather(*(flight.do('movie/1', fetch) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(main()), [{'id': 1}] * 3)
+        self.assertEqual(len(calls), 1)
+
+
+class FakeAsyncTMDBClient:
+    """Answers the async TMDB calls the proxy views make from canned payloads"""
+
+    def __init__(self, movies=None, error=None):
+        self.movies = movies or {}
+        self.error = error
+        self.calls = []
+
+    async def popular(self, page=1):
+        self.calls.append(('popular', page))
+        if self.error:
+            raise self.error
+        return {'page': page, 'results': list(self.movies.values()), 'total_pages': 3, 'total_results': 60}
+
+    async def movie(self, tmdb_id, append_to_response=None):
+        self.calls.append(('movie', tmdb_id))
+        if self.error:
+            raise self.error
+        return self.movies[tmdb_id]
+
+
+@override_settings(ROOT_URLCONF='server.asgi_urls')
+class AsyncProxyViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmdb_cache.clear()
+        self.tmdb = FakeAsyncTMDBClient({5: {'id': 5, 'title': 'Five', 'genres': []}})
+        for target, replacement in (
+            ('movies.cache.get_async_tmdb_client', mock.Mock(return_value=self.tmdb)),
+            ('movies.pagination.submit_once', mock.Mock()),
+        ):
+            patcher = mock.patch(target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_popular_is_fetched_once_and_then_served_from_the_cache(self):
+        for _ in range(2):
+            response = await self.async_client.get('/api/movies/popular/')
+            self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([movie['id'] for movie in data['results']], [5])
+        self.assertIn('cursor=', data['next'])
+        self.assertEqual(self.tmdb.calls, [('popular', 1)])
+
+    async def test_details_are_fetched_and_stored_in_the_catalog(self):
+        response = await self.async_client.get('/api/movies/tmdb/5/')
+        self.assertEqual(response.json()['title'], 'Five')
+        movie = await Movie.objects.aget(tmdb_id=5)
+        self.assertEqual(movie.tmdb_payload['title'], 'Five')
+
+    async def test_outage_without_a_local_copy_is_a_503(self):
+        self.tmdb.error = httpx.ConnectError('down')
+        response = await self.async_client.get('/api/movies/tmdb/5/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'error': 'Failed to fetch movie details from TMDB'})
+
+
+class TMDBBatchViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmdb_cache.clear()
+        self.tmdb = mock.Mock()
+        patcher = mock.patch('movies.cache.get_tmdb_client', return_value=self.tmdb)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ids_come_from_the_cache_the_catalog_and_tmdb(self):
+        tmdb_cache.set(tmdb_cache.make_key('details', {'tmdb_id': 1}), {'id': 1, 'title': 'Cached'})
+        Movie.objects.create(
+            id=2, tmdb_id=2, title='Catalogued', tmdb_payload={'id': 2, 'title': 'Catalogued'},
+            fetched_at=timezone.now()
+        )
+
+        def movie(tmdb_id):
+            if tmdb_id == 4:
+                raise requests.HTTPError(response=json_response(404))
+            return {'id': tmdb_id, 'title': 'Fetched', 'genres': []}
+
+        self.tmdb.movie.side_effect = movie
+        response = self.client.get('/api/movies/tmdb/batch/', {'ids': '1,2,3,4,1'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            {tmdb_id: movie['title'] for tmdb_id, movie in data['results'].items()},
+            {'1': 'Cached', '2': 'Catalogued', '3': 'Fetched'}
+        )
+        self.assertEqual(data['errors'], {'4': {'error': 'Failed to fetch movie details from TMDB', 'status': 404}})
+        self.assertEqual(sorted(call.args[0] for call in self.tmdb.movie.call_args_list), [3, 4])
+        self.assertEqual(Movie.objects.get(tmdb_id=3).tmdb_payload['title'], 'Fetched')
+
+    def test_invalid_ids_are_rejected(self):
+        for ids, error in (
+            ('', 'ids query parameter is required'),
+            ('1,x', 'ids must be a comma-separated list of integers'),
+        ):
+            response = self.client.get('/api/movies/tmdb/batch/', {'ids': ids})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': error})
+        with override_settings(TMDB_BATCH_MAX_IDS=2):
+            response = self.client.get('/api/movies/tmdb/batch/', {'ids': '1,2,3'})
+        self.assertEqual(response.json(), {'error': 'At most 2 ids can be requested at once'})
+        self.tmdb.movie.assert_not_called()
+
+
+class UpsertMoviesTests(TestCase):
+    def setUp(self):
+        Genre.objects.create(id=28, name='Action')
+        Genre.objects.create(id=18, name='Drama')
+        genre_registry.refresh()
+
+    def page(self, count, **fields):
+        return [
+            {'id': tmdb_id, 'title': f'Movie {tmdb_id}', 'genre_ids': [28, 99], 'release_date': '', **fields}
+            for tmdb_id in range(1, count + 1)
+        ]
+
+    def test_creates_then_updates_movies_and_their_genre_links(self):
+        result = upsert_movies(self.page(2))
+        self.assertEqual((result.created, result.updated, result.ids), (2, 0, [1, 2]))
+        result = upsert_movies(self.page(3, genre_ids=[18], vote_average=7.5))
+        self.assertEqual((result.created, result.updated), (1, 2))
+        movie = Movie.objects.get(id=1)
+        self.assertEqual(movie.vote_average, 7.5)
+        self.assertIsNone(movie.release_date)
+        self.assertEqual(list(movie.genres.values_list('id', flat=True)), [18])
+
+    def test_list_payloads_keep_the_stored_details(self):
+        upsert_movies([{'id': 1, 'title': 'Details', 'runtime': 120, 'genres': [{'id': 28}]}], details=True)
+        upsert_movies([{'id': 1, 'title': 'Listed', 'genre_ids': [28]}])
+        movie = Movie.objects.get(id=1)
+        self.assertEqual((movie.title, movie.runtime, movie.tmdb_payload['title']), ('Listed', 120, 'Details'))
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        upsert_movies(self.page(1))
+        with self.assertNumQueries(6) as small:
+            upsert_movies(self.page(1))
+        with self.assertNumQueries(len(small.captured_queries)):
+            upsert_movies(self.page(20))
+
+
+class CatalogDetailsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmdb_cache.clear()
+        self.tmdb = mock.Mock()
+        self.tmdb.movie.side_effect = lambda tmdb_id: {'id': tmdb_id, 'title': 'From TMDB', 'genres': []}
+        for target in ('movies.cache.get_tmdb_client', 'movies.catalog.get_tmdb_client'):
+            patcher = mock.patch(target, return_value=self.tmdb)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def store(self, tmdb_id, age):
+        Movie.objects.create(
+            id=tmdb_id, tmdb_id=tmdb_id, title='Stored', tmdb_payload={'id': tmdb_id, 'title': 'Stored'},
+            fetched_at=timezone.now() - age
+        )
+
+    def test_fresh_details_are_served_without_tmdb(self):
+        self.store(1, timedelta(minutes=5))
+        response = self.client.get('/api/movies/tmdb/1/')
+        self.assertEqual(response.json()['title'], 'Stored')
+        self.tmdb.movie.assert_not_called()
+        self.assertEqual(tmdb_cache.peek(tmdb_cache.make_key('details', {'tmdb_id': 1}))['title'], 'Stored')
+
+    def test_stale_details_are_served_and_refreshed_in_the_background(self):
+        self.store(1, timedelta(days=2))
+        with mock.patch('movies.catalog.submit_once') as submit_once:
+            self.assertEqual(catalog_details([1, 2]), {1: {'id': 1, 'title': 'Stored'}})
+        submit_once.assert_called_once_with(('catalog-refresh', 1), refresh_movie_details, 1)
+
+        refresh_movie_details(1)
+        self.assertEqual(Movie.objects.get(id=1).tmdb_payload['title'], 'From TMDB')
+        self.assertEqual(tmdb_cache.peek(tmdb_cache.make_key('details', {'tmdb_id': 1}))['title'], 'From TMDB')
+
+    def test_uncatalogued_details_are_fetched_and_stored(self):
+        response = self.client.get('/api/movies/tmdb/3/')
+        self.assertEqual(response.json()['title'], 'From TMDB')
+        self.assertTrue(Movie.objects.filter(tmdb_id=3, tmdb_payload__isnull=False).exists())
+
+
+class SeedMoviesCommandTests(TestCase):
+    def setUp(self):
+        self.tmdb = mock.Mock()
+        self.tmdb.movie_list.side_effect = self.movie_list
+        self.failing_pages = set()
+        patcher = mock.patch('movies.management.commands.seed_movies.get_tmdb_client', return_value=self.tmdb)
+        self.get_tmdb_client = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def movie_list(self, endpoint, page):
+        if (endpoint, page) in self.failing_pages:
+            raise requests.ConnectionError('down')
+        offset = 100 if endpoint == 'movie/top_rated' else 0
+        return {'results': [{'id': offset + page * 10 + i, 'title': f'{endpoint} {page}'} for i in range(2)]}
+
+    def seed(self, *args, endpoints=('movie/popular', 'movie/top_rated')):
+        out = io.StringIO()
+        call_command('seed_movies', '--endpoints', *endpoints, *args, stdout=out)
+        return out.getvalue()
+
+    def test_pages_of_every_endpoint_are_stored_and_checkpointed(self):
+        output = self.seed('--pages', '2', '--concurrency', '2')
+        self.assertEqual(Movie.objects.count(), 8)
+        self.assertIn('Seeded 8 rows (8 new) from 4 requests', output)
+        done = SyncState.load('seed_movies').data['done']
+        self.assertEqual({endpoint: sorted(pages) for endpoint, pages in done.items()},
+                         {'movie/popular': [1, 2], 'movie/top_rated': [1, 2]})
+        self.get_tmdb_client.assert_called_with(BULK)
+
+    def test_resume_only_fetches_pages_that_failed(self):
+        self.failing_pages = {('movie/top_rated', 2)}
+        output = self.seed('--pages', '2')
+        self.assertIn('1 pages failed, rerun with --resume to retry them', output)
+        self.assertEqual(Movie.objects.count(), 6)
+
+        self.failing_pages = set()
+        self.tmdb.movie_list.reset_mock()
+        self.seed('--pages', '2', '--resume')
+        self.tmdb.movie_list.assert_called_once_with('movie/top_rated', page=2)
+        self.assertEqual(Movie.objects.count(), 8)
+        self.assertIn('Nothing to do', self.seed('--pages', '2', '--resume'))
+
+    def test_credits_are_fetched_for_seeded_movies(self):
+        self.tmdb.movie.side_effect = lambda tmdb_id, append_to_response=None: {
+            'id': tmdb_id, 'title': 'Detailed', 'credits': {
+                'cast': [{'id': 500, 'credit_id': f'cast-{tmdb_id}', 'name': 'Actor', 'order': 0}],
+                'crew': [],
+            },
+        }
+        self.seed('--credits', endpoints=['movie/popular'])
+        self.assertEqual(self.tmdb.movie.call_count, 2)
+        self.assertEqual(Credit.objects.filter(person_id=500).count(), 2)
+        self.assertFalse(Movie.objects.filter(credits_fetched_at__isnull=True).exists())
+
+
+class SearchCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmdb_cache.clear()
+        for movie_id, title, popularity in ((1, 'Star Wars', 90), (2, 'Stardust', 40), (3, 'Alien', 80)):
+            Movie.objects.create(id=movie_id, tmdb_id=movie_id, title=title, popularity=popularity)
+        self.tmdb = mock.Mock()
+        self.tmdb.search.return_value = {
+            'page': 1, 'total_pages': 1, 'total_results': 1,
+            'results': [{'id': 4, 'title': 'Star Trek', 'genre_ids': []}],
+        }
+        patcher = mock.patch('movies.cache.get_tmdb_client', return_value=self.tmdb)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_every_token_matches_as_a_word_prefix(self):
+        self.assertEqual(sorted(movie['title'] for movie in search_catalog('star')), ['Star Wars', 'Stardust'])
+        self.assertEqual([movie['title'] for movie in search_catalog('wa st')], ['Star Wars'])
+        self.assertEqual(search_catalog('ars'), [])
+
+    def test_local_source_never_asks_tmdb(self):
+        response = self.client.get('/api/movies/search/', {'query': 'Alien', 'source': 'local'})
+        self.assertEqual(response.json()['source'], 'local')
+        self.assertEqual([movie['id'] for movie in response.json()['results']], [3])
+        self.tmdb.search.assert_not_called()
+
+    @override_settings(MOVIE_SEARCH_MIN_LOCAL_HITS=2)
+    def test_auto_answers_locally_only_with_enough_hits(self):
+        self.assertEqual(self.client.get('/api/movies/search/', {'query': 'star'}).json()['source'], 'local')
+        response = self.client.get('/api/movies/search/', {'query': 'star t'})
+        self.assertEqual(response.json()['source'], 'tmdb')
+        self.tmdb.search.assert_called_once_with('star t')
+        # TMDB hits are ingested, so the same search is answered locally next time
+        self.assertEqual([movie['title'] for movie in search_catalog('star t')], ['Star Trek'])
+
+
+class PrefixReuseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmdb_cache.clear()
+        self.results = [
+            {'id': 1, 'title': 'Star Wars', 'original_title': 'Star Wars'},
+            {'id': 2, 'title': 'Stardust', 'original_title': 'Stardust'},
+            {'id': 3, 'title': 'Lone Star', 'original_title': 'Lone Star'},
+        ]
+
+    def cache_search(self, query, total_pages=1, total_results=3):
+        tmdb_cache.set(tmdb_cache.make_key('search', {'query': query}), {
+            'page': 1, 'results': self.results, 'total_pages': total_pages, 'total_results': total_results
+        })
+
+    def test_longer_query_is_filtered_from_a_complete_prefix(self):
+        self.cache_search('sta')
+        data = reuse_prefix_results('star w')
+        self.assertEqual(data['source'], 'prefix')
+        self.assertEqual([movie['id'] for movie in data['results']], [1])
+        self.assertEqual([movie['id'] for movie in reuse_prefix_results('stard')['results']], [2])
+
+    def test_incomplete_prefix_results_are_not_reused(self):
+        self.cache_search('sta', total_pages=4, total_results=70)
+        self.assertIsNone(reuse_prefix_results('star w'))
+
+    def test_search_endpoint_answers_from_the_prefix_without_tmdb(self):
+        self.cache_search('star')
+        with mock.patch('movies.cache.get_tmdb_client') as get_tmdb_client:
+            response = self.client.get('/api/movies/search/', {'query': 'Star  Wa', 'source': 'tmdb'})
+        get_tmdb_client.assert_not_called()
+        self.assertEqual(response.json()['source'], 'prefix')
+        self.assertEqual([movie['id'] for movie in response.json()['results']], [1])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def make_breaker(self):
+        return CircuitBreaker(
+            'test', window=60, min_calls=4, failure_rate=0.5, slow_call_duration=1,
+            slow_call_rate=0.9, open_seconds=0.05, half_open_calls=2
+        )
+
+    def call(self, breaker, failed=False, duration=0.01):
+        breaker.before_call()
+        breaker.record(duration, failed)
+
+    def test_opens_once_enough_calls_fail_and_then_rejects(self):
+        breaker = self.make_breaker()
+        for failed in (False, True, False):
+            self.call(breaker, failed)
+        self.assertEqual(breaker.state, CLOSED)  # below min_calls
+        self.call(breaker, failed=True)
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        self.assertEqual(breaker.stats()['rejected'], 1)
+
+    def test_slow_calls_open_it_too(self):
+        breaker = self.make_breaker()
+        for _ in range(4):
+            self.call(breaker, duration=2)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_half_open_probes_close_or_reopen_it(self):
+        breaker = self.make_breaker()
+        for _ in range(4):
+            self.call(breaker, failed=True)
+        time.sleep(0.06)
+        breaker.before_call()
+        self.assertEqual(breaker.state, HALF_OPEN)
+        breaker.record(0.01)
+        self.call(breaker)
+        self.assertEqual(breaker.state, CLOSED)
+
+        for _ in range(4):
+            self.call(breaker, failed=True)
+        time.sleep(0.06)
+        self.call(breaker, failed=True)
+        self.assertEqual(breaker.state, OPEN)
+
+
+class DegradedResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmdb_cache.clear()
+        self.tmdb = mock.Mock()
+        self.tmdb.popular.side_effect = self.tmdb.movie.side_effect = CircuitOpenError()
+        patcher = mock.patch('movies.cache.get_tmdb_client', return_value=self.tmdb)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for movie_id, popularity in ((1, 10), (2, 30)):
+            Movie.objects.create(id=movie_id, tmdb_id=movie_id, title=f'Movie {movie_id}', popularity=popularity)
+
+    def test_popular_falls_back_to_local_movies_by_popularity(self):
+        response = self.client.get('/api/movies/popular/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Degraded'], 'true')
+        self.assertTrue(response.json()['degraded'])
+        self.assertEqual([movie['id'] for movie in response.json()['results']], [2, 1])
+
+    def test_popular_prefers_the_last_cached_page(self):
+        tmdb_cache.set(tmdb_cache.make_key('popular', {'page': 1}), {'results': [{'id': 9}]}, ttl=-3600)
+        response = self.client.get('/api/movies/popular/')
+        self.assertEqual(response.json()['results'], [{'id': 9}])
+
+    def test_details_fall_back_to_the_stored_movie(self):
+        response = self.client.get('/api/movies/tmdb/1/')
+        self.assertEqual(response['X-Degraded'], 'true')
+        self.assertEqual((response.json()['title'], response.json()['degraded']), ('Movie 1', True))
+        self.assertEqual(self.client.get('/api/movies/tmdb/3/').status_code, 503)
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmdb_cache.clear()
+        self.tmdb = mock.Mock()
+        self.submit_once = mock.Mock()
+        for target, replacement in (
+            ('movies.pagination.submit_once', self.submit_once),
+            ('movies.views.get_tmdb_client', mock.Mock(return_value=self.tmdb)),
+            ('movies.cache.get_tmdb_client', mock.Mock(return_value=self.tmdb)),
+        ):
+            patcher = mock.patch(target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.tmdb.popular.side_effect = lambda page: {
+            'page': page, 'results': [{'id': page}], 'total_pages': 2, 'total_results': 2
+        }
+
+    def test_page_cursors_are_signed(self):
+        self.assertEqual(decode_page_cursor(encode_page_cursor(7)), 7)
+        self.assertEqual(decode_page_cursor(None), 1)
+        for cursor in (encode_page_cursor(7)[:-2], encode_page_cursor(501), encode_cursor('before', 7), 'junk'):
+            with self.assertRaisesMessage(ValueError, 'Invalid cursor'):
+                decode_page_cursor(cursor)
+
+    def test_popular_follows_next_and_prefetches_the_following_page(self):
+        first = self.client.get('/api/movies/popular/').json()
+        self.assertIsNone(first['previous'])
+        self.submit_once.assert_called_once()
+        self.assertEqual(self.submit_once.call_args.args[0], ('prefetch', ('popular', (('page', 2),))))
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual((second['page'], second['results'], second['next']), (2, [{'id': 2}], None))
+        self.assertIsNotNone(second['previous'])
+
+        response = self.client.get('/api/movies/popular/', {'cursor': 'junk'})
+        self.assertEqual((response.status_code, response.json()), (400, {'error': 'Invalid cursor'}))
+
+    def test_id_pages_run_from_the_highest_id_down(self):
+        movie_ids = np.arange(1, 8)
+        page, cursor = id_page(movie_ids, None, 3)
+        self.assertEqual(page, [7, 6, 5])
+        page, cursor = id_page(movie_ids, cursor, 3)
+        self.assertEqual(page, [4, 3, 2])
+        self.assertEqual(id_page(movie_ids, cursor, 3), ([1], None))
+
+    def test_discover_pages_by_rating_and_tops_up_a_short_page(self):
+        for movie_id in range(1, 26):
+            Movie.objects.create(id=movie_id, tmdb_id=movie_id, title=f'Movie {movie_id}', vote_average=1 + movie_id % 5)
+        self.tmdb.discover.return_value = {
+            'results': [{'id': 100, 'title': 'Discovered', 'vote_average': 0.5}], 'total_pages': 1
+        }
+        first = self.client.get('/api/movies/discover/').json()
+        second = self.client.get(first['next']).json()
+        seen = [movie['id'] for movie in first['results'] + second['results']]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(first['results']), 20)
+        ratings = [movie['vote_average'] for movie in first['results'] + second['results']]
+        self.assertEqual(ratings, sorted(ratings, reverse=True))
+        # The second page came up short, so a TMDB discover page was ingested into it
+        self.assertEqual(second['results'][-1]['title'], 'Discovered')
+        self.assertEqual(SyncState.load('discover_feed').data['next_page'], 2)
+
+
+class CreditsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmdb_cache.clear()
+        self.tmdb = mock.Mock()
+        self.tmdb.movie.side_effect = lambda tmdb_id, append_to_response=None: {
+            'id': tmdb_id, 'title': f'Movie {tmdb_id}', 'release_date': f'20{tmdb_id:02d}-01-01',
+            'credits': {
+                'cast': [
+                    {'id': 10, 'credit_id': f'c{tmdb_id}-2', 'name': 'Second Lead', 'character': 'B', 'order': 1},
+                    {'id': 11, 'credit_id': f'c{tmdb_id}-1', 'name': 'Lead', 'character': 'A', 'order': 0},
+                ],
+                'crew': [
+                    {'id': 20, 'credit_id': f'd{tmdb_id}', 'name': 'Director', 'job': 'Director',
+                     'department': 'Directing'},
+                    {'id': 11, 'credit_id': f'w{tmdb_id}', 'name': 'Lead', 'job': 'Writer', 'department': 'Writing'},
+                ],
+            },
+        }
+        patcher = mock.patch('movies.credits.get_tmdb_client', return_value=self.tmdb)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_credits_are_fetched_once_then_served_from_the_database(self):
+        response = self.client.get('/api/movies/tmdb/1/credits/')
+        self.assertEqual([person['name'] for person in response.json()['cast']], ['Lead', 'Second Lead'])
+        self.assertEqual(len(response.json()['crew']), 2)
+        self.tmdb.movie.assert_called_once_with(1, append_to_response='credits')
+        self.assertEqual(tmdb_cache.peek(tmdb_cache.make_key('details', {'tmdb_id': 1}))['title'], 'Movie 1')
+
+        response = self.client.get('/api/movies/tmdb/1/credits/', {'role': 'crew', 'job': 'director'})
+        self.assertEqual(response.json()['cast'], [])
+        self.assertEqual([person['name'] for person in response.json()['crew']], ['Director'])
+        response = self.client.get('/api/movies/tmdb/1/credits/', {'role': 'cast', 'limit': 1})
+        self.assertEqual([person['name'] for person in response.json()['cast']], ['Lead'])
+        self.assertEqual(self.tmdb.movie.call_count, 1)
+
+    def test_person_movies_newest_first_filtered_by_role_and_job(self):
+        for tmdb_id in (1, 2):
+            self.client.get(f'/api/movies/tmdb/{tmdb_id}/credits/')
+        response = self.client.get('/api/movies/people/11/movies/')
+        self.assertEqual([movie['id'] for movie in response.json()], [2, 1])
+        response = self.client.get('/api/movies/people/11/movies/', {'job': 'writer'})
+        self.assertEqual(len(response.json()), 2)
+        response = self.client.get('/api/movies/people/20/movies/', {'role': 'cast'})
+        self.assertEqual(response.json(), [])
+        response = self.client.get('/api/movies/people/20/movies/', {'role': 'extras'})
+        self.assertEqual(response.status_code, 400)
 
-# Create your tests here.
@@ -0,0 +1,260 @@
+"""
+This module contains the rate limiting in front of TMDB.
+
+TokenBucket is a thread-safe token bucket. RequestScheduler shares one TMDB
+budget between interactive proxy traffic, background prefetches and bulk jobs:
+each priority class keeps a reserve of the bucket free for the classes above
+it, waiters in a process are served in priority order, and a Retry-After from
+TMDB pauses every class. The bucket lives in a pluggable store, in process
+memory by default or in a shared Django cache to span workers.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+
+import httpx
+import requests
+from django.conf import settings
+from django.core.cache import caches
+
+INTERACTIVE = 'interactive'
+PREFETCH = 'prefetch'
+BULK = 'bulk'
+PRIORITIES = (INTERACTIVE, PREFETCH, BULK)
+
+
+class RateLimitedError(requests.RequestException, httpx.HTTPError):
+    """Raised when a TMDB call cannot get a token in time; caught by both clients' error handlers"""
+
+    def __init__(self, message='TMDB request budget exhausted'):
+        super().__init__(message)
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens=1, reserve=0):
+        """
+        Take tokens if available while leaving `reserve` tokens in the bucket;
+        returns the seconds to wait otherwise (0 on success)
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens - tokens >= reserve:
+                self.tokens -= tokens
+                return 0
+            return (tokens + reserve - self.tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until tokens are available; returns False if timeout elapses first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class MemoryBucketStore:
+    """Token buckets in process memory; the default store and the one to use in tests"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._paused_until = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, tokens, rate, capacity, reserve=0):
+        """Take tokens from bucket `key`; returns 0 on success or the seconds to wait"""
+        with self._lock:
+            paused = self._paused_until.get(key, 0) - time.monotonic()
+            if paused > 0:
+                return paused
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, capacity)
+        return bucket.try_acquire(tokens, reserve)
+
+    def pause(self, key, seconds):
+        """Refuse every take() on bucket `key` for the next `seconds`"""
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._paused_until[key] = max(self._paused_until.get(key, 0), until)
+
+    def paused_for(self, key):
+        with self._lock:
+            return max(self._paused_until.get(key, 0) - time.monotonic(), 0)
+
+
+class CacheBucketStore:
+    """
+    Budget shared by every worker through a Django cache with atomic incr
+    (Redis, Memcached). The bucket is approximated by fixed windows of
+    capacity / rate seconds that each allow `capacity` tokens.
+    """
+
+    def __init__(self, cache, prefix='ratelimit'):
+        self.cache = cache
+        self.prefix = prefix
+
+    def take(self, key, tokens, rate, capacity, reserve=0):
+        now = time.time()
+        paused = self.paused_for(key)
+        if paused > 0:
+            return paused
+
+        window = capacity / rate
+        window_id = int(now // window)
+        counter = f'{self.prefix}:{key}:{window_id}'
+        self.cache.add(counter, 0, math.ceil(window) + 1)
+        used = self.cache.incr(counter, tokens)
+        if used <= capacity - reserve:
+            return 0
+        # Give the tokens back so a refused low-priority caller does not spend the budget
+        self.cache.decr(counter, tokens)
+        return (window_id + 1) * window - now
+
+    def pause(self, key, seconds):
+        pause_key = f'{self.prefix}:{key}:paused'
+        until = time.time() + seconds
+        if until > (self.cache.get(pause_key) or 0):
+            self.cache.set(pause_key, until, math.ceil(seconds) + 1)
+
+    def paused_for(self, key):
+        until = self.cache.get(f'{self.prefix}:{key}:paused') or 0
+        return max(until - time.time(), 0)
+
+
+class RequestScheduler:
+    """Priority-aware token bucket scheduler shared by every TMDB call"""
+
+    def __init__(self, store=None, rate=None, capacity=None, reserves=None, timeouts=None, key='tmdb'):
+        self.store = store or MemoryBucketStore()
+        self.rate = float(rate or settings.TMDB_SCHEDULER_RATE)
+        self.capacity = float(capacity or self.rate)
+        reserves = reserves or settings.TMDB_SCHEDULER_RESERVES
+        self.reserves = {priority: reserves.get(priority, 0) * self.capacity for priority in PRIORITIES}
+        self.timeouts = timeouts or settings.TMDB_SCHEDULER_TIMEOUTS
+        self.key = key
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._async_waiting = dict.fromkeys(PRIORITIES, 0)
+        self._counters = {
+            priority: {'granted': 0, 'timeouts': 0, 'wait_seconds': 0.0} for priority in PRIORITIES
+        }
+
+    def _take(self, priority):
+        return self.store.take(self.key, 1, self.rate, self.capacity, self.reserves[priority])
+
+    def _record(self, priority, granted, waited):
+        with self._condition:
+            counters = self._counters[priority]
+            counters['granted' if granted else 'timeouts'] += 1
+            counters['wait_seconds'] += waited
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """
+        Block until a token is granted to this priority, serving waiters in this
+        process highest priority first. Returns False if timeout elapses first.
+        """
+        timeout = self.timeouts.get(priority) if timeout is None else timeout
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        ticket = (PRIORITIES.index(priority), next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[0] == ticket:
+                        wait = self._take(priority)
+                        if not wait:
+                            self._record(priority, True, time.monotonic() - started)
+                            return True
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._record(priority, False, time.monotonic() - started)
+                        return False
+                    waits = [value for value in (wait, remaining) if value is not None]
+                    self._condition.wait(min(waits) if waits else None)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+
+    async def aacquire(self, priority=INTERACTIVE, timeout=None):
+        """
+        Async counterpart of acquire() for coroutines. Coroutines poll the store
+        instead of joining the thread queue; priority still applies through the
+        per-class reserves.
+        """
+        timeout = self.timeouts.get(priority) if timeout is None else timeout
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        self._async_waiting[priority] += 1
+        try:
+            while True:
+                wait = self._take(priority)
+                if not wait:
+                    self._record(priority, True, time.monotonic() - started)
+                    return True
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    self._record(priority, False, time.monotonic() - started)
+                    return False
+                await asyncio.sleep(wait)
+        finally:
+            self._async_waiting[priority] -= 1
+
+    def pause(self, seconds):
+        """Hold back every priority for `seconds`, e.g. after a 429 with Retry-After"""
+        self.store.pause(self.key, seconds)
+        with self._condition:
+            self._condition.notify_all()
+
+    def queue_depths(self):
+        with self._condition:
+            depths = dict(self._async_waiting)
+            for priority_index, _ in self._waiters:
+                depths[PRIORITIES[priority_index]] += 1
+        return depths
+
+    def stats(self):
+        depths = self.queue_depths()
+        with self._condition:
+            priorities = {
+                priority: {**self._counters[priority], 'queued': depths[priority]}
+                for priority in PRIORITIES
+            }
+        for counters in priorities.values():
+            counters['wait_seconds'] = round(counters['wait_seconds'], 3)
+        return {
+            'rate': self.rate,
+            'capacity': self.capacity,
+            'paused_for': round(self.store.paused_for(self.key), 3),
+            'priorities': priorities
+        }
+
+
+def _scheduler_store():
+    alias = settings.TMDB_SCHEDULER_CACHE
+    return CacheBucketStore(caches[alias]) if alias else MemoryBucketStore()
+
+
+tmdb_scheduler = RequestScheduler(store=_scheduler_store())
@@ -0,0 +1,302 @@
+"""
+This module contains the shared TMDB API client.
+
+Every TMDB caller (the movie views and the management commands) goes through
+the process-wide client returned by get_tmdb_client(), so connections are
+pooled and kept alive instead of paying a TCP+TLS handshake per request.
+Async views under ASGI use get_async_tmdb_client() instead. Both clients go
+through the shared request scheduler in throttle.py, which spends the API
+budget by priority, and the circuit breaker in breaker.py.
+"""
+
+import asyncio
+import copy
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from .breaker import tmdb_breaker
+from .throttle import INTERACTIVE, RateLimitedError, tmdb_scheduler
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def error_status(exc):
+    """HTTP status of a failed TMDB call (requests or httpx exception), or None if there was no response"""
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def is_outage(exc):
+    """True for failures that say TMDB is unhealthy (no response, 429 or 5xx) rather than e.g. a 404"""
+    status = error_status(exc)
+    return status is None or status == 429 or status >= 500
+
+
+def retry_after(response):
+    """Seconds from a Retry-After header in delta-seconds form, or None"""
+    value = response.headers.get('Retry-After') if response is not None else None
+    return float(value) if value and value.isdigit() else None
+
+
+class PausingRetry(Retry):
+    """urllib3 Retry that also pauses the request scheduler whenever TMDB sends Retry-After"""
+
+    scheduler = None
+
+    def sleep_for_retry(self, response):
+        seconds = self.get_retry_after(response)
+        if seconds and self.scheduler is not None:
+            self.scheduler.pause(seconds)
+        return super().sleep_for_retry(response)
+
+
+class BaseTMDBClient:
+    """Endpoint helpers shared by the sync and async clients; subclasses implement get()"""
+
+    def __init__(self, api_key=None, base_url=None, breaker=None, scheduler=None, priority=INTERACTIVE):
+        self.api_key = api_key or settings.TMDB_API_KEY
+        self.base_url = (base_url or settings.TMDB_BASE_URL).rstrip('/')
+        self.breaker = breaker or tmdb_breaker
+        self.scheduler = scheduler or tmdb_scheduler
+        self.priority = priority
+
+    def with_priority(self, priority):
+        """A copy of this client, sharing its connection pool, whose calls are scheduled at `priority`"""
+        client = copy.copy(self)
+        client.priority = priority
+        return client
+
+    def pause_for(self, response):
+        """Hold back all TMDB calls for as long as a 429 response asks"""
+        if response is not None and response.status_code == 429:
+            self.scheduler.pause(retry_after(response) or settings.TMDB_BACKOFF_FACTOR)
+
+    def url(self, endpoint):
+        return f'{self.base_url}/{endpoint.lstrip("/")}'
+
+    def params(self, additional_params=None):
+        params = {'api_key': self.api_key}
+        if additional_params:
+            params.update(additional_params)
+        return params
+
+    def get(self, endpoint, params=None):
+        raise NotImplementedError
+
+    def popular(self, page=1):
+        return self.get('movie/popular', {'page': page})
+
+    def upcoming(self, page=1):
+        return self.get('movie/upcoming', {'page': page})
+
+    def movie_list(self, endpoint, page=1):
+        """Fetch one page of a movie list endpoint such as movie/top_rated"""
+        return self.get(endpoint, {'page': page})
+
+    def discover(self, page=1, sort_by='popularity.desc', **filters):
+        return self.get('discover/movie', {'sort_by': sort_by, 'page': page, **filters})
+
+    def search(self, query, page=1, language='en-US', include_adult=False):
+        return self.get('search/movie', {
+            'query': query,
+            'language': language,
+            'page': page,
+            'include_adult': include_adult
+        })
+
+    def movie(self, tmdb_id, append_to_response=None):
+        """Movie details; append_to_response='credits' returns the cast and crew in the same call"""
+        params = {'append_to_response': append_to_response} if append_to_response else None
+        return self.get(f'movie/{tmdb_id}', params)
+
+    def credits(self, tmdb_id):
+        return self.get(f'movie/{tmdb_id}/credits')
+
+    def genres(self):
+        return self.get('genre/movie/list')
+
+    def changes(self, start_date=None, end_date=None, page=1):
+        """One page of the ids of movies changed between two dates (at most 14 days apart)"""
+        params = {'page': page}
+        if start_date:
+            params['start_date'] = start_date.isoformat()
+        if end_date:
+            params['end_date'] = end_date.isoformat()
+        return self.get('movie/changes', params)
+
+
+class TMDBClient(BaseTMDBClient):
+    """Pooled, keep-alive client for the TMDB v3 API"""
+
+    def __init__(self, api_key=None, base_url=None, timeout=None, pool_connections=None,
+                 pool_maxsize=None, max_retries=None, breaker=None, scheduler=None):
+        super().__init__(api_key, base_url, breaker, scheduler)
+        self.timeout = timeout or (
+            settings.TMDB_CONNECT_TIMEOUT,
+            settings.TMDB_READ_TIMEOUT
+        )
+        self.session = self._build_session(
+            pool_connections or settings.TMDB_POOL_CONNECTIONS,
+            pool_maxsize or settings.TMDB_POOL_MAXSIZE,
+            settings.TMDB_MAX_RETRIES if max_retries is None else max_retries
+        )
+
+    def _build_session(self, pool_connections, pool_maxsize, max_retries):
+        """Create a session whose adapter caps connections per host and retries with jitter"""
+        retry_class = type('PausingRetry', (PausingRetry,), {'scheduler': self.scheduler})
+        retry = retry_class(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=settings.TMDB_BACKOFF_FACTOR,
+            backoff_jitter=settings.TMDB_BACKOFF_JITTER,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Accept': 'application/json'})
+        return session
+
+    def get(self, endpoint, params=None):
+        """
+        GET an endpoint and return the decoded JSON body, raising requests
+        exceptions on failure (CircuitOpenError while the breaker is open,
+        RateLimitedError when no request budget is left for this priority)
+        """
+        if not self.scheduler.acquire(self.priority):
+            raise RateLimitedError()
+        self.breaker.before_call()
+        started = time.monotonic()
+        failed = False
+        try:
+            response = self.session.get(
+                self.url(endpoint),
+                params=self.params(params),
+                timeout=self.timeout
+            )
+            self.pause_for(response)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            failed = is_outage(e)
+            raise
+        finally:
+            self.breaker.record(time.monotonic() - started, failed)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncTMDBClient(BaseTMDBClient):
+    """Non-blocking TMDB client for async views, sharing one httpx connection pool per event loop"""
+
+    def __init__(self, api_key=None, base_url=None, timeout=None, max_connections=None,
+                 max_keepalive_connections=None, max_retries=None, breaker=None, scheduler=None):
+        super().__init__(api_key, base_url, breaker, scheduler)
+        self.max_retries = settings.TMDB_MAX_RETRIES if max_retries is None else max_retries
+        self.client = httpx.AsyncClient(
+            timeout=timeout or httpx.Timeout(
+                settings.TMDB_READ_TIMEOUT,
+                connect=settings.TMDB_CONNECT_TIMEOUT
+            ),
+            limits=httpx.Limits(
+                max_connections=max_connections or settings.TMDB_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=max_keepalive_connections or settings.TMDB_ASYNC_MAX_KEEPALIVE
+            ),
+            headers={'Accept': 'application/json'},
+        )
+
+    def backoff(self, attempt, response=None):
+        """Seconds to wait before retrying, preferring the server's Retry-After"""
+        seconds = retry_after(response)
+        if seconds is not None:
+            return min(seconds, settings.TMDB_READ_TIMEOUT)
+        delay = settings.TMDB_BACKOFF_FACTOR * (2 ** attempt)
+        return delay + random.uniform(0, settings.TMDB_BACKOFF_JITTER)
+
+    async def get(self, endpoint, params=None):
+        """
+        GET an endpoint and return the decoded JSON body, raising httpx
+        exceptions on failure (CircuitOpenError while the breaker is open,
+        RateLimitedError when no request budget is left for this priority)
+        """
+        if not await self.scheduler.aacquire(self.priority):
+            raise RateLimitedError()
+        self.breaker.before_call()
+        started = time.monotonic()
+        failed = False
+        try:
+            return await self._get_with_retries(endpoint, params)
+        except Exception as e:
+            failed = is_outage(e)
+            raise
+        finally:
+            self.breaker.record(time.monotonic() - started, failed)
+
+    async def _get_with_retries(self, endpoint, params):
+        for attempt in range(self.max_retries + 1):
+            retries_left = attempt < self.max_retries
+            try:
+                response = await self.client.get(self.url(endpoint), params=self.params(params))
+            except httpx.TransportError:
+                if not retries_left:
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            self.pause_for(response)
+            if response.status_code in RETRY_STATUSES and retries_left:
+                await asyncio.sleep(self.backoff(attempt, response))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_tmdb_client(priority=INTERACTIVE):
+    """
+    Return the process-wide TMDB client, creating it on first use. Background
+    work asks for PREFETCH or BULK priority so interactive calls go first.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TMDBClient()
+    return _client if priority == INTERACTIVE else _client.with_priority(priority)
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_tmdb_client():
+    """Return the TMDB client bound to the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncTMDBClient()
+    return client
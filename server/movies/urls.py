@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MovieViewSet
+from .views import MovieViewSet, poster
 
 router = DefaultRouter()
 router.register(r'movies', MovieViewSet, basename='movie')
 
 urlpatterns = [
+    path('movies/poster/<str:size>/<str:path>', poster, name='movie-poster'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,41 @@
+from django.conf import settings
+
+
+def parse_tmdb_ids(raw, max_ids=None, param='ids'):
+    """
+    Parse a comma-separated list of TMDB ids, dropping duplicates but keeping order.
+    Returns (ids, error) where error is a message suitable for a 400 response.
+    """
+    max_ids = max_ids or settings.TMDB_BATCH_MAX_IDS
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw.split(',') if part.strip()))
+    except ValueError:
+        return [], f'{param} must be a comma-separated list of integers'
+    if not ids:
+        return [], f'{param} query parameter is required'
+    if len(ids) > max_ids:
+        return [], f'At most {max_ids} ids can be requested at once'
+    return ids, None
+
+
+def parse_credit_filters(params, roles=('cast', 'crew')):
+    """
+    Read the limit, role, job and department filters of the credits endpoint.
+    Returns (filters, error) where error is a message suitable for a 400 response.
+    """
+    filters = {
+        'role': params.get('role') or None,
+        'job': params.get('job') or None,
+        'department': params.get('department') or None,
+        'limit': None,
+    }
+    if filters['role'] not in (None, *roles):
+        return {}, f"role must be one of: {', '.join(roles)}"
+    if params.get('limit'):
+        try:
+            filters['limit'] = int(params['limit'])
+        except ValueError:
+            return {}, 'limit must be an integer'
+        if filters['limit'] < 1:
+            return {}, 'limit must be positive'
+    return filters, None
@@ -1,18 +1,45 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import Movie, Genre
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from .models import Credit, Movie
 from .serializers import MovieSerializer
+from .tmdb import get_tmdb_client, error_status
+from .cache import tmdb_cache, MISS
+from .singleflight import tmdb_flight
+from .tasks import run_concurrently
+from .utils import parse_tmdb_ids, parse_credit_filters
+from .credits import CREDIT_ROLES, load_movie_credits
+from .ingest import upsert_movies
+from .catalog import catalog_details, fetch_movie_details, store_movie_details
+from .autocomplete import title_index
+from .posters import (
+    POSTER_PATH_RE, POSTER_WIDTHS, InvalidImage, PosterNotFound, content_type, get_poster_store
+)
+from .genres import MATCH_ALL, MATCH_MODES, genre_index, genre_registry
+from .breaker import tmdb_breaker
+from .throttle import tmdb_scheduler
+from .pagination import (
+    RatingCursorPagination, decode_page_cursor, popular_response, has_full_page_after, ingest_discover_page,
+    prefetch_discover, cursor_link, id_page
+)
+from .fallback import DEGRADED_HEADER, popular_fallback, upcoming_fallback, details_fallback
+from .search import (
+    SEARCH_SOURCES, search_catalog, search_response, ingest_search_results, normalize_query, reuse_prefix_results
+)
+from django.conf import settings
+from django.db.models import F
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_GET
+from django.utils.cache import patch_cache_control
 import requests
-import os
 import logging
-from django.conf import settings
+from functools import partial
 
 logger = logging.getLogger(__name__)
 
 class MovieViewSet(viewsets.ModelViewSet):
-    queryset = Movie.objects.all()
+    queryset = Movie.objects.prefetch_related('genres')
     serializer_class = MovieSerializer
     permission_classes = [AllowAny]
     
@@ -22,63 +49,115 @@ class MovieViewSet(viewsets.ModelViewSet):
         """
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             permission_classes = [IsAuthenticated]
+        elif self.action in ['cache_stats', 'autocomplete_stats', 'tmdb_status', 'poster_stats']:
+            permission_classes = [IsAdminUser]
         else:
             permission_classes = [AllowAny]
         return [permission() for permission in permission_classes]
     
-    def get_tmdb_url(self, endpoint):
-        return f'https://api.themoviedb.org/3/{endpoint}'
-    
-    def get_tmdb_params(self, additional_params=None):
-        params = {'api_key': os.getenv('TMDB_API_KEY')}
-        if additional_params:
-            params.update(additional_params)
-        return params
+    @property
+    def tmdb(self):
+        return get_tmdb_client()
+
+    def tmdb_fetch(self, endpoint, params, fetch):
+        """Serve a TMDB call (fetch(client)) through the response cache, coalescing concurrent identical misses"""
+        return tmdb_cache.get_or_fetch(endpoint, params, fetch, flight=tmdb_flight)
+
+    def degraded(self, data, error):
+        """Serve local data in place of a failed TMDB call"""
+        logger.warning(f"TMDB unavailable, serving degraded {self.action} response: {str(error)}")
+        return Response(data, headers={DEGRADED_HEADER: 'true'})
+
+    def list(self, request, *args, **kwargs):
+        """All local movies, or with ?genres=28,12&match=all|any those in the given genres"""
+        if 'genres' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        known_genre_ids = genre_registry.ids()
+        genre_ids, error = parse_tmdb_ids(
+            request.query_params['genres'], max_ids=len(known_genre_ids) or 1, param='genres'
+        )
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        unknown = [genre_id for genre_id in genre_ids if genre_id not in known_genre_ids]
+        if unknown:
+            return Response(
+                {'error': f"Unknown genre ids: {', '.join(map(str, unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        match = request.query_params.get('match', MATCH_ALL)
+        if match not in MATCH_MODES:
+            return Response(
+                {'error': f"match must be one of: {', '.join(MATCH_MODES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Matching ids come from the in-memory index; only the page itself is read from the database
+        movie_ids = genre_index.movie_ids(genre_ids, match)
+        try:
+            page_ids, next_cursor = id_page(
+                movie_ids, request.query_params.get('cursor'), settings.MOVIE_GENRE_PAGE_SIZE
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        movies = Movie.objects.prefetch_related('genres').in_bulk(page_ids)
+        return Response({
+            'count': len(movie_ids),
+            'next': cursor_link(request, next_cursor) if next_cursor else None,
+            'results': self.serializer_class(
+                [movies[movie_id] for movie_id in page_ids if movie_id in movies], many=True
+            ).data
+        })
 
     @action(detail=False, methods=['get'])
     def popular(self, request):
+        """One page of TMDB's popular movies; follow `next` for the following page"""
         try:
-            response = requests.get(
-                self.get_tmdb_url('movie/popular'),
-                params=self.get_tmdb_params()
+            page = decode_page_cursor(request.query_params.get('cursor'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            popular_data = self.tmdb_fetch(
+                'popular', {'page': page}, lambda client: client.popular(page)
             )
-            response.raise_for_status()
-
-            return Response({
-                'page': 1,
-                'results': response.json()['results'],
-                'total_pages': 1,
-                'total_results': len(response.json()['results'])
-            })
+            return Response(popular_response(request, page, popular_data))
             
         except requests.exceptions.RequestException as e:
-            return Response(
-                {'error': f'TMDB API error: {str(e)}'},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
-            )
+            return self.degraded(popular_fallback(page), e)
 
     @action(detail=False, methods=['get'])
     def search(self, request):
-        query = request.query_params.get('query', '')
+        query = normalize_query(request.query_params.get('query', ''))
         if not query:
             return Response(
                 {'error': 'Query parameter is required'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        source = request.query_params.get('source', 'auto')
+        if source not in SEARCH_SOURCES:
+            return Response(
+                {'error': f"source must be one of: {', '.join(SEARCH_SOURCES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Answer from the local index unless it has too few hits to be a good result
+        if source != 'tmdb':
+            results = search_catalog(query)
+            if source == 'local' or len(results) >= settings.MOVIE_SEARCH_MIN_LOCAL_HITS:
+                return Response(search_response(results, 'local'))
+
+        # While typing, a longer query can often be filtered out of a shorter one's complete results
+        prefix_data = reuse_prefix_results(query)
+        if prefix_data is not None:
+            return Response(prefix_data)
+
         try:
-            response = requests.get(
-                self.get_tmdb_url('search/movie'),
-                params=self.get_tmdb_params({
-                    'query': query,
-                    'language': 'en-US',
-                    'page': 1,
-                    'include_adult': False
-                }),
-                timeout=10
+            search_data = self.tmdb_fetch(
+                'search', {'query': query}, lambda client: ingest_search_results(client.search(query))
             )
-            response.raise_for_status()
-            return Response(response.json())
+            return Response({**search_data, 'source': 'tmdb'})
         except requests.RequestException as e:
             logger.error(f"TMDB API error: {str(e)}")
             return Response(
@@ -91,17 +170,7 @@ class MovieViewSet(viewsets.ModelViewSet):
         """Fetch detailed movie information from TMDB"""
         movie = self.get_object()
         try:
-            response = requests.get(
-                self.get_tmdb_url(f'movie/{movie.tmdb_id}'),
-                params=self.get_tmdb_params()
-            )
-            response.raise_for_status()
-
-            movie_data = response.json()
-            movie.overview = movie_data.get('overview', movie.overview)
-            movie.vote_average = movie_data.get('vote_average', movie.vote_average)
-            movie.save()
-            
+            movie_data = store_movie_details(self.tmdb.movie(movie.tmdb_id))
             return Response(movie_data)
             
         except requests.exceptions.RequestException as e:
@@ -114,118 +183,218 @@ class MovieViewSet(viewsets.ModelViewSet):
     def upcoming(self, request):
         """Fetch upcoming movies from TMDB"""
         try:
-            response = requests.get(
-                self.get_tmdb_url('movie/upcoming'),
-                params=self.get_tmdb_params()
-            )
-            response.raise_for_status()
-            
-            movies_data = response.json()['results']
-            stored_movies = []
-            
-            for movie_data in movies_data:
-                movie, created = Movie.objects.get_or_create(
-                    tmdb_id=movie_data['id'],
-                    defaults={
-                        'title': movie_data['title'],
-                        'overview': movie_data['overview'],
-                        'poster_path': movie_data['poster_path'],
-                        'release_date': movie_data.get('release_date'),
-                        'vote_average': movie_data['vote_average']
-                    }
-                )
-                
-                if created and movie_data.get('genre_ids'):
-                    for genre_id in movie_data['genre_ids']:
-                        genre = Genre.objects.filter(id=genre_id).first()
-                        if genre:
-                            movie.genres.add(genre)
-                
-                stored_movies.append(self.serializer_class(movie).data)
-            
-            return Response(stored_movies)
+            movies_data = self.tmdb.upcoming()['results']
+            result = upsert_movies(movies_data)
+
+            movies = Movie.objects.prefetch_related('genres').in_bulk(result.ids)
+            stored_movies = [movies[movie_id] for movie_id in result.ids]
+            return Response(self.serializer_class(stored_movies, many=True).data)
             
         except requests.exceptions.RequestException as e:
-            return Response(
-                {'error': f'TMDB API error: {str(e)}'},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
-            )
+            return self.degraded(self.serializer_class(upcoming_fallback(), many=True).data, e)
 
     @action(detail=False, methods=['get'])
     def discover(self, request):
-        """Get a mix of movies from different categories"""
+        """
+        Highest rated local movies, paginated by cursor. The catalog is topped up
+        from TMDB discover in the background as the pages near its end, and
+        synchronously if a page comes up short.
+        """
+        queryset = Movie.objects.prefetch_related('genres')
+        paginator = RatingCursorPagination()
+        movies = paginator.paginate_queryset(queryset, request, view=self)
         try:
-            local_movies = Movie.objects.all().order_by('-vote_average')[:20]
-
-            if local_movies.count() < 20:
-                response = requests.get(
-                    self.get_tmdb_url('movie/discover'),
-                    params=self.get_tmdb_params({
-                        'sort_by': 'popularity.desc',
-                        'page': 1
-                    })
-                )
-                response.raise_for_status()
-                
-                movies_data = response.json()['results']
-                for movie_data in movies_data:
-                    movie, created = Movie.objects.get_or_create(
-                        tmdb_id=movie_data['id'],
-                        defaults={
-                            'title': movie_data['title'],
-                            'overview': movie_data['overview'],
-                            'poster_path': movie_data['poster_path'],
-                            'release_date': movie_data.get('release_date'),
-                            'vote_average': movie_data['vote_average']
-                        }
-                    )
-                    
-                    if created and movie_data.get('genre_ids'):
-                        for genre_id in movie_data['genre_ids']:
-                            genre = Genre.objects.filter(id=genre_id).first()
-                            if genre:
-                                movie.genres.add(genre)
-                
-                    local_movies = Movie.objects.all().order_by('-vote_average')[:20]
-            
-            return Response(self.serializer_class(local_movies, many=True).data)
-            
+            if len(movies) < paginator.page_size and ingest_discover_page(self.tmdb):
+                movies = paginator.paginate_queryset(queryset, request, view=self)
         except requests.exceptions.RequestException as e:
-            return Response(
-                {'error': f'TMDB API error: {str(e)}'},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            return self.degraded(
+                paginator.get_paginated_response(self.serializer_class(movies, many=True).data).data, e
             )
 
-    @action(detail=False, methods=['get'], url_path='tmdb/(?P<tmdb_id>[^/.]+)')
+        if not movies or not has_full_page_after(queryset, movies[-1], paginator.page_size):
+            prefetch_discover()
+        return paginator.get_paginated_response(self.serializer_class(movies, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path=r'tmdb/(?P<tmdb_id>\d+)')
     def tmdb_details(self, request, tmdb_id=None):
-        """Fetch movie details directly from TMDB"""
+        """Serve movie details from the local catalog, falling back to TMDB"""
+        tmdb_id = int(tmdb_id)
+        params = {'tmdb_id': tmdb_id}
+        fetch = partial(fetch_movie_details, tmdb_id)
         try:
-            response = requests.get(
-                self.get_tmdb_url(f'movie/{tmdb_id}'),
-                params=self.get_tmdb_params()
-            )
-            response.raise_for_status()
-            return Response(response.json())
+            movie_data = tmdb_cache.get_cached('details', params, fetch)
+            if movie_data is MISS:
+                movie_data = catalog_details([tmdb_id]).get(tmdb_id)
+            if movie_data is None:
+                movie_data = tmdb_cache.fetch('details', params, fetch, flight=tmdb_flight)
+            return Response(movie_data)
         except requests.RequestException as e:
+            movie_data = details_fallback(tmdb_id)
+            if movie_data is not None:
+                return self.degraded(movie_data, e)
             logger.error(f"TMDB API error: {str(e)}")
             return Response(
                 {'error': 'Failed to fetch movie details from TMDB'},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
-    @action(detail=False, methods=['get'], url_path='tmdb/(?P<tmdb_id>[^/.]+)/credits')
+    @action(detail=False, methods=['get'], url_path=r'tmdb/(?P<tmdb_id>\d+)/credits')
     def tmdb_credits(self, request, tmdb_id=None):
-        """Fetch movie credits directly from TMDB"""
+        """Cast and crew from the local credits tables, fetched from TMDB on first request"""
+        filters, error = parse_credit_filters(request.query_params, CREDIT_ROLES)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            response = requests.get(
-                self.get_tmdb_url(f'movie/{tmdb_id}/credits'),
-                params=self.get_tmdb_params()
-            )
-            response.raise_for_status()
-            return Response(response.json())
+            return Response(load_movie_credits(int(tmdb_id), **filters))
         except requests.RequestException as e:
             logger.error(f"TMDB API error: {str(e)}")
             return Response(
                 {'error': 'Failed to fetch movie credits from TMDB'},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
-            )
\ No newline at end of file
+            )
+
+    @action(detail=False, methods=['get'], url_path='tmdb/batch')
+    def tmdb_batch(self, request):
+        """
+        Fetch details for several movies at once (?ids=550,603,680).
+        Ids are served from the cache, then the local catalog; the rest are fetched
+        from TMDB concurrently and stored in the catalog with one bulk upsert.
+        """
+        tmdb_ids, error = parse_tmdb_ids(request.query_params.get('ids', ''))
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = {}
+        missing = []
+        for tmdb_id in tmdb_ids:
+            movie_data = tmdb_cache.get_cached(
+                'details', {'tmdb_id': tmdb_id}, partial(fetch_movie_details, tmdb_id)
+            )
+            if movie_data is MISS:
+                missing.append(tmdb_id)
+            else:
+                results[tmdb_id] = movie_data
+
+        if missing:
+            results.update(catalog_details(missing))
+            missing = [tmdb_id for tmdb_id in missing if tmdb_id not in results]
+
+        def fetch(tmdb_id):
+            return tmdb_cache.fetch(
+                'details', {'tmdb_id': tmdb_id}, lambda client: client.movie(tmdb_id), flight=tmdb_flight
+            )
+
+        errors = {}
+        fetched = []
+        for tmdb_id, movie_data, exc in run_concurrently(fetch, missing):
+            if exc is None:
+                results[tmdb_id] = movie_data
+                fetched.append(movie_data)
+            elif not isinstance(exc, requests.RequestException):
+                raise exc
+            else:
+                logger.error(f"TMDB API error for movie {tmdb_id}: {str(exc)}")
+                errors[tmdb_id] = {'error': 'Failed to fetch movie details from TMDB', 'status': error_status(exc)}
+        if fetched:
+            upsert_movies(fetched, details=True)
+
+        return Response({
+            'results': {tmdb_id: results[tmdb_id] for tmdb_id in tmdb_ids if tmdb_id in results},
+            'errors': errors
+        })
+
+    @action(detail=False, methods=['get'], url_path=r'people/(?P<person_id>\d+)/movies')
+    def person_movies(self, request, person_id=None):
+        """Local movies a person is credited in (?job=Director, ?role=cast), newest first"""
+        credits = Credit.objects.filter(person_id=int(person_id))
+        role = request.query_params.get('role')
+        if role:
+            if role not in CREDIT_ROLES:
+                return Response(
+                    {'error': f"role must be one of: {', '.join(CREDIT_ROLES)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            credits = credits.filter(role=role)
+        if request.query_params.get('job'):
+            credits = credits.filter(job__iexact=request.query_params['job'])
+
+        movies = Movie.objects.prefetch_related('genres').filter(
+            id__in=credits.values('movie_id')
+        ).order_by(F('release_date').desc(nulls_last=True), '-id')
+        return Response(self.serializer_class(movies, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Title suggestions for a partial query, served from the in-memory title index once it is built"""
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), settings.MOVIE_AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'query': query,
+            'results': [
+                {
+                    'id': movie.id,
+                    'title': movie.title,
+                    'release_date': str(movie.release_date) if movie.release_date else '',
+                    'poster_path': movie.poster_path,
+                    'vote_average': movie.vote_average,
+                    'popularity': movie.popularity
+                }
+                for movie in title_index.suggest(query, max(limit, 1))
+            ]
+        })
+
+    @action(detail=False, methods=['get'])
+    def autocomplete_stats(self, request):
+        """Size and memory use of the autocomplete title index"""
+        return Response(title_index.stats())
+
+    @action(detail=False, methods=['get'])
+    def tmdb_status(self, request):
+        """State of the TMDB circuit breaker and request scheduler"""
+        return Response({'breaker': tmdb_breaker.stats(), 'scheduler': tmdb_scheduler.stats()})
+
+    @action(detail=False, methods=['get'])
+    def poster_stats(self, request):
+        """Hit/download/resize/eviction counters and size of the poster cache"""
+        return Response(get_poster_store().stats())
+
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """Hit/miss/eviction counters of the TMDB response cache"""
+        return Response(tmdb_cache.stats())
+
+
+@require_GET
+def poster(request, size, path):
+    """A TMDB image at one of POSTER_WIDTHS' sizes, served from the local poster cache"""
+    if size not in POSTER_WIDTHS:
+        return JsonResponse({'error': f"size must be one of: {', '.join(POSTER_WIDTHS)}"}, status=400)
+    if not POSTER_PATH_RE.match(path):
+        return JsonResponse({'error': 'Invalid image path'}, status=400)
+
+    try:
+        image_file, digest = get_poster_store().open_blob(size, path)
+    except PosterNotFound:
+        return JsonResponse({'error': 'Image not found'}, status=404)
+    except InvalidImage as e:
+        logger.error(f"Invalid poster {size}/{path}: {str(e)}")
+        return JsonResponse({'error': 'TMDB returned an invalid image'}, status=502)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to fetch poster {size}/{path}: {str(e)}")
+        return JsonResponse({'error': 'Failed to fetch image from TMDB'}, status=503)
+
+    # Blobs are named by content hash, so a URL's bytes only change if TMDB replaces the image
+    etag = f'"{digest}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        image_file.close()
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(image_file, content_type=content_type(path))
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.POSTER_MAX_AGE, immutable=True)
+    return response
@@ -12,6 +12,10 @@ sys.path.insert(0, str(project_root))
 sys.path.insert(0, str(server_dir))
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+os.environ.setdefault('ROOT_URLCONF', 'server.asgi_urls')
 
 from django.core.asgi import get_asgi_application
 application = get_asgi_application()
+
+from movies.tasks import warm_indexes
+warm_indexes()
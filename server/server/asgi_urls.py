@@ -0,0 +1,14 @@
+"""
+URL configuration used when the project is served through server.asgi.
+
+The read-only TMDB proxy endpoints are routed to their async views first,
+along with the event vote stream, which only exists under ASGI; everything
+else falls through to the regular (sync) URL configuration.
+"""
+from django.urls import path, include
+
+urlpatterns = [
+    path('api/', include('movies.async_urls')),
+    path('api/', include('events.async_urls')),
+    path('', include('server.urls')),
+]
@@ -15,6 +15,7 @@ from datetime import timedelta
 from dotenv import load_dotenv
 import os
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 load_dotenv()
 
@@ -86,7 +87,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'server.urls'
+# server.asgi switches this to server.asgi_urls to serve the async TMDB proxy views
+ROOT_URLCONF = os.getenv('ROOT_URLCONF', 'server.urls')
 
 TEMPLATES = [
     {
@@ -211,6 +213,7 @@ CORS_ALLOW_METHODS = [
     'POST',
     'PUT',
 ]
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 # EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -222,4 +225,131 @@ EMAIL_USE_TLS = True
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 
 # Site URL
-SITE_URL = os.getenv('SITE_URL', 'http://localhost:3000')
\ No newline at end of file
+SITE_URL = os.getenv('SITE_URL', 'http://localhost:3000')
+
+# TMDB API client
+TMDB_API_KEY = os.getenv('TMDB_API_KEY')
+TMDB_BASE_URL = os.getenv('TMDB_BASE_URL', 'https://api.themoviedb.org/3')
+TMDB_CONNECT_TIMEOUT = float(os.getenv('TMDB_CONNECT_TIMEOUT', '3.05'))
+TMDB_READ_TIMEOUT = float(os.getenv('TMDB_READ_TIMEOUT', '10'))
+TMDB_POOL_CONNECTIONS = int(os.getenv('TMDB_POOL_CONNECTIONS', '4'))
+TMDB_POOL_MAXSIZE = int(os.getenv('TMDB_POOL_MAXSIZE', '20'))  # max open connections per host
+TMDB_MAX_RETRIES = int(os.getenv('TMDB_MAX_RETRIES', '2'))
+TMDB_BACKOFF_FACTOR = float(os.getenv('TMDB_BACKOFF_FACTOR', '0.3'))
+TMDB_BACKOFF_JITTER = float(os.getenv('TMDB_BACKOFF_JITTER', '0.3'))
+TMDB_ASYNC_MAX_CONNECTIONS = int(os.getenv('TMDB_ASYNC_MAX_CONNECTIONS', '200'))
+TMDB_ASYNC_MAX_KEEPALIVE = int(os.getenv('TMDB_ASYNC_MAX_KEEPALIVE', '50'))
+TMDB_BACKGROUND_WORKERS = int(os.getenv('TMDB_BACKGROUND_WORKERS', '4'))
+TMDB_FANOUT_WORKERS = int(os.getenv('TMDB_FANOUT_WORKERS', '16'))
+TMDB_BATCH_MAX_IDS = int(os.getenv('TMDB_BATCH_MAX_IDS', '50'))
+
+# TMDB response cache (seconds); stale entries are served for TMDB_CACHE_STALE_TTL while they refresh
+TMDB_CACHE_MAX_ENTRIES = int(os.getenv('TMDB_CACHE_MAX_ENTRIES', '5000'))
+TMDB_CACHE_STALE_TTL = int(os.getenv('TMDB_CACHE_STALE_TTL', '3600'))
+TMDB_CACHE_TTLS = {
+    'default': 600,
+    'popular': 60 * 30,
+    'search': 60 * 15,
+    'details': 60 * 60 * 6,
+    'credits': 60 * 60 * 24,
+}
+
+# Single-flight coalescing of identical TMDB calls. Set TMDB_SINGLEFLIGHT_CACHE to a shared
+# cache alias (Redis, Memcached, database) to also coalesce across worker processes.
+TMDB_SINGLEFLIGHT_CACHE = os.getenv('TMDB_SINGLEFLIGHT_CACHE') or None
+TMDB_SINGLEFLIGHT_TIMEOUT = float(os.getenv('TMDB_SINGLEFLIGHT_TIMEOUT', '15'))
+
+# Local movie catalog: stored TMDB details older than this (seconds) are served but refreshed in the background
+TMDB_CATALOG_MAX_AGE = int(os.getenv('TMDB_CATALOG_MAX_AGE', str(60 * 60 * 24)))
+
+# Local catalog search: in source=auto mode, answer from the index when it has at least this many hits
+MOVIE_SEARCH_MIN_LOCAL_HITS = int(os.getenv('MOVIE_SEARCH_MIN_LOCAL_HITS', '5'))
+
+# Autocomplete title index: rebuild from the database this often (seconds) to pick up other workers' writes
+MOVIE_AUTOCOMPLETE_REBUILD_INTERVAL = int(os.getenv('MOVIE_AUTOCOMPLETE_REBUILD_INTERVAL', '600'))
+MOVIE_AUTOCOMPLETE_MAX_LIMIT = 50
+# Prefixes matching more index keys than this walk the movies best rated first instead of ranking every match
+MOVIE_AUTOCOMPLETE_SCAN_LIMIT = int(os.getenv('MOVIE_AUTOCOMPLETE_SCAN_LIMIT', '2000'))
+
+# TMDB circuit breaker: open when, over the last WINDOW seconds and at least MIN_CALLS calls,
+# FAILURE_RATE of calls failed or SLOW_CALL_RATE took longer than SLOW_CALL_DURATION seconds;
+# probe with HALF_OPEN_CALLS calls after OPEN_SECONDS
+TMDB_BREAKER_WINDOW = float(os.getenv('TMDB_BREAKER_WINDOW', '30'))
+TMDB_BREAKER_MIN_CALLS = int(os.getenv('TMDB_BREAKER_MIN_CALLS', '10'))
+TMDB_BREAKER_FAILURE_RATE = float(os.getenv('TMDB_BREAKER_FAILURE_RATE', '0.5'))
+TMDB_BREAKER_SLOW_CALL_DURATION = float(os.getenv('TMDB_BREAKER_SLOW_CALL_DURATION', '3'))
+TMDB_BREAKER_SLOW_CALL_RATE = float(os.getenv('TMDB_BREAKER_SLOW_CALL_RATE', '0.8'))
+TMDB_BREAKER_OPEN_SECONDS = float(os.getenv('TMDB_BREAKER_OPEN_SECONDS', '30'))
+TMDB_BREAKER_HALF_OPEN_CALLS = int(os.getenv('TMDB_BREAKER_HALF_OPEN_CALLS', '3'))
+
+# Lets the frontend see when a response was served from local data during a TMDB outage,
+# or replayed for a repeated Idempotency-Key
+CORS_EXPOSE_HEADERS = ['X-Degraded', 'Idempotent-Replayed']
+
+# TMDB request scheduler: the API key's budget in requests per second, shared by every caller.
+# Each priority leaves RESERVES (a fraction of the budget) free for the classes above it and
+# gives up after TIMEOUTS seconds (None waits indefinitely). Set TMDB_SCHEDULER_CACHE to a
+# shared cache alias with atomic incr (Redis, Memcached) to share the budget across workers.
+TMDB_SCHEDULER_RATE = float(os.getenv('TMDB_SCHEDULER_RATE', '40'))
+TMDB_SCHEDULER_RESERVES = {
+    'interactive': 0,
+    'prefetch': 0.2,
+    'bulk': 0.5,
+}
+TMDB_SCHEDULER_TIMEOUTS = {
+    'interactive': 2,
+    'prefetch': 30,
+    'bulk': None,
+}
+TMDB_SCHEDULER_CACHE = os.getenv('TMDB_SCHEDULER_CACHE') or None
+
+# Movie recommendations (event movie_suggestions): hashed cast/director columns in the feature
+# matrix, the weight of each feature group, and how often (seconds) the matrix is fully rebuilt
+MOVIE_RECOMMEND_CAST_BUCKETS = int(os.getenv('MOVIE_RECOMMEND_CAST_BUCKETS', '64'))
+MOVIE_RECOMMEND_WEIGHTS = {
+    'genres': 1.0,
+    'year': 0.5,
+    'rating': 0.5,
+    'people': 1.5,
+}
+MOVIE_RECOMMEND_REBUILD_INTERVAL = int(os.getenv('MOVIE_RECOMMEND_REBUILD_INTERVAL', '3600'))
+MOVIE_RECOMMEND_MAX_LIMIT = 50
+
+# Genre registry and genre -> movie ids index (GET /api/movies/?genres=): reload the registry and
+# rebuild the index from the database this often (seconds) to pick up other workers' writes
+GENRE_REGISTRY_TTL = int(os.getenv('GENRE_REGISTRY_TTL', '3600'))
+GENRE_INDEX_REBUILD_INTERVAL = int(os.getenv('GENRE_INDEX_REBUILD_INTERVAL', '600'))
+MOVIE_GENRE_PAGE_SIZE = 20
+
+# Poster cache (/api/movies/poster/<size>/<path>): images are downloaded once at POSTER_SOURCE_SIZE
+# through POSTER_FETCHER, smaller sizes are resized locally, and the least recently served images
+# are evicted once POSTER_CACHE_DIR grows past POSTER_CACHE_MAX_BYTES
+TMDB_IMAGE_BASE_URL = os.getenv('TMDB_IMAGE_BASE_URL', 'https://image.tmdb.org/t/p')
+POSTER_CACHE_DIR = os.getenv('POSTER_CACHE_DIR', os.path.join(BASE_DIR, 'poster_cache'))
+POSTER_CACHE_MAX_BYTES = int(os.getenv('POSTER_CACHE_MAX_BYTES', str(1024 ** 3)))
+POSTER_SOURCE_SIZE = os.getenv('POSTER_SOURCE_SIZE', 'w780')
+POSTER_FETCHER = os.getenv('POSTER_FETCHER', 'movies.posters.HTTPImageFetcher')
+POSTER_FETCHER_DIR = os.getenv('POSTER_FETCHER_DIR')  # used by movies.posters.DirectoryFetcher
+POSTER_MAX_AGE = 60 * 60 * 24 * 365
+
+# Event vote_results tallies are cached per event in this cache alias until the next vote. With the
+# default per-process cache, other workers may serve tallies up to VOTE_RESULTS_CACHE_TIMEOUT seconds
+# old; point it at a shared cache (Redis, Memcached) to invalidate everywhere at once.
+VOTE_RESULTS_CACHE = os.getenv('VOTE_RESULTS_CACHE') or 'default'
+VOTE_RESULTS_CACHE_TIMEOUT = int(os.getenv('VOTE_RESULTS_CACHE_TIMEOUT', '30'))
+
+# Live vote stream (GET /api/events/{id}/vote_stream/, ASGI only). LocalBackend only reaches streams
+# in the process that took the vote; with several workers use events.live.CacheBackend and point
+# VOTE_STREAM_CACHE at a shared cache (Redis, Memcached), which workers poll every POLL_INTERVAL seconds.
+VOTE_STREAM_BACKEND = os.getenv('VOTE_STREAM_BACKEND', 'events.live.LocalBackend')
+VOTE_STREAM_CACHE = os.getenv('VOTE_STREAM_CACHE') or 'default'
+VOTE_STREAM_POLL_INTERVAL = float(os.getenv('VOTE_STREAM_POLL_INTERVAL', '0.5'))
+VOTE_STREAM_QUEUE_SIZE = 100  # messages a slow stream may fall behind before it is sent a snapshot instead
+VOTE_STREAM_HEARTBEAT = 15  # seconds between keep-alive comments on an idle stream
+VOTE_STREAM_RETRY_MS = 3000
+VOTE_STREAM_TICKET_MAX_AGE = 30  # seconds a vote_stream_ticket stays valid for opening the stream
+
+# Idempotency-Key on the vote endpoints: a repeated key within the timeout (seconds) gets the first
+# response back from IDEMPOTENCY_CACHE; point it at a shared cache when running several workers.
+IDEMPOTENCY_CACHE = os.getenv('IDEMPOTENCY_CACHE') or 'default'
+IDEMPOTENCY_KEY_TIMEOUT = int(os.getenv('IDEMPOTENCY_KEY_TIMEOUT', '300'))
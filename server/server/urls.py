@@ -69,7 +69,12 @@ GET /api/movies/
     - Optional query params:
         - page (integer)
         - search (string)
-    - Returns: Paginated list of movies
+        - genres (comma-separated genre ids, e.g. 28,12): only movies in these genres,
+          newest id first, answered from the in-memory genre index
+        - match (all|any, default all): require every listed genre or any of them
+        - cursor (string): with genres, the `next` value of the previous page
+    - Returns: Paginated list of movies; with genres, {count, next, results}
+    - 400 for unknown genre ids or an invalid cursor
 
 POST /api/movies/
     - Add new movie to database
@@ -86,19 +91,33 @@ GET /api/movies/{id}/
     - Returns: Single movie object with full details
 
 GET /api/movies/popular/
-    - Get popular movies from TMDb
+    - Get popular movies from TMDb, one page at a time
     - Requires authentication
     - Optional query params:
-        - page (integer)
-    - Returns: List of popular movies
-    - Automatically caches results in database
+        - cursor (string): opaque cursor taken from a previous next/previous link
+    - Returns: page, results, total_pages, total_results, next, previous
+    - The page after the one served is fetched into the cache in the background
+
+GET /api/movies/discover/
+    - Highest rated movies in the local catalog, 20 per page
+    - Public access
+    - Optional query params:
+        - cursor (string): opaque cursor taken from a previous next/previous link
+    - Returns: next, previous, results
+    - More movies are pulled in from TMDb discover as the pages near the end
 
 GET /api/movies/search/
-    - Search movies using TMDb
+    - Search movies in the local catalog index, falling back to TMDb
     - Requires authentication
     - Required query params:
         - query (string)
-    - Returns: Search results from TMDb
+    - Optional query params:
+        - source (auto|local|tmdb, default auto): auto answers locally when the
+          index has enough prefix matches and asks TMDb otherwise
+    - A query that extends a recently searched one is answered by filtering
+      the shorter query's results when those were complete (under one page)
+    - Returns: Search results in TMDb's shape plus source (local, tmdb, or
+      prefix when reused from a shorter query)
 
 GET /api/movies/upcoming/
     - Get upcoming movies from TMDb
@@ -106,6 +125,87 @@ GET /api/movies/upcoming/
     - Returns: List of upcoming movies
     - Automatically caches results in database
 
+GET /api/movies/tmdb/{tmdb_id}/
+    - Get movie details from TMDb
+    - Public access
+
+GET /api/movies/tmdb/{tmdb_id}/credits/
+    - Get movie cast and crew, stored locally after the first TMDb fetch
+    - Public access
+    - Optional query params:
+        - limit (integer): at most this many cast and crew entries each
+        - role (cast|crew): return only one of the lists
+        - job (string, e.g. Director): only crew with this job
+        - department (string, e.g. Writing): only crew in this department
+    - Returns: id, cast (billing order), crew
+
+GET /api/movies/people/{person_id}/movies/
+    - Local movies a person is credited in, newest first
+    - Public access
+    - Optional query params:
+        - role (cast|crew)
+        - job (string, e.g. Director)
+
+GET /api/movies/tmdb/batch/
+    - Get details for several movies in one request
+    - Public access
+    - Required query params:
+        - ids (comma-separated TMDb ids, at most 50)
+    - Returns:
+        - results (object): details keyed by TMDb id
+        - errors (object): {error, status} keyed by TMDb id for ids that failed
+
+GET /api/movies/autocomplete/
+    - Suggest movie titles while the user types, from an in-memory index
+    - Public access
+    - Required query params:
+        - q (string): the partial title; matches the start of any title word
+    - Optional query params:
+        - limit (integer, default 10, at most 50)
+    - Returns: query and results (id, title, release_date, poster_path,
+      vote_average, popularity), best rated first
+    - Until the index has been built in the background (shortly after startup),
+      only titles starting with q are matched
+
+GET /api/movies/autocomplete_stats/
+    - Inspect the autocomplete title index
+    - Admin only
+    - Returns: movies, keys, memory_bytes, age_seconds
+
+GET /api/movies/poster/{size}/{path}
+    - TMDb image (poster, backdrop or profile) through the local poster cache,
+      e.g. /api/movies/poster/w342/abc123.jpg for TMDb's /t/p/w342/abc123.jpg
+    - Public access
+    - size: w45, w92, w154, w185, w300, w342, w500, w780, w1280 or original;
+      sizes below POSTER_SOURCE_SIZE are resized locally
+    - Returns: the image with an ETag and a one-year immutable Cache-Control;
+      304 when If-None-Match matches, 404 if TMDb has no such image, 502 if
+      TMDb answers with something that is not an image (never cached)
+
+GET /api/movies/poster_stats/
+    - Inspect the poster cache
+    - Admin only
+    - Returns: hits, downloads, resizes, evictions, bytes, max_bytes
+
+GET /api/movies/tmdb_status/
+    - Inspect the TMDb circuit breaker and request scheduler
+    - Admin only
+    - Returns:
+        - breaker: state, opened, rejected, window_calls, window_failures
+        - scheduler: rate, capacity, paused_for and, per priority
+          (interactive, prefetch, bulk), granted, timeouts, wait_seconds, queued
+
+When TMDb is failing or the circuit breaker is open, popular, upcoming,
+discover and tmdb/{tmdb_id} answer from cached responses or local movies
+instead of returning 503. Such responses carry the X-Degraded: true header,
+and object bodies also include degraded: true.
+
+GET /api/movies/cache_stats/
+    - Inspect the in-process TMDb response cache
+    - Admin only
+    - Returns: hits, stale_hits, misses, evictions, refreshes,
+      refresh_errors, size, max_entries, hit_rate
+
 Event Endpoints:
 --------------
 GET /api/events/
@@ -152,17 +252,62 @@ POST /api/events/{id}/vote/
     - Required fields:
         - movie_id (integer)
         - vote (boolean or null): true for yes, false for no, null to reset
+    - Optional headers:
+        - Idempotency-Key (string, at most 255 characters): a request repeating
+          a recent key gets the first response back, with
+          Idempotent-Replayed: true, and changes nothing
     - Returns: Updated vote object
+    - A movie not in the local catalog yet is fetched from TMDb first;
+      404 if TMDb has no such movie, 503 if TMDb is unavailable
+
+POST /api/events/{id}/votes/
+    - Submit votes for several movies of an event in one request
+    - Requires authentication
+    - Access: Event host or guests only
+    - Required fields:
+        - votes (array): {movie_id (integer), vote (boolean or null)} per
+          movie; a bare array is accepted too
+    - All votes are validated first and written in one transaction with a
+      single upsert; nothing is saved if any of them is invalid
+    - Accepts an Idempotency-Key header, as vote does
+    - Returns: the event's updated tallies, as vote_results
+    - 400 for an invalid or repeated movie_id or vote; movies not in the local
+      catalog yet are fetched from TMDb as for vote (404, 503)
 
 GET /api/events/{id}/vote_results/
     - Get voting results for event
     - Requires authentication
     - Access: Event host or guests only
-    - Returns:
-        - movie_id (integer)
-        - yes_votes (integer)
-        - no_votes (integer)
-        - total_votes (integer)
+    - Returns: an object keyed by each movie option's id with
+      upvotes, downvotes, abstains and total (upvotes + downvotes), plus:
+        - totals: the same four counts summed over all options
+        - voters (integer): number of distinct users who voted
+    - Read from the VoteTally table, which every vote updates in its own
+      transaction, and cached until the next vote
+
+POST /api/events/{id}/vote_stream_ticket/
+    - Issue a ticket for opening vote_stream from a browser
+    - Requires authentication
+    - Access: Event host or guests only
+    - Returns: ticket (string), expires_in (seconds, VOTE_STREAM_TICKET_MAX_AGE)
+    - The ticket opens only this event's stream, which ends when the access
+      token used here expires
+
+GET /api/events/{id}/vote_stream/
+    - Live vote tallies as Server-Sent Events (ASGI server only; not routed
+      under WSGI, where clients poll vote_results instead)
+    - Requires authentication: a vote_stream_ticket in the ticket query param
+      (EventSource cannot send headers) or the Authorization header. Access
+      tokens are not accepted in the URL, where access logs would keep them
+    - Access: Event host or guests only
+    - Events:
+        - snapshot: the full vote_results object, sent first and again
+          whenever the client fell too far behind
+        - tally: {movies: {movie id: upvotes, downvotes, abstains, total},
+          voters} for the movies a committed vote changed
+    - Comment heartbeats every VOTE_STREAM_HEARTBEAT seconds; the stream
+      ends when the token expires so the client reconnects with a fresh ticket
+    - 401 without a valid ticket or token, 404 if the event is not visible
 
 Guest Management:
 ---------------
@@ -184,10 +329,15 @@ POST /api/events/{id}/respond_to_invitation/
 Additional Event Features:
 -----------------------
 GET /api/events/{id}/movie_suggestions/
-    - Get movie suggestions based on current options
+    - Suggest movies that are not options yet but resemble the upvoted ones
+      (genres, release year, rating, shared cast and directors); before any
+      upvotes, suggestions resemble the current options; until the recommender
+      has been built in the background, they are ranked by genres in common
     - Requires authentication
     - Access: Event host or guests only
-    - Returns: List of suggested movies based on genres
+    - Optional query params:
+        - limit (integer, default 10, at most 50)
+    - Returns: List of suggested movies, best match first
 
 POST /api/events/{id}/finalize_movie/
     - Finalize movie selection for event
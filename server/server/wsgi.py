@@ -13,3 +13,6 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
+
+from movies.tasks import warm_indexes
+warm_indexes()